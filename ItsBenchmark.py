@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+    Offline Benchmark für das DCGAN Training. Braucht weder MySql noch die
+    Klassifikations-API, die Trainingsbilder werden zufällig erzeugt.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import itertools
+import numpy as np
+import multiprocessing as mp
+from itsmisc import ItsConfig
+
+
+class ItsBenchmarkSqlLog():
+
+    # Ersatz für den ItsSqlLogger, vergibt nur fortlaufende History IDs
+    def __init__(self):
+        self.hisId = 0
+
+    def logEpochInfo(self, itsEpochInfo):
+        self.hisId += 1
+        return self.hisId
+
+    def logStopReason(self, hisId, reason):
+        pass
+
+    def getMaxConfidence(self, hisIds):
+        return None
+
+    def logRequestInfo(self, itsRequestInfo, hisId):
+        pass
+
+
+def runConfig(bench, results):
+    # Läuft in einem eigenen Prozess, damit Threads und RSS pro Messung gelten
+    from ItsDcgan import ItsDcgan
+
+    outDir = None
+    if bench['image_generation']:
+        outDir = tempfile.mkdtemp(prefix='its_bench_')
+
+    try:
+        imgs = np.random.randint(
+            0, 256, size=(bench['image_count'], 64, 64, 3), dtype=np.uint8)
+
+        dcgan = ItsDcgan(ItsBenchmarkSqlLog())
+        dcgan.outputDir = outDir
+
+        start = time.time()
+        dcgan.initDcgan(
+            fusedTrainStep=bench['fused'],
+            useDataset=bench['dataset'],
+            intraOpThreads=bench['intra_op_threads'],
+            interOpThreads=bench['inter_op_threads'],
+            xla=bench['xla'])
+        buildTime = time.time() - start
+
+        dcgan.setSessionBaseImages(0, imgs, 'benchmark')
+        dcgan.initEpoch(
+            bench['epochs'],
+            bench['batch_size'],
+            bench['image_generation'],
+            bench['steps_history'],
+            bench['cnt_generate'])
+
+        start = time.time()
+        dcgan.start()
+        trainTime = time.time() - start
+
+        cntHistory = (bench['epochs'] - 1) // bench['steps_history']
+        cntImages = cntHistory * bench['cnt_generate'] if bench['image_generation'] else 0
+
+        result = dict(bench)
+        result.update({
+            'build_s': round(buildTime, 3),
+            'train_s': round(trainTime, 3),
+            'steps_per_s': round(bench['epochs'] / trainTime, 2),
+            'images_per_s': round(cntImages / trainTime, 2),
+            # ru_maxrss ist unter Linux in KB
+            'peak_rss_mb': round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+            'phases': dcgan.timer.getStats()['phases']
+        })
+        results.put(result)
+    except Exception as e:
+        result = dict(bench)
+        result['error'] = str(e)
+        results.put(result)
+    finally:
+        if outDir:
+            shutil.rmtree(outDir, ignore_errors=True)
+
+
+def parseThreads(value):
+    # Format intra:inter, 0 überlässt TF die Wahl
+    intra, inter = value.split(':')
+    return int(intra), int(inter)
+
+
+def getBenchmarks(args):
+    benchmarks = []
+    for batchSize, imgCnt, threads, imgGen, xla in itertools.product(
+            args.batch_sizes, args.image_counts,
+            args.threads, args.image_generation, args.xla):
+        if batchSize > imgCnt:
+            continue
+        benchmarks.append({
+            'batch_size': batchSize,
+            'image_count': imgCnt,
+            'intra_op_threads': threads[0],
+            'inter_op_threads': threads[1],
+            'image_generation': bool(imgGen),
+            'fused': args.fused,
+            'dataset': args.dataset,
+            'xla': bool(xla),
+            'epochs': args.epochs,
+            'steps_history': args.steps_history,
+            'cnt_generate': args.cnt_generate
+        })
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure DCGAN training throughput without MySql or API.')
+    parser.add_argument('--epochs', type=int, default=1001)
+    parser.add_argument('--steps-history', type=int, default=250)
+    parser.add_argument('--cnt-generate', type=int, default=120)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[2])
+    parser.add_argument('--image-counts', type=int, nargs='+', default=[2])
+    parser.add_argument('--threads', type=parseThreads, nargs='+', default=[(0, 0)],
+                        help='intra:inter op thread pairs, e.g. 0:0 1:1 4:2')
+    parser.add_argument('--image-generation', type=int, nargs='+', default=[0, 1],
+                        help='1 to generate and write images, 0 to skip')
+    parser.add_argument('--xla', type=int, nargs='+', default=[0],
+                        help='1 to JIT compile with XLA, 0 1 to compare both')
+    parser.add_argument('--fused', action='store_true')
+    parser.add_argument('--dataset', action='store_true')
+    parser.add_argument('--out', help='Write the JSON result to this file')
+    args = parser.parse_args()
+
+    # Der DCGAN Logger schreibt in den Volume Ordner
+    if not os.path.exists(ItsConfig.VOLUME_FOLDER):
+        os.makedirs(ItsConfig.VOLUME_FOLDER)
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for bench in getBenchmarks(args):
+        print('Running {}'.format(bench), file=sys.stderr)
+        queue = ctx.Queue()
+        p = ctx.Process(target=runConfig, args=(bench, queue))
+        p.start()
+        p.join()
+
+        if queue.empty():
+            result = dict(bench)
+            result['error'] = 'exit code {}'.format(p.exitcode)
+            results.append(result)
+        else:
+            results.append(queue.get())
+
+    out = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == '__main__':
+    main()
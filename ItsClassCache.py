@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+'''
+    Cache für Klassifikationen. Schlüssel ist ein Hash über die Pixel, nicht
+    über das PNG. Im Speicher liegen die letzten Ergebnisse (LRU), dahinter
+    steht die Spalte img_hash in its_request_history. Optional werden auch
+    fast gleiche Bilder über einen Average Hash erkannt, das aber nur im
+    Speicher.
+'''
+
+import hashlib
+import collections
+import numpy as np
+from threading import Lock
+
+
+class ItsClassCache():
+
+    def __init__(self, log, size=10000, distance=0, sqlCon=None):
+        self.log = log
+        self.size = size
+        # Maximale Anzahl unterschiedlicher Bits im Average Hash, 0 = aus
+        self.distance = distance
+        # Eigene Verbindung, die des SQL Threads ist nicht thread safe
+        self.sqlCon = sqlCon
+        # Hash -> (Klasse, Konfidenz, JSON, Average Hash)
+        self.entries = collections.OrderedDict()
+        self.lock = Lock()
+        self.sqlLock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hashImage(self, img):
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        h = hashlib.sha1('{}'.format(img.shape).encode('utf8'))
+        h.update(img.tobytes())
+        return h.hexdigest()
+
+    def averageHash(self, img):
+        # 8x8 Blöcke in Graustufen, ein Bit pro Block über/unter dem Mittel
+        gray = np.asarray(img, dtype=np.float32)
+        if gray.ndim == 3:
+            gray = gray[:, :, :3].mean(axis=2)
+        bh, bw = gray.shape[0] // 8, gray.shape[1] // 8
+        blocks = gray[:bh * 8, :bw * 8].reshape(8, bh, 8, bw).mean(axis=(1, 3))
+        bits = (blocks > blocks.mean()).flatten()
+        return sum(1 << i for i, b in enumerate(bits) if b)
+
+    def lookup(self, img):
+        # Liefert (Hash, (Klasse, Konfidenz, JSON) oder None)
+        imgHash = self.hashImage(img)
+
+        with self.lock:
+            entry = self.entries.get(imgHash)
+            if entry:
+                self.entries.move_to_end(imgHash)
+                self.hits += 1
+                return imgHash, entry[:3]
+
+        entry = self.__lookupSql(imgHash)
+        if entry:
+            self.add(imgHash, img, *entry)
+            with self.lock:
+                self.hits += 1
+            return imgHash, entry
+
+        entry = self.__lookupSimilar(img)
+        with self.lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return imgHash, entry
+
+    def add(self, imgHash, img, nn_class, max_confidence, json_result):
+        aHash = self.averageHash(img) if self.distance else None
+        with self.lock:
+            self.entries[imgHash] = (nn_class, max_confidence, json_result, aHash)
+            self.entries.move_to_end(imgHash)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def getStats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def __lookupSql(self, imgHash):
+        if not self.sqlCon:
+            return None
+        try:
+            with self.sqlLock:
+                return self.sqlCon.getRequestForHash(imgHash)
+        except Exception as e:
+            self.log.error('Cache lookup failed: {}'.format(e))
+            return None
+
+    def __lookupSimilar(self, img):
+        if not self.distance:
+            return None
+
+        aHash = self.averageHash(img)
+        with self.lock:
+            best = None
+            bestDist = self.distance + 1
+            for key, entry in self.entries.items():
+                dist = bin(aHash ^ entry[3]).count('1') if entry[3] is not None else 64
+                if dist < bestDist:
+                    best, bestDist = key, dist
+            if best is None:
+                return None
+            self.entries.move_to_end(best)
+            return self.entries[best][:3]
@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
+import json
 import time
+import contextlib
+import shutil
+import hashlib
 import imageio
 import logging
 import numpy as np
 import tensorflow as tf
-from itslogging import ItsLogger, ItsSqlLogger
-from itsmisc import ItsEpochInfo, ItsSessionInfo, ItsConfig
+from tensorflow.python.client import timeline
+from itslogging import ItsLogger, ItsSqlLogger, ItsPhaseTimer
+from itsmisc import ItsEpochInfo, ItsSessionInfo, ItsImageInfo, ItsConfig
+from ItsImageWriter import ItsImageWriter
+from ItsEarlyStopping import ItsEarlyStopping
 
 
 class ItsDcgan():
@@ -22,14 +30,58 @@ class ItsDcgan():
         self.n_noise = 64
         self.imgShape = [None, 64, 64, 3]
         self.outputDir = None
+        # Basisbilder als uint8, ggf. als memmap direkt von der Platte
+        self.images = None
+        self.perm = None
+        self.cntBaseImages = 0
+        # Optional: Bilder direkt an den Requester übergeben
+        self.imageSink = None
         self.tfSession = None
+        self.fusedTrainStep = False
+        self.useDataset = False
+        self.cntModels = 1
+        self.xla = False
+        self.baseImages = [None]
+        self.keepProbTrain = 0.6
+        self.prefetchBatches = 2
+        self.checkpointRoot = None
+        self.checkpointDir = None
+        self.checkpointSteps = 0
+        self.resume = False
+        self.entryId = None
+        self.imageWriter = None
+        self.imageWriterThreads = 2
+        self.imageQueueSize = 240
+        # Laufzeit pro Phase, optional ein voller Trace alle n Epochen
+        self.timer = ItsPhaseTimer()
+        self.traceStep = 0
+        # Abbruchkriterien, 0 ist jeweils aus
+        self.stopWindow = 0
+        self.stopMinDelta = 0.01
+        self.stopMaxLoss = 0
+        self.stopTimeBudget = 0
+        self.stopConfidence = 0
+        # Ordner für exportierte Generatoren, None ist aus
+        self.exportRoot = None
         # {Session}_{Epoch}_{HisId}_{ImgNr}.png
         self.imageNameFormat = '{}_{}_{}_{}.png'
 
+    def applyConfig(self, dcganCfg):
+        self.checkpointRoot = dcganCfg.checkpointDir
+        self.imageWriterThreads = dcganCfg.imageWriterThreads
+        self.imageQueueSize = dcganCfg.imageQueueSize
+        self.traceStep = dcganCfg.traceStep
+        self.stopWindow = dcganCfg.stopWindow
+        self.stopMinDelta = dcganCfg.stopMinDelta
+        self.stopMaxLoss = dcganCfg.stopMaxLoss
+        self.stopTimeBudget = dcganCfg.stopTimeBudget
+        self.stopConfidence = dcganCfg.stopConfidence
+        self.exportRoot = dcganCfg.exportDir
+
     def initEpoch(
         self, max_epochs=10, batch_size=2,
         enableImageGeneration=False, stepsHistory=1000,
-        cntGenerateImages=10
+        cntGenerateImages=10, checkpointSteps=0
     ):
         self.log.info('Initializing epoch...')
         self.index_in_epoch = 0
@@ -50,76 +102,295 @@ class ItsDcgan():
         else:
             self.cntGenerateImages = 0
 
+        # Checkpoints nur zusammen mit einem History Eintrag schreiben
+        if checkpointSteps > 0:
+            steps = -(-checkpointSteps // self.stepsHistory)
+            self.checkpointSteps = steps * self.stepsHistory
+        else:
+            self.checkpointSteps = 0
+
         self.isEpochReady = True
 
-    def initDcgan(self):
-        self.log.info('Initializing DCGAN...')
+    def initDcgan(
+        self, fusedTrainStep=False, useDataset=False, cntModels=1,
+        intraOpThreads=0, interOpThreads=0, xla=False
+    ):
+        self.log.info('Initializing DCGAN with {} model(s)...'.format(cntModels))
         tf.reset_default_graph()
-
-        self.x_in = tf.placeholder(
-            dtype=tf.float32, shape=self.imgShape, name='x_in')
-        self.noise = tf.placeholder(
-            dtype=tf.float32, shape=[None, self.n_noise])
-
-        self.keep_prob = tf.placeholder(dtype=tf.float32, name='keep_prob')
-        self.is_training = tf.placeholder(
-            dtype=tf.bool, name='is_training')
-
-        self.g = self.generator(self.noise)
-        d_real = self.discriminator(self.x_in)
-        d_fake = self.discriminator(self.g, reuse=True)
-
-        vars_g = [var for var in tf.trainable_variables(
-        ) if var.name.startswith("generator")]
-        vars_d = [var for var in tf.trainable_variables(
-        ) if var.name.startswith("discriminator")]
-
-        d_reg = tf.contrib.layers.apply_regularization(
-            tf.contrib.layers.l2_regularizer(1e-6), vars_d)
-        g_reg = tf.contrib.layers.apply_regularization(
-            tf.contrib.layers.l2_regularizer(1e-6), vars_g)
-
-        self.loss_d_real = self.binary_cross_entropy(
-            tf.ones_like(d_real), d_real)
-        self.loss_d_fake = self.binary_cross_entropy(
-            tf.zeros_like(d_fake), d_fake)
-
-        self.loss_g = tf.reduce_mean(self.binary_cross_entropy(
-            tf.ones_like(d_fake), d_fake))
-        self.loss_d = tf.reduce_mean(
-            0.5 * (self.loss_d_real + self.loss_d_fake))
-
-        update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
-        with tf.control_dependencies(update_ops):
-            self.optimizer_d = tf.train.RMSPropOptimizer(
-                learning_rate=0.00015).minimize(self.loss_d + d_reg, var_list=vars_d)
-            self.optimizer_g = tf.train.RMSPropOptimizer(
-                learning_rate=0.00015).minimize(self.loss_g + g_reg, var_list=vars_g)
-
-        self.tfSession = tf.Session()
-        self.tfSession.run(tf.global_variables_initializer())
+        self.useDataset = useDataset
+        self.cntModels = cntModels
+        self.xla = xla
+        if self.xla:
+            self.log.info('XLA JIT compilation enabled.')
+        # Mit der Input Pipeline oder mehreren Modellen muss alles in einem
+        # run passieren, sonst zieht jeder run einen eigenen Batch
+        self.fusedTrainStep = fusedTrainStep or useDataset or cntModels > 1
+
+        inputShape, noiseShape = self.__getInputShapes()
+
+        if self.useDataset:
+            self.x_in = self.__buildInputPipeline(inputShape)
+
+            # Rauschen im Graphen erzeugen, für generateImages überschreibbar
+            self.noise = tf.placeholder_with_default(
+                tf.random_uniform(
+                    [tf.shape(self.x_in)[0]] + noiseShape[1:], 0.0, 1.0),
+                shape=noiseShape)
+
+            self.keep_prob = tf.placeholder_with_default(
+                self.keepProbTrain, shape=[], name='keep_prob')
+            self.is_training = tf.placeholder_with_default(
+                True, shape=[], name='is_training')
+        else:
+            self.x_in = tf.placeholder(
+                dtype=tf.float32, shape=inputShape, name='x_in')
+            self.noise = tf.placeholder(
+                dtype=tf.float32, shape=noiseShape)
+
+            self.keep_prob = tf.placeholder(dtype=tf.float32, name='keep_prob')
+            self.is_training = tf.placeholder(
+                dtype=tf.bool, name='is_training')
+
+        if self.cntModels > 1:
+            # Achse 1 ist das Modell, jedes Modell bekommt seine eigenen Bilder
+            x_ins = tf.unstack(self.x_in, self.cntModels, axis=1)
+            noises = tf.unstack(self.noise, self.cntModels, axis=1)
+        else:
+            x_ins, noises = [self.x_in], [self.noise]
+
+        gs, steps = [], []
+        losses_d_real, losses_d_fake, losses_g, losses_d = [], [], [], []
+        trains_d, trains_g = [], []
+        for k in range(self.cntModels):
+            g_scope = self.__getModelScope('generator', k)
+            d_scope = self.__getModelScope('discriminator', k)
+
+            # Forward-Pass und Verluste, die Gradienten werden mit kompiliert
+            with self.__jitScope():
+                g = self.generator(noises[k], scope=g_scope)
+                d_real = self.discriminator(x_ins[k], scope=d_scope)
+                d_fake = self.discriminator(g, reuse=True, scope=d_scope)
+
+                vars_g = [var for var in tf.trainable_variables(
+                ) if var.name.startswith(g_scope + '/')]
+                vars_d = [var for var in tf.trainable_variables(
+                ) if var.name.startswith(d_scope + '/')]
+
+                d_reg = tf.contrib.layers.apply_regularization(
+                    tf.contrib.layers.l2_regularizer(1e-6), vars_d)
+                g_reg = tf.contrib.layers.apply_regularization(
+                    tf.contrib.layers.l2_regularizer(1e-6), vars_g)
+
+                loss_d_real = self.binary_cross_entropy(
+                    tf.ones_like(d_real), d_real)
+                loss_d_fake = self.binary_cross_entropy(
+                    tf.zeros_like(d_fake), d_fake)
+
+                loss_g = tf.reduce_mean(self.binary_cross_entropy(
+                    tf.ones_like(d_fake), d_fake))
+                loss_d = tf.reduce_mean(
+                    0.5 * (loss_d_real + loss_d_fake))
+
+            update_ops = tf.get_collection(
+                tf.GraphKeys.UPDATE_OPS, scope=g_scope + '/')
+            with tf.control_dependencies(update_ops):
+                opt_d = tf.train.RMSPropOptimizer(learning_rate=0.00015)
+                opt_g = tf.train.RMSPropOptimizer(learning_rate=0.00015)
+                if self.fusedTrainStep:
+                    train_d, train_g, step = self.__buildFusedTrainStep(
+                        loss_d, loss_g,
+                        opt_d, loss_d + d_reg, vars_d,
+                        opt_g, loss_g + g_reg, vars_g)
+                    trains_d.append(train_d)
+                    trains_g.append(train_g)
+                    steps.append(step)
+                else:
+                    self.optimizer_d = opt_d.minimize(
+                        loss_d + d_reg, var_list=vars_d)
+                    self.optimizer_g = opt_g.minimize(
+                        loss_g + g_reg, var_list=vars_g)
+
+            gs.append(g)
+            losses_d_real.append(loss_d_real)
+            losses_d_fake.append(loss_d_fake)
+            losses_g.append(loss_g)
+            losses_d.append(loss_d)
+
+        if self.cntModels > 1:
+            # Erste Achse ist das Modell, bei g wie bei x_in die zweite
+            self.g = tf.stack(gs, axis=1)
+            self.loss_d_real = tf.stack(losses_d_real)
+            self.loss_d_fake = tf.stack(losses_d_fake)
+            self.loss_g = tf.stack(losses_g)
+            self.loss_d = tf.stack(losses_d)
+            self.train_d = tf.stack(trains_d)
+            self.train_g = tf.stack(trains_g)
+        else:
+            self.g = gs[0]
+            self.loss_d_real = losses_d_real[0]
+            self.loss_d_fake = losses_d_fake[0]
+            self.loss_g = losses_g[0]
+            self.loss_d = losses_d[0]
+            if self.fusedTrainStep:
+                self.train_d = trains_d[0]
+                self.train_g = trains_g[0]
+
+        if self.fusedTrainStep:
+            self.train_step = tf.group(*steps, name='train_step')
+
+        # Eigener Generator Kopf für den Export, BatchNorm mit den
+        # gleitenden Mittelwerten und ohne Abhängigkeit zur Input Pipeline
+        self.infer_heads = []
+        for k in range(self.cntModels):
+            with self.__jitScope():
+                noise_infer = tf.placeholder(
+                    dtype=tf.float32, shape=[None, self.n_noise],
+                    name=self.__getModelScope('noise_infer', k))
+                g_infer = self.generator(
+                    noise_infer, scope=self.__getModelScope('generator', k),
+                    reuse=True, is_training=False)
+                g_infer = tf.identity(
+                    g_infer, name=self.__getModelScope('generated', k))
+            self.infer_heads.append((noise_infer, g_infer))
+
+        # Epochenzähler für den Checkpoint
+        self.epoch_counter = tf.Variable(
+            0, dtype=tf.int64, trainable=False, name='epoch_counter')
+        self.epoch_in = tf.placeholder(dtype=tf.int64, shape=[])
+        self.set_epoch = tf.assign(self.epoch_counter, self.epoch_in)
+        self.saver = tf.train.Saver(max_to_keep=1)
+
+        # 0 überlässt TF die Anzahl der Threads
+        sessionConfig = tf.ConfigProto(
+            intra_op_parallelism_threads=intraOpThreads,
+            inter_op_parallelism_threads=interOpThreads)
+
+        self.init_op = tf.global_variables_initializer()
+
+        self.tfSession = tf.Session(config=sessionConfig)
+        self.tfSession.run(self.init_op)
+
+        # Der Graph wird pro Prozess nur einmal gebaut, danach darf nichts
+        # mehr hinzukommen
+        self.tfSession.graph.finalize()
         self.isDcganReady = True
         self.log.info('DCGAN initialized.')
 
+    def isReusable(self, cntModels=1, xla=False):
+        return (self.isDcganReady and self.cntModels == cntModels
+                and self.xla == xla)
+
+    def __jitScope(self):
+        # Die vielen kleinen Ops von Generator und Diskriminator zu XLA
+        # Clustern zusammenfassen, funktioniert auch auf der CPU
+        if self.xla:
+            return tf.contrib.compiler.jit.experimental_jit_scope(
+                compile_ops=True)
+        return contextlib.ExitStack()
+
+    def resetWeights(self):
+        # Vergessen ohne neuen Graphen: Gewichte, BatchNorm Statistiken,
+        # Optimierer Slots und Epochenzähler neu initialisieren
+        self.log.info('Resetting DCGAN weights...')
+        self.tfSession.run(self.init_op)
+        self.isEpochReady = False
+        self.checkpointDir = None
+        self.resume = False
+        self.log.info('DCGAN weights reset.')
+
+    def __getInputShapes(self):
+        if self.cntModels > 1:
+            return ([None, self.cntModels] + self.imgShape[1:],
+                    [None, self.cntModels, self.n_noise])
+        return self.imgShape, [None, self.n_noise]
+
+    def __getModelScope(self, name, k):
+        # Ein einzelnes Modell behält die bisherigen Namen
+        if self.cntModels > 1:
+            return '{}_{}'.format(name, k)
+        return name
+
+    def __buildInputPipeline(self, inputShape):
+        # Die Bilder werden nur einmal beim Initialisieren übergeben
+        self.data_images = tf.placeholder(
+            dtype=tf.uint8, shape=inputShape, name='data_images')
+        self.data_batch_size = tf.placeholder(
+            dtype=tf.int64, shape=[], name='data_batch_size')
+
+        # shuffle vor batch und repeat, damit ein Batch wie in next_batch
+        # nie über eine Epochengrenze geht
+        dataset = tf.data.Dataset.from_tensor_slices(self.data_images)
+        dataset = dataset.shuffle(
+            buffer_size=tf.shape(self.data_images, out_type=tf.int64)[0])
+        dataset = dataset.batch(self.data_batch_size, drop_remainder=True)
+        # uint8 bis hierher, normalisiert wird pro Batch
+        dataset = dataset.map(
+            lambda batch: tf.cast(batch, tf.float32) * (1.0 / 255.0))
+        dataset = dataset.repeat()
+        dataset = dataset.prefetch(self.prefetchBatches)
+
+        self.data_iterator = dataset.make_initializable_iterator()
+        return self.data_iterator.get_next(name='x_in')
+
+    def __initInputPipeline(self):
+        self.log.info('Initializing input pipeline with {} images...'.format(
+            self.cntBaseImages))
+        assert self.batch_size <= self.cntBaseImages
+        self.tfSession.run(self.data_iterator.initializer, feed_dict={
+            self.data_images: self.images,
+            self.data_batch_size: self.batch_size
+        })
+
+    def __buildFusedTrainStep(
+        self, loss_d, loss_g,
+        opt_d, train_loss_d, vars_d,
+        opt_g, train_loss_g, vars_g
+    ):
+        grads_d = opt_d.compute_gradients(train_loss_d, var_list=vars_d)
+        grads_g = opt_g.compute_gradients(train_loss_g, var_list=vars_g)
+
+        # Erst alle Gradienten berechnen, danach erst die Gewichte ändern
+        grads = [g for g, _ in grads_d + grads_g if g is not None]
+        with tf.control_dependencies(grads):
+            # Gleiche Regel wie in __trainStep, nur innerhalb des Graphen
+            train_d = tf.logical_not(loss_d * 2 < loss_g)
+            train_g = tf.logical_not(loss_g * 1.5 < loss_d)
+
+        step_d = tf.cond(
+            train_d,
+            lambda: self.__applyGradients(opt_d, grads_d),
+            lambda: tf.constant(False))
+        step_g = tf.cond(
+            train_g,
+            lambda: self.__applyGradients(opt_g, grads_g),
+            lambda: tf.constant(False))
+
+        return train_d, train_g, tf.group(step_d, step_g)
+
+    def __applyGradients(self, optimizer, grads):
+        with tf.control_dependencies([optimizer.apply_gradients(grads)]):
+            return tf.constant(True)
+
     def __allReady(self):
         ready = False
 
         self.log.debug('All ready check:')
         self.log.debug('Epoch ready? \t{}'.format(self.isEpochReady))
         self.log.debug('Dcgan ready? \t{}'.format(self.isDcganReady))
-        self.log.debug('Images ready? \t{}'.format(len(self.images)))
-        self.log.debug('Labels ready? \t{}'.format(len(self.labels)))
+        self.log.debug('Images ready? \t{}'.format(self.cntBaseImages))
 
+        # Nicht images.any(), das würde den ganzen Datensatz lesen
         if (self.isEpochReady and
             self.isDcganReady and
-            self.images.any() and
-                self.labels.any()):
+                self.cntBaseImages > 0):
             ready = True
 
         return ready
 
     def __del__(self):
         self.log.debug('Killing Itsdcgan...')
+        if self.imageWriter:
+            self.imageWriter.close()
         if self.tfSession:
             self.tfSession.close()
             del self.tfSession
@@ -137,16 +408,25 @@ class ItsDcgan():
     def createNoise(self, batch_size, n_noise):
         return np.random.uniform(0.0, 1.0, [batch_size, n_noise]).astype(np.float32)
 
-    def setSessionBaseImages(self, sessionNr, imgs):
+    def setSessionBaseImages(self, sessionNr, imgs, baseImages=None):
         self.sessionNr = sessionNr
-        self.images = np.array(imgs)
+        if self.cntModels > 1:
+            # Pro Modell eine eigene Bildliste gleicher Länge
+            imgs = np.stack([np.asarray(m, dtype=np.uint8) for m in imgs], axis=1)
+
+        # Die Bilder bleiben uint8, ein uint8 Array oder memmap wird nicht
+        # kopiert. Normalisiert wird erst pro Batch.
+        self.images = np.asarray(imgs, dtype=np.uint8)
+        self.cntBaseImages = len(self.images)
+
+        # Gemischt wird nur die Reihenfolge der Indizes
+        self.perm = np.arange(self.cntBaseImages)
+        self.index_in_epoch = 0
 
-        # Konvertierung nicht vergessen!
-        self.images = self.images.astype(np.float32)
-        self.images = np.multiply(imgs, 1.0/255.0)
-        
-        self.labels = np.ones(len(imgs))
-        self.cntBaseImages = len(imgs)
+        # Namen der Basisbilder für die Epoch History
+        if not isinstance(baseImages, list):
+            baseImages = [baseImages] * self.cntModels
+        self.baseImages = baseImages
 
     def next_batch(self):
         start = self.index_in_epoch
@@ -156,49 +436,72 @@ class ItsDcgan():
             self.epochs_completed += 1
 
             # Shuffle data
-            perm = np.arange(self.cntBaseImages)
-            np.random.shuffle(perm)
-            self.images = self.images[perm]
-            self.labels = self.labels[perm]
+            np.random.shuffle(self.perm)
 
             # Start next epoch
             start = 0
             self.index_in_epoch = self.batch_size
             assert self.batch_size <= self.cntBaseImages
         end = self.index_in_epoch
-        return self.images[start:end], self.labels[start:end]
+
+        # Sortierte Indizes lesen eine memmap möglichst am Stück, die
+        # Reihenfolge innerhalb eines Batches spielt keine Rolle
+        idx = np.sort(self.perm[start:end])
+        batch = self.images[idx].astype(np.float32)
+        batch *= np.float32(1.0 / 255.0)
+        return batch, np.ones(len(batch), dtype=np.float32)
 
     def saveEpochImages(self, imgs, epoch, hisId):
-        if self.outputDir:
+        if self.imageSink:
+            self.log.info('Handing {} images to the requester'.format(len(imgs)))
+            imgs = (imgs * 255).round().astype(np.uint8)
+            writer = self.__getImageWriter()
+
+            for i in range(len(imgs)):
+                writer.submit(ItsImageInfo(
+                    self.sessionNr, epoch, hisId, i, imgs[i]))
+        elif self.outputDir:
             self.log.info('Generating {} images in folder {}'.format(
                 len(imgs), self.outputDir))
             # Konvertierung der Bilder
             imgs = (imgs * 255).round().astype(np.uint8)
 
+            # PNG Kodierung und Schreiben laufen im Hintergrund
+            writer = self.__getImageWriter()
+
             for i in range(len(imgs)):
                 imgName = self.imageNameFormat.format(self.sessionNr, epoch, hisId, i)
                 imgPath = os.path.join(self.outputDir, imgName)
                 self.log.debug('Generating image {}'.format(imgPath))
-                imageio.imwrite(imgPath, imgs[i])
+                writer.write(imgs[i], imgPath)
         else:
             self.log.error('No output directory specified.')
 
+    def __getImageWriter(self):
+        if not self.imageWriter:
+            self.imageWriter = ItsImageWriter(
+                self.log, self.imageWriterThreads,
+                self.imageQueueSize, self.imageSink)
+        return self.imageWriter
+
     def getEpochInfo(
         self, epoch=-1, d_ls=-1,
         g_ls=-1, d_real_ls=-1,
-        d_fake_ls=-1
+        d_fake_ls=-1, model=0
     ):
         self.log.info('Generating EpochInfo...')
         return ItsEpochInfo(
             self.sessionNr, epoch,
             self.batch_size,
             d_ls, g_ls,
-            d_real_ls, d_fake_ls
+            d_real_ls, d_fake_ls,
+            self.baseImages[model],
+            self.entryId
         )
 
-    def discriminator(self, img_in, reuse=None):
+    def discriminator(self, img_in, reuse=None, scope='discriminator'):
         activation = self.lrelu
-        with tf.variable_scope('discriminator', reuse=reuse):
+        with tf.variable_scope(scope, reuse=reuse):
             self.log.debug('img_in : {}'.format(img_in))
             x = tf.reshape(img_in, shape=[-1, 64, 64, 3])
             self.log.debug('reshaped img_in : {}'.format(x))
@@ -215,16 +518,18 @@ class ItsDcgan():
             x = tf.layers.dense(x, units=1, activation=tf.nn.sigmoid)
         return x
 
-    def generator(self, z):
+    def generator(self, z, scope='generator', reuse=None, is_training=None):
         activation = self.lrelu
         momentum = 0.99
-        with tf.variable_scope('generator', reuse=None):
+        if is_training is None:
+            is_training = self.is_training
+        with tf.variable_scope(scope, reuse=reuse):
             x = z
             d1 = 4
             d2 = 3
             x = tf.layers.dense(x, units=d1*d1*d2, activation=activation)
             x = tf.layers.dropout(x, self.keep_prob)
-            x = tf.contrib.layers.batch_norm(x, is_training=self.is_training,
+            x = tf.contrib.layers.batch_norm(x, is_training=is_training,
                                              decay=momentum)
             x = tf.reshape(x, shape=[-1, d1, d1, d2])
 
@@ -236,7 +541,7 @@ class ItsDcgan():
                                            strides=2, padding='same',
                                            activation=activation)
             x = tf.layers.dropout(x, self.keep_prob)
-            x = tf.contrib.layers.batch_norm(x, is_training=self.is_training,
+            x = tf.contrib.layers.batch_norm(x, is_training=is_training,
                                              decay=momentum)
 
             # 32x32
@@ -244,7 +549,7 @@ class ItsDcgan():
                                            strides=2, padding='same',
                                            activation=activation)
             x = tf.layers.dropout(x, self.keep_prob)
-            x = tf.contrib.layers.batch_norm(x, is_training=self.is_training,
+            x = tf.contrib.layers.batch_norm(x, is_training=is_training,
                                              decay=momentum)
 
             # 64x64
@@ -252,119 +557,442 @@ class ItsDcgan():
                                            strides=2, padding='same',
                                            activation=activation)
             x = tf.layers.dropout(x, self.keep_prob)
-            x = tf.contrib.layers.batch_norm(x, is_training=self.is_training,
+            x = tf.contrib.layers.batch_norm(x, is_training=is_training,
                                              decay=momentum)
 
             x = tf.layers.conv2d_transpose(x, kernel_size=5, filters=64,
                                            strides=1, padding='same',
                                            activation=activation)
             x = tf.layers.dropout(x, self.keep_prob)
-            x = tf.contrib.layers.batch_norm(x, is_training=self.is_training,
+            x = tf.contrib.layers.batch_norm(x, is_training=is_training,
                                              decay=momentum)
             x = tf.layers.conv2d_transpose(x, kernel_size=5, filters=3,
                                            strides=1, padding='same',
                                            activation=tf.nn.sigmoid)
             return x
 
+    def createModelNoise(self, cnt):
+        # Bei mehreren Modellen bekommt jedes Modell eigenes Rauschen
+        if self.cntModels > 1:
+            return self.createNoise(cnt, self.cntModels * self.n_noise).reshape(
+                cnt, self.cntModels, self.n_noise)
+        return self.createNoise(cnt, self.n_noise)
+
     def generateImages(self, cnt):
-        n = self.createNoise(cnt, self.n_noise)
+        n = self.createModelNoise(cnt)
 
         # Bild vom Generator erzeugen lassen
-        gen_img = self.tfSession.run(self.g, feed_dict={
+        gen_img = self.__run(None, 'generate', self.g, feed_dict={
             self.noise: n, self.keep_prob: 1.0, self.is_training: False
         })
 
         return gen_img
 
+    def __trainStep(self, i, batch, n, keep_prob_train):
+        train_d = True
+        train_g = True
+
+        d_real_ls, d_fake_ls, g_ls, d_ls = self.__run(
+            i, 'loss',
+            [self.loss_d_real, self.loss_d_fake,
+             self.loss_g, self.loss_d],
+            feed_dict={
+                self.x_in: batch,
+                self.noise: n,
+                self.keep_prob: keep_prob_train,
+                self.is_training: True
+            })
+
+        d_real_ls = np.mean(d_real_ls)
+        d_fake_ls = np.mean(d_fake_ls)
+
+        if g_ls * 1.5 < d_ls:
+            train_g = False
+            pass
+
+        if d_ls * 2 < g_ls:
+            train_d = False
+            pass
+
+        if train_d:
+            if not i % self.debugOutputSteps:
+                self.log.debug('Training: Discriminator')
+            self.__run(i, 'train_d', self.optimizer_d, feed_dict={
+                self.noise: n,
+                self.x_in: batch,
+                self.keep_prob: keep_prob_train,
+                self.is_training: True
+            })
+
+        if train_g:
+            if not i % self.debugOutputSteps:
+                self.log.debug('Training: Generator')
+            self.__run(i, 'train_g', self.optimizer_g, feed_dict={
+                self.noise: n,
+                self.keep_prob: keep_prob_train,
+                self.is_training: True
+            })
+
+        return [d_real_ls], [d_fake_ls], [g_ls], [d_ls]
+
+    def __fusedTrainStep(self, i, feed_dict):
+        # Verluste, Gating und beide Optimierer in einem einzigen run
+        d_real_ls, d_fake_ls, g_ls, d_ls, train_d, train_g, _ = self.__run(
+            i, 'train_step',
+            [self.loss_d_real, self.loss_d_fake,
+             self.loss_g, self.loss_d,
+             self.train_d, self.train_g, self.train_step],
+            feed_dict=feed_dict)
+
+        if not i % self.debugOutputSteps:
+            if np.any(train_d):
+                self.log.debug('Training: Discriminator {}'.format(train_d))
+            if np.any(train_g):
+                self.log.debug('Training: Generator {}'.format(train_g))
+
+        return (self.__perModel(d_real_ls, mean=True),
+                self.__perModel(d_fake_ls, mean=True),
+                self.__perModel(g_ls), self.__perModel(d_ls))
+
+    def __run(self, i, phase, fetches, feed_dict=None):
+        # Jeder run im Trainingsloop läuft hierüber, damit er gemessen wird
+        if not self.__isTraceStep(i):
+            with self.timer.phase(phase):
+                return self.tfSession.run(fetches, feed_dict=feed_dict)
+
+        meta = tf.RunMetadata()
+        with self.timer.phase(phase):
+            result = self.tfSession.run(
+                fetches, feed_dict=feed_dict,
+                options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+                run_metadata=meta)
+        self.__writeTrace(i, phase, meta)
+        return result
+
+    def __isTraceStep(self, i):
+        # Epoche 0 ist Warmup und wird nie getraced
+        return bool(self.traceStep and i and not i % self.traceStep)
+
+    def __writeTrace(self, i, phase, meta):
+        path = os.path.join(
+            ItsConfig.VOLUME_FOLDER or '.',
+            'its_dcgan_trace_{}_{}_{}.json'.format(self.sessionNr, i, phase))
+        trace = timeline.Timeline(meta.step_stats)
+        with open(path, 'w') as f:
+            f.write(trace.generate_chrome_trace_format())
+        self.log.info('Epoch {}: Trace written to {}'.format(i, path))
+
+    def __exportTiming(self, i):
+        path = os.path.join(
+            ItsConfig.VOLUME_FOLDER or '.',
+            'its_dcgan_timing_{}.json'.format(os.getpid()))
+        self.timer.export(path, {
+            'session': self.sessionNr,
+            'base_images': [str(n) for n in self.baseImages],
+            'epoch': i
+        })
+        self.log.info('Epoch {}: Timing {}'.format(i, self.timer.getSummary()))
+
+    def __perModel(self, values, mean=False):
+        # Bei mehreren Modellen ist die erste Achse das Modell
+        if self.cntModels == 1:
+            values = [values]
+        if mean:
+            return [np.mean(v) for v in values]
+        return list(values)
+
+    def __getModelImages(self, imgs, k):
+        if self.cntModels > 1:
+            return imgs[:, k]
+        return imgs
+
+    @staticmethod
+    def getCheckpointDir(checkpointRoot, sessionNr, baseImages):
+        # Ein Ordner pro Session und Basisbild-Gruppe. Name und Pixel gehen
+        # in den Schlüssel ein, bei AutoFind ist der Name nur die Klasse und
+        # das Bild kann sich beim Resume geändert haben.
+        h = hashlib.sha1()
+        for name, img in baseImages:
+            img = np.ascontiguousarray(img, dtype=np.uint8)
+            h.update('{}|{}|'.format(name, img.shape).encode('utf8'))
+            h.update(img.tobytes())
+        key = h.hexdigest()
+        return os.path.join(checkpointRoot, '{}_{}'.format(sessionNr, key[:16]))
+
+    @staticmethod
+    def isCheckpointFinished(checkpointDir):
+        return os.path.exists(os.path.join(checkpointDir, 'finished'))
+
+    def __prepareCheckpoint(self, stoppings):
+        if not self.checkpointDir or not self.checkpointSteps:
+            return 0
+
+        if self.resume:
+            epoch = self.restoreCheckpoint(self.checkpointDir)
+            if epoch >= 0:
+                self.__restoreStoppings(stoppings)
+                return epoch + 1
+
+        # Kein Resume, alte Stände verwerfen
+        if os.path.exists(self.checkpointDir):
+            shutil.rmtree(self.checkpointDir)
+        os.makedirs(self.checkpointDir)
+        # Der Saver löscht sonst den Checkpoint des vorherigen Basisbilds
+        self.saver.set_last_checkpoints_with_time([])
+        with open(os.path.join(self.checkpointDir, 'base_images.txt'), 'w') as f:
+            f.write('\n'.join(str(n) for n in self.baseImages))
+        return 0
+
+    def restoreCheckpoint(self, checkpointDir):
+        ckpt = tf.train.latest_checkpoint(checkpointDir)
+        if not ckpt:
+            return -1
+
+        self.log.info('Restoring checkpoint {}'.format(ckpt))
+        self.saver.restore(self.tfSession, ckpt)
+        # Der Saver verwaltet nur die Checkpoints dieses Ordners, sonst
+        # räumt er beim nächsten Speichern einen fremden Ordner auf
+        state = tf.train.get_checkpoint_state(checkpointDir)
+        self.saver.set_last_checkpoints_with_time([])
+        self.saver.recover_last_checkpoints(state.all_model_checkpoint_paths)
+        return int(self.tfSession.run(self.epoch_counter))
+
+    def __saveCheckpoint(self, epoch, stoppings):
+        self.tfSession.run(self.set_epoch, feed_dict={self.epoch_in: epoch})
+        path = self.saver.save(
+            self.tfSession, os.path.join(self.checkpointDir, 'dcgan'))
+
+        # Verlauf der Abbruchkriterien gehört zum Checkpoint
+        statePath = os.path.join(self.checkpointDir, 'early_stopping.json')
+        with open(statePath + '.tmp', 'w') as f:
+            json.dump([s.getState() for s in stoppings], f)
+        os.replace(statePath + '.tmp', statePath)
+        self.log.info('Epoch {}: Checkpoint saved to {}'.format(epoch, path))
+
+    def __restoreStoppings(self, stoppings):
+        statePath = os.path.join(self.checkpointDir, 'early_stopping.json')
+        if not os.path.exists(statePath):
+            self.log.info('No early stopping state in {}, starting over.'.format(
+                self.checkpointDir))
+            return
+
+        with open(statePath) as f:
+            states = json.load(f)
+        for stopping, state in zip(stoppings, states):
+            stopping.setState(state)
+
+    def __finishCheckpoint(self):
+        if self.checkpointDir and self.checkpointSteps:
+            open(os.path.join(self.checkpointDir, 'finished'), 'w').close()
+
+    def __createEarlyStopping(self):
+        return ItsEarlyStopping(
+            self.stopWindow, self.stopMinDelta, self.stopMaxLoss,
+            self.stopTimeBudget, self.stopConfidence)
+
+    def __checkEarlyStopping(self, stopping, i, k):
+        maxConf = None
+        if stopping.useConfidence():
+            with self.timer.phase('stop_confidence'):
+                maxConf = self.sqlLog.getMaxConfidence(stopping.hisIds)
+
+        reason = stopping.check(maxConf)
+        if reason:
+            self.log.info('Epoch {}: Stopping {} ({})'.format(
+                i, self.baseImages[k], reason))
+            self.sqlLog.logStopReason(stopping.hisIds[-1], reason)
+
+    def __finishEarlyStopping(self, stoppings):
+        # Ohne vorzeitigen Abbruch wurde bis max_epoch trainiert
+        for stopping in stoppings:
+            if not stopping.reason and stopping.hisIds:
+                stopping.reason = ItsEarlyStopping.FINISHED
+                self.sqlLog.logStopReason(stopping.hisIds[-1], stopping.reason)
+
+    def exportGenerator(self, path, model=0, epoch=-1, hisId=-1):
+        # Eingefrorener Graph nur mit dem Generator Kopf, die Gewichte sind
+        # danach Konstanten
+        noise_infer, g_infer = self.infer_heads[model]
+        graphDef = tf.graph_util.convert_variables_to_constants(
+            self.tfSession, self.tfSession.graph.as_graph_def(),
+            [g_infer.op.name])
+
+        with tf.gfile.GFile(path, 'wb') as f:
+            f.write(graphDef.SerializeToString())
+
+        # Ein- und Ausgang und die Herkunft für den Requester
+        with open(ItsDcgan.getGeneratorInfoPath(path), 'w') as f:
+            json.dump({
+                'input': noise_infer.name,
+                'output': g_infer.name,
+                'n_noise': self.n_noise,
+                'session': self.sessionNr,
+                'epoch': epoch,
+                'his_id': hisId,
+                'base_image': str(self.baseImages[model])
+            }, f, indent=2)
+
+        self.log.info('Generator {} exported to {}'.format(
+            self.baseImages[model], path))
+
+    @staticmethod
+    def getGeneratorInfoPath(path):
+        return os.path.splitext(path)[0] + '.json'
+
+    def __exportGenerators(self, stoppings):
+        if not self.exportRoot:
+            return
+
+        if not os.path.exists(self.exportRoot):
+            os.makedirs(self.exportRoot)
+
+        for k, stopping in enumerate(stoppings):
+            name = re.sub(r'[^\w.-]', '_', str(self.baseImages[k]))
+            path = os.path.join(
+                self.exportRoot, '{}_{}.pb'.format(self.sessionNr, name))
+
+            epoch, hisId = -1, -1
+            if stopping.hisIds:
+                epoch, hisId = stopping.epochs[-1], stopping.hisIds[-1]
+            self.exportGenerator(path, k, epoch, hisId)
+
+    def startSession(self, itsSessionInfo, baseImages):
+        # baseImages ist eine Liste aus (Name, Bild), ein Eintrag pro Modell
+        names = [name for name, _ in baseImages]
+        if self.checkpointRoot:
+            self.checkpointDir = ItsDcgan.getCheckpointDir(
+                self.checkpointRoot, itsSessionInfo.sessionNr, baseImages)
+        self.resume = itsSessionInfo.resume
+        self.entryId = itsSessionInfo.entryId
+        if self.cntModels > 1:
+            imgs = [[img, img] for _, img in baseImages]
+            self.setSessionBaseImages(itsSessionInfo.sessionNr, imgs, names)
+        else:
+            name, img = baseImages[0]
+            self.setSessionBaseImages(
+                itsSessionInfo.sessionNr, [img, img], name)
+
+        self.log.info('Training base images: {}'.format(names))
+        self.initEpoch(
+            itsSessionInfo.max_epoch,
+            itsSessionInfo.batch_size,
+            itsSessionInfo.enableImageGeneration,
+            itsSessionInfo.stepsHistory,
+            itsSessionInfo.cntGenerateImages,
+            itsSessionInfo.checkpointSteps
+        )
+        self.start()
+
     def start(self):
         if self.__allReady():
             self.log.info(
                 'Starting DCGAN for {} epochs...'.format(self.max_epochs))
             start, end = None, None
-            for i in range(self.max_epochs):
+            self.timer.reset()
+            stoppings = [self.__createEarlyStopping()
+                         for _ in range(self.cntModels)]
+            if self.useDataset:
+                self.__initInputPipeline()
+
+            startEpoch = self.__prepareCheckpoint(stoppings)
+            if startEpoch:
+                self.log.info('Resuming at epoch {}'.format(startEpoch))
+
+            i = startEpoch
+            for i in range(startEpoch, self.max_epochs):
                 if not i % self.debugOutputSteps:
                     self.log.info('Starting Epoch {}'.format(i))
                     start = time.time()
 
-                train_d = True
-                train_g = True,
-                keep_prob_train = 0.6
+                keep_prob_train = self.keepProbTrain
+
+                if self.useDataset:
+                    # Batch und Rauschen kommen aus dem Graphen
+                    d_real_ls, d_fake_ls, g_ls, d_ls = self.__fusedTrainStep(
+                        i, None)
+                else:
+                    with self.timer.phase('noise'):
+                        n = self.createModelNoise(self.batch_size)
+                    with self.timer.phase('batch'):
+                        batch = self.next_batch()[0]
+
+                    if self.fusedTrainStep:
+                        d_real_ls, d_fake_ls, g_ls, d_ls = self.__fusedTrainStep(
+                            i, {
+                                self.x_in: batch,
+                                self.noise: n,
+                                self.keep_prob: keep_prob_train,
+                                self.is_training: True
+                            })
+                    else:
+                        d_real_ls, d_fake_ls, g_ls, d_ls = self.__trainStep(
+                            i, batch, n, keep_prob_train)
 
-                n = self.createNoise(self.batch_size, self.n_noise)
+                if i > 0:
+                    if not i % self.stepsHistory:
 
-                batch = self.next_batch()[0]
+                        # Bilder generieren, für alle Modelle in einem run
+                        if self.enableImageGeneration:
+                            self.log.info('Epoch {}: Generating {} images'.format(
+                                i, self.cntGenerateImages))
+                            imgs = self.generateImages(self.cntGenerateImages)
 
-                d_real_ls, d_fake_ls, g_ls, d_ls = self.tfSession.run(
-                    [self.loss_d_real, self.loss_d_fake,
-                     self.loss_g, self.loss_d],
-                    feed_dict={
-                        self.x_in: batch,
-                        self.noise: n,
-                        self.keep_prob: keep_prob_train,
-                        self.is_training: True
-                    })
+                        # Jedes Modell bekommt einen eigenen History Eintrag
+                        for k in range(self.cntModels):
+                            # Gestoppte Modelle laufen im Graphen mit, werden
+                            # aber nicht mehr protokolliert
+                            if stoppings[k].reason:
+                                continue
 
-                d_real_ls = np.mean(d_real_ls)
-                d_fake_ls = np.mean(d_fake_ls)
+                            eLoss = self.getEpochInfo(
+                                i, d_ls[k], g_ls[k],
+                                d_real_ls[k], d_fake_ls[k], k
+                            )
 
-                if g_ls * 1.5 < d_ls:
-                    train_g = False
-                    pass
+                            self.log.debugEpochInfo(eLoss)
+                            with self.timer.phase('epoch_info'):
+                                hisId = self.sqlLog.logEpochInfo(eLoss)
 
-                if d_ls * 2 < g_ls:
-                    train_d = False
-                    pass
+                            if self.enableImageGeneration:
+                                with self.timer.phase('save_images'):
+                                    self.saveEpochImages(
+                                        self.__getModelImages(imgs, k), i, hisId)
 
-                if train_d:
-                    if not i % self.debugOutputSteps:
-                        self.log.debug('Training: Discriminator')
-                    self.tfSession.run(self.optimizer_d, feed_dict={
-                        self.noise: n,
-                        self.x_in: batch,
-                        self.keep_prob: keep_prob_train,
-                        self.is_training: True
-                    })
-
-                if train_g:
-                    if not i % self.debugOutputSteps:
-                        self.log.debug('Training: Generator')
-                    self.tfSession.run(self.optimizer_g, feed_dict={
-                        self.noise: n,
-                        self.keep_prob: keep_prob_train,
-                        self.is_training: True
-                    })
+                            stoppings[k].addHistory(d_ls[k], g_ls[k], hisId, i)
+                            self.__checkEarlyStopping(stoppings[k], i, k)
 
-                if i > 0:
-                    if not i % self.stepsHistory:
+                        if self.checkpointSteps and self.checkpointDir:
+                            if not i % self.checkpointSteps:
+                                with self.timer.phase('checkpoint'):
+                                    self.__saveCheckpoint(i, stoppings)
 
-                        eLoss = self.getEpochInfo(
-                            i, d_ls, g_ls,
-                            d_real_ls, d_fake_ls
-                        )
+                        self.__exportTiming(i)
 
-                        self.log.debugEpochInfo(eLoss)
-                        hisId = self.sqlLog.logEpochInfo(eLoss)
+                        if all(s.reason for s in stoppings):
+                            break
 
-                        # Bilder generieren
-                        if self.enableImageGeneration:
-                            self.log.info('Epoch {}: Generating {} images'.format(
-                                i, self.cntGenerateImages))
-                            imgs = self.generateImages(self.cntGenerateImages)
-                            self.saveEpochImages(imgs, i, hisId)
-                
                 if i > 0:
                     if not i % self.debugOutputSteps:
                         end = time.time() - start
                         self.log.info(
                             'Epoch {} completed in {:2.3f}s.'.format(i, end))
 
+            # Erst fertig, wenn alle Bilder auf der Platte liegen
+            if self.imageWriter:
+                with self.timer.phase('flush_images'):
+                    self.imageWriter.flush()
+
+            self.__exportTiming(i)
+            self.__finishEarlyStopping(stoppings)
+            self.__exportGenerators(stoppings)
+            self.__finishCheckpoint()
             self.log.info('Run {} completed.'.format(i))
         else:
             if not self.isEpochReady:
                 self.log.error('Start error: Epoch not initialized.')
             elif not self.isDcganReady:
                 self.log.error('Start error: DCGAN not initialized')
-            elif not self.images:
+            elif not self.cntBaseImages:
                 self.log.error('Start error: No base images defined.')
             
             self.log.error('Start error: Check the logs.')
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+'''
+    Meldet neue PNGs im Request Ordner. Unter Linux per inotify (optional,
+    inotify_simple), sonst per Polling mit Pause zwischen den Scans. Ein
+    kompletter Scan läuft zusätzlich in größeren Abständen, damit auch
+    liegen gebliebene Bilder wieder gefunden werden.
+'''
+
+import os
+import time
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class ItsDirWatcher():
+
+    def __init__(self, directory, log, pollInterval=1.0, rescanInterval=30.0):
+        self.directory = directory
+        self.log = log
+        self.pollInterval = pollInterval
+        self.rescanInterval = rescanInterval
+        self.lastScan = 0
+        self.inotify = None
+
+        if INotify:
+            try:
+                self.inotify = INotify()
+                # ImageWriter benennt um (MOVED_TO), andere schreiben direkt
+                self.inotify.add_watch(
+                    self.directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+                self.log.info('Watching {} with inotify.'.format(self.directory))
+            except OSError as e:
+                self.log.error('inotify not available: {}'.format(e))
+                self.inotify = None
+
+        if not self.inotify:
+            self.log.info('Polling {} every {}s.'.format(
+                self.directory, self.pollInterval))
+
+    def wait(self, timeout):
+        # Liefert Pfade, die neu sein könnten, Doppelte filtert der Aufrufer
+        now = time.time()
+        if now - self.lastScan >= self.rescanInterval:
+            self.lastScan = now
+            return self.scan()
+
+        if self.inotify:
+            events = self.inotify.read(timeout=int(timeout * 1000))
+            return [os.path.join(self.directory, e.name)
+                    for e in events if self.isImage(e.name)]
+
+        time.sleep(min(timeout, self.pollInterval))
+        self.lastScan = time.time()
+        return self.scan()
+
+    def scan(self):
+        paths = []
+        for root, _, files in os.walk(self.directory):
+            for f in files:
+                if self.isImage(f):
+                    paths.append(os.path.join(root, f))
+        return paths
+
+    def isImage(self, name):
+        # Temporäre Dateien vom ImageWriter ignorieren
+        return name.endswith('.png') and not name.startswith('.')
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+'''
+    Abbruchkriterien für ein Training. Geprüft wird nur bei den History
+    Schritten, also mit den Verlusten, die auch in its_epoch_history landen.
+'''
+
+import time
+import math
+import numpy as np
+
+
+class ItsEarlyStopping():
+
+    # Gründe, die in its_epoch_history.stop_reason gespeichert werden
+    FINISHED = 'max_epoch'
+    PLATEAU = 'plateau'
+    DIVERGED = 'diverged'
+    TIME_BUDGET = 'time_budget'
+    CONFIDENCE = 'confidence'
+
+    def __init__(
+        self, window=0, minDelta=0.01, maxLoss=0,
+        timeBudget=0, targetConfidence=0
+    ):
+        # window: Anzahl History Einträge, 0 schaltet Plateau und Divergenz ab
+        self.window = window
+        self.minDelta = minDelta
+        self.maxLoss = maxLoss
+        # Sekunden pro Basisbild
+        self.timeBudget = timeBudget
+        self.targetConfidence = targetConfidence
+        self.reset()
+
+    def reset(self):
+        self.d_losses = []
+        self.g_losses = []
+        self.hisIds = []
+        self.epochs = []
+        self.started = time.time()
+        self.reason = None
+
+    def getState(self):
+        # Für den Checkpoint, die Zeit zählt ab dem Start des Basisbilds
+        return {
+            'd_losses': self.d_losses,
+            'g_losses': self.g_losses,
+            'his_ids': self.hisIds,
+            'epochs': self.epochs,
+            'elapsed': time.time() - self.started,
+            'reason': self.reason
+        }
+
+    def setState(self, state):
+        self.d_losses = list(state['d_losses'])
+        self.g_losses = list(state['g_losses'])
+        self.hisIds = list(state['his_ids'])
+        self.epochs = list(state['epochs'])
+        self.started = time.time() - state['elapsed']
+        self.reason = state['reason']
+
+    def useConfidence(self):
+        return self.targetConfidence > 0
+
+    def addHistory(self, d_ls, g_ls, hisId, epoch=-1):
+        self.d_losses.append(float(d_ls))
+        self.g_losses.append(float(g_ls))
+        self.hisIds.append(hisId)
+        self.epochs.append(epoch)
+
+    def check(self, maxConfidence=None):
+        if self.reason:
+            return self.reason
+
+        if self.__isDiverged():
+            self.reason = ItsEarlyStopping.DIVERGED
+        elif self.__isPlateau():
+            self.reason = ItsEarlyStopping.PLATEAU
+        elif self.__isConfident(maxConfidence):
+            self.reason = ItsEarlyStopping.CONFIDENCE
+        elif self.timeBudget and time.time() - self.started > self.timeBudget:
+            self.reason = ItsEarlyStopping.TIME_BUDGET
+
+        return self.reason
+
+    def __isDiverged(self):
+        if not self.g_losses:
+            return False
+
+        # Mit NaN wird nichts mehr gelernt, unabhängig von der Einstellung
+        last = self.d_losses[-1] + self.g_losses[-1]
+        if math.isnan(last) or math.isinf(last):
+            return True
+
+        if not self.maxLoss:
+            return False
+
+        # Der Generator liegt über mehrere Einträge hinweg daneben
+        n = max(self.window, 1)
+        if len(self.g_losses) < n:
+            return False
+        return all(g > self.maxLoss for g in self.g_losses[-n:])
+
+    def __isPlateau(self):
+        # Mittelwert der letzten window Einträge mit dem davor vergleichen
+        n = self.window
+        if not n or len(self.g_losses) < 2 * n:
+            return False
+
+        for losses in (self.d_losses, self.g_losses):
+            prev = np.mean(losses[-2 * n:-n])
+            cur = np.mean(losses[-n:])
+            if abs(cur - prev) > self.minDelta * max(abs(prev), 1e-8):
+                return False
+        return True
+
+    def __isConfident(self, maxConfidence):
+        if not self.useConfidence() or maxConfidence is None:
+            return False
+        return maxConfidence >= self.targetConfidence
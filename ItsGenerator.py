@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+    Bilder aus einem exportierten Generator erzeugen, ohne weiter zu
+    trainieren. Der Generator kommt entweder direkt aus dem Training
+    (export_generator) oder wird hier aus einem Checkpoint exportiert.
+'''
+
+import os
+import re
+import json
+import argparse
+import numpy as np
+import multiprocessing as mp
+from itsmisc import ItsConfig, ItsImageInfo
+from itslogging import ItsLogger
+
+
+# Jeder Worker Prozess lädt den Generator genau einmal
+generator = None
+
+
+def initWorker(path, outDir, info, threads, writerThreads):
+    global generator
+    generator = ItsGeneratorWorker(path, outDir, info, threads, writerThreads)
+
+
+def runWorkerTask(task):
+    first, cnt = task
+    return generator.generate(first, cnt)
+
+
+class ItsFrozenGenerator():
+
+    def __init__(self, path, intraOpThreads=0, interOpThreads=0):
+        import tensorflow as tf
+        from ItsDcgan import ItsDcgan
+
+        with open(ItsDcgan.getGeneratorInfoPath(path)) as f:
+            self.info = json.load(f)
+
+        graphDef = tf.GraphDef()
+        with tf.gfile.GFile(path, 'rb') as f:
+            graphDef.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graphDef, name='')
+        self.graph.finalize()
+
+        self.noise = self.graph.get_tensor_by_name(self.info['input'])
+        self.output = self.graph.get_tensor_by_name(self.info['output'])
+        self.n_noise = self.info['n_noise']
+
+        self.tfSession = tf.Session(graph=self.graph, config=tf.ConfigProto(
+            intra_op_parallelism_threads=intraOpThreads,
+            inter_op_parallelism_threads=interOpThreads))
+
+    def generate(self, cnt):
+        n = np.random.uniform(0.0, 1.0, [cnt, self.n_noise]).astype(np.float32)
+        imgs = self.tfSession.run(self.output, feed_dict={self.noise: n})
+        return (imgs * 255).round().astype(np.uint8)
+
+
+class ItsGeneratorWorker():
+
+    def __init__(self, path, outDir, info, threads, writerThreads):
+        from ItsImageWriter import ItsImageWriter
+
+        self.log = ItsLogger('its_generator', outDir=ItsConfig.VOLUME_FOLDER)
+        self.outDir = outDir
+        self.info = info
+        self.generator = ItsFrozenGenerator(path, threads, 1)
+        self.writer = ItsImageWriter(self.log, writerThreads)
+
+    def generate(self, first, cnt):
+        imgs = self.generator.generate(cnt)
+        for i in range(cnt):
+            # Gleiches Namensschema wie im Training, damit der Requester
+            # Session, Epoche und History ID zuordnen kann
+            name = ItsImageInfo(
+                self.info['session'], self.info['epoch'],
+                self.info['his_id'], first + i).getName()
+            self.writer.write(imgs[i], os.path.join(self.outDir, name))
+        self.writer.flush()
+        return cnt
+
+
+class ItsGeneratorCli():
+
+    def __init__(self):
+        self.log = ItsLogger('its_generator', outDir=ItsConfig.VOLUME_FOLDER)
+        self.config = ItsConfig()
+
+    def export(self, checkpointDir, outPath):
+        from ItsDcgan import ItsDcgan
+
+        # Reihenfolge der Modelle steht im Checkpoint Ordner
+        with open(os.path.join(checkpointDir, 'base_images.txt')) as f:
+            names = f.read().split('\n')
+        sessionNr = int(os.path.basename(
+            os.path.normpath(checkpointDir)).split('_')[0])
+
+        dcganCfg = self.config.dcgan_cfg
+        dcgan = ItsDcgan()
+        dcgan.initDcgan(
+            fusedTrainStep=dcganCfg.fusedTrainStep,
+            useDataset=dcganCfg.useDataset,
+            cntModels=len(names))
+        dcgan.sessionNr = sessionNr
+        dcgan.baseImages = names
+
+        epoch = dcgan.restoreCheckpoint(checkpointDir)
+        if epoch < 0:
+            self.log.error('No checkpoint in {}'.format(checkpointDir))
+            return []
+
+        if not os.path.exists(outPath):
+            os.makedirs(outPath)
+
+        paths = []
+        for k, name in enumerate(names):
+            path = os.path.join(outPath, '{}_{}.pb'.format(
+                sessionNr, re.sub(r'[^\w.-]', '_', name)))
+            dcgan.exportGenerator(path, k, epoch)
+            paths.append(path)
+        return paths
+
+    def generate(
+        self, path, cnt, batchSize=256, workers=1,
+        outDir=None, hisId=None, firstIndex=0
+    ):
+        from ItsDcgan import ItsDcgan
+
+        with open(ItsDcgan.getGeneratorInfoPath(path)) as f:
+            info = json.load(f)
+        if hisId is not None:
+            info['his_id'] = hisId
+
+        # Ohne Ausgabeordner landen die Bilder direkt beim Requester
+        if not outDir:
+            outDir = self.config.req_cfg.request_directory
+        if not os.path.exists(outDir):
+            os.makedirs(outDir)
+
+        tasks = [(first, min(batchSize, firstIndex + cnt - first))
+                 for first in range(firstIndex, firstIndex + cnt, batchSize)]
+
+        workers = max(1, workers)
+        threads = max(1, mp.cpu_count() // workers)
+        self.log.info('Generating {} images from {} in {} batches with {} worker(s) to {}'.format(
+            cnt, path, len(tasks), workers, outDir))
+
+        ctx = mp.get_context('spawn')
+        pool = ctx.Pool(
+            workers, initializer=initWorker,
+            initargs=(path, outDir, info, threads, 2))
+        done = 0
+        try:
+            for n in pool.imap_unordered(runWorkerTask, tasks):
+                done += n
+                self.log.info('{}/{} images written.'.format(done, cnt))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        return done
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Export a trained generator or generate images from it.')
+    sub = parser.add_subparsers(dest='cmd')
+
+    exp = sub.add_parser('export', help='Export generators from a checkpoint directory')
+    exp.add_argument('checkpoint')
+    exp.add_argument('--out', help='Output directory, default is its_generator')
+
+    gen = sub.add_parser('generate', help='Generate images from an exported generator')
+    gen.add_argument('generator', help='Path to the exported .pb file')
+    gen.add_argument('--count', type=int, default=1000)
+    gen.add_argument('--batch-size', type=int, default=256)
+    gen.add_argument('--workers', type=int, default=1)
+    gen.add_argument('--out', help='Output directory, default is the requester directory')
+    gen.add_argument('--his-id', type=int,
+                     help='History ID for the image names, default from the export')
+    gen.add_argument('--first-index', type=int, default=0,
+                     help='First image number, avoids name clashes in the output directory')
+    args = parser.parse_args()
+
+    cli = ItsGeneratorCli()
+    if args.cmd == 'export':
+        # Erst nach ItsConfig() zeigt der Ordner in das Volume
+        outPath = args.out or ItsConfig.DEF_DCGAN_EXPORT_DIR
+        for p in cli.export(args.checkpoint, outPath):
+            print(p)
+    elif args.cmd == 'generate':
+        cli.generate(
+            args.generator, args.count, args.batch_size, args.workers,
+            args.out, args.his_id, args.first_index)
+    else:
+        parser.print_help()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+'''
+    Lädt die Basisbilder aus dem Input Ordner. Dekodiert wird parallel,
+    das Ergebnis landet optional als .npy im Cache und wird beim nächsten
+    Lauf mit denselben Dateien nur noch per memmap geöffnet.
+'''
+
+import os
+import json
+import hashlib
+import imageio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ItsImageLoader():
+
+    IMG_SHAPE = (64, 64, 3)
+    CACHE_PREFIX = 'input_'
+    # Bilder pro Worker, die gleichzeitig dekodiert im Speicher liegen
+    DECODE_CHUNK = 64
+
+    def __init__(self, log, cacheDir=None, workers=4):
+        self.log = log
+        self.cacheDir = cacheDir
+        self.workers = workers
+
+    def listImages(self, inDir):
+        paths = []
+        # Alle nicht klassifizierten Bilder sammeln, als (Name, Pfad)
+        for root, _, files in os.walk(inDir):
+            # Feste Reihenfolge, damit ein Resume dieselben Gruppen bildet
+            for f in sorted(files):
+                if f.endswith('.png') and not f.startswith('.'):
+                    paths.append((f, os.path.join(root, f)))
+
+        self.log.info('Found {} input images.'.format(len(paths)))
+        return paths
+
+    def load(self, paths):
+        # Liefert (Namen, uint8 Array), ungültige Bilder fehlen in beiden
+        if not paths:
+            return [], np.empty((0,) + ItsImageLoader.IMG_SHAPE, dtype=np.uint8)
+
+        if not self.cacheDir:
+            return self.__decode(paths)
+
+        key = self.getCacheKey(paths)
+        npyPath = os.path.join(
+            self.cacheDir, '{}{}.npy'.format(ItsImageLoader.CACHE_PREFIX, key))
+        namesPath = os.path.splitext(npyPath)[0] + '.json'
+
+        if os.path.exists(npyPath) and os.path.exists(namesPath):
+            self.log.info('Using cached input images {}'.format(npyPath))
+            with open(namesPath) as f:
+                names = json.load(f)
+            return names, np.load(npyPath, mmap_mode='r')
+
+        return self.__decode(paths, npyPath, namesPath)
+
+    def getCacheKey(self, paths):
+        # Name, Größe und Änderungszeit, der Inhalt selbst wird nicht gelesen
+        h = hashlib.sha1()
+        for name, path in paths:
+            st = os.stat(path)
+            h.update('{}|{}|{}\n'.format(name, st.st_size, st.st_mtime_ns).encode('utf8'))
+        return h.hexdigest()[:16]
+
+    def __decode(self, paths, npyPath=None, namesPath=None):
+        self.log.info('Decoding {} images with {} worker(s)...'.format(
+            len(paths), self.workers))
+
+        # Platz für alle Bilder, ungültige fehlen danach am Ende
+        shape = (len(paths),) + ItsImageLoader.IMG_SHAPE
+        if npyPath:
+            if not os.path.exists(self.cacheDir):
+                os.makedirs(self.cacheDir)
+            tmpPath = npyPath + '.tmp'
+            data = np.lib.format.open_memmap(
+                tmpPath, mode='w+', dtype=np.uint8, shape=shape)
+        else:
+            data = np.empty(shape, dtype=np.uint8)
+
+        # Jedes Bild wird sofort geschrieben, es liegt nie der ganze
+        # Datensatz dekodiert im Speicher
+        names = []
+        imgs = self.__readImages([p for _, p in paths])
+        for (name, _), img in zip(paths, imgs):
+            if img is not None:
+                data[len(names)] = img
+                names.append(name)
+
+        if not npyPath:
+            return names, data[:len(names)]
+
+        data.flush()
+        del data
+        if len(names) < len(paths):
+            self.__shrinkCache(tmpPath, len(names))
+        self.__clearCache(tmpPath)
+        os.replace(tmpPath, npyPath)
+        with open(namesPath, 'w') as f:
+            json.dump(names, f)
+
+        self.log.info('Cached input images in {}'.format(npyPath))
+        # Ab hier nur noch lesend, den Rest regelt der Page Cache
+        return names, np.load(npyPath, mmap_mode='r')
+
+    def __readImages(self, paths):
+        # Liefert die Bilder in der Reihenfolge der Pfade. Dekodiert wird
+        # blockweise, damit die Worker nicht beliebig weit vorauslaufen.
+        if self.workers <= 1:
+            for p in paths:
+                yield self.__readImage(p)
+            return
+
+        chunk = self.workers * ItsImageLoader.DECODE_CHUNK
+        with ThreadPoolExecutor(self.workers) as pool:
+            for i in range(0, len(paths), chunk):
+                for img in pool.map(self.__readImage, paths[i:i + chunk]):
+                    yield img
+
+    def __shrinkCache(self, tmpPath, cnt):
+        # Ungültige Bilder: die gültigen blockweise in eine passende Datei
+        # umkopieren, über memmap und ohne alles zu laden
+        data = np.load(tmpPath, mmap_mode='r')
+        shrinkPath = tmpPath + '.shrink'
+        out = np.lib.format.open_memmap(
+            shrinkPath, mode='w+', dtype=np.uint8,
+            shape=(cnt,) + ItsImageLoader.IMG_SHAPE)
+        step = ItsImageLoader.DECODE_CHUNK * 16
+        for i in range(0, cnt, step):
+            end = min(i + step, cnt)
+            out[i:end] = data[i:end]
+        out.flush()
+        del out, data
+        os.replace(shrinkPath, tmpPath)
+
+    def __readImage(self, path):
+        try:
+            img = np.asarray(imageio.imread(path))
+        except Exception as e:
+            self.log.error('Could not read image {}: {}'.format(path, e))
+            return None
+
+        # PNGs mit Alphakanal sind im Input Ordner häufig
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = img[:, :, :3]
+
+        if img.shape != ItsImageLoader.IMG_SHAPE or img.dtype != np.uint8:
+            self.log.error('Skipping image {}: shape {} {}, expected {} uint8'.format(
+                path, img.shape, img.dtype, ItsImageLoader.IMG_SHAPE))
+            return None
+        return img
+
+    def __clearCache(self, keepPath):
+        # Nur ein Datensatz im Cache, ältere Stände werden ersetzt
+        for f in os.listdir(self.cacheDir):
+            path = os.path.join(self.cacheDir, f)
+            if f.startswith(ItsImageLoader.CACHE_PREFIX) and path != keepPath:
+                os.remove(path)
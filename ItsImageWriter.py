@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import imageio
+from threading import Thread
+
+
+class ItsImageWriter():
+
+    def __init__(self, log, threads=2, queueSize=240, sink=None):
+        self.log = log
+        self.threads = threads
+        # Optionaler Empfänger für ItsImageInfo statt des Ordners
+        self.sink = sink
+        self.imgQueue = queue.Queue(queueSize)
+        self.workers = []
+
+        for _ in range(self.threads):
+            t = Thread(target=self.__writeImages)
+            t.daemon = True
+            t.start()
+            self.workers.append(t)
+
+    def write(self, img, imgPath):
+        self.__put((self.__writeImage, (img, imgPath)))
+
+    def submit(self, imgInfo):
+        self.__put((self.__submitImage, (imgInfo,)))
+
+    def flush(self):
+        self.imgQueue.join()
+
+    def close(self):
+        self.flush()
+        for _ in self.workers:
+            self.imgQueue.put(None)
+        for t in self.workers:
+            t.join()
+        self.workers = []
+
+    def encodeImage(self, img):
+        return imageio.imwrite('<bytes>', img, format='png')
+
+    def __put(self, job):
+        # Ohne Threads wird direkt geschrieben
+        if not self.workers:
+            func, args = job
+            func(*args)
+        else:
+            # Blockiert, wenn die Writer nicht hinterherkommen
+            self.imgQueue.put(job)
+
+    def __writeImage(self, img, imgPath):
+        # Erst in eine versteckte Datei schreiben, dann umbenennen. Der
+        # Requester sieht so nie ein halb geschriebenes Bild.
+        outDir, name = os.path.split(imgPath)
+        tmpPath = os.path.join(outDir, '.{}.tmp'.format(name))
+
+        content = self.encodeImage(img)
+        try:
+            with open(tmpPath, 'wb') as f:
+                f.write(content)
+            os.replace(tmpPath, imgPath)
+        except Exception:
+            # Keine halbe Datei im Request Ordner zurücklassen
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+
+    def __submitImage(self, imgInfo):
+        # PNG wird genau einmal kodiert und dann mit übergeben
+        imgInfo.png = self.encodeImage(imgInfo.img_array)
+        self.sink(imgInfo)
+
+    def __writeImages(self):
+        while True:
+            job = self.imgQueue.get()
+            if job is None:
+                self.imgQueue.task_done()
+                break
+
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:
+                self.log.error('Writing image {} failed: {}'.format(args[-1], e))
+            finally:
+                self.imgQueue.task_done()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+'''
+    Lasttest für den Requester. Legt N Bilder in den Request Ordner, lässt
+    den Requester mit der aktuellen its.ini gegen den lokalen Mock (oder
+    eine andere URL) laufen und misst Bilder pro Sekunde, Latenzen und
+    geschriebene Zeilen pro Sekunde. Braucht die MySql Datenbank, schreibt
+    aber in eine eigene Session und nutzt eigene Ordner.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from threading import Lock
+from itsdb import ItsSqlConnection, ItsRequestJournal
+from itslogging import ItsLogger, ItsSqlLogger
+from itsmisc import ItsConfig, ItsSessionInfo, ItsEpochInfo, ItsImageInfo
+from ItsRequester import ItsRequester
+from ItsImageWriter import ItsImageWriter
+from ItsMockClassifier import addMockArguments, getMockSettings, startMockServer
+
+
+# Eigene Session Nummer, damit die Testzeilen nicht zwischen echten liegen
+DEF_SESSION = 9000
+DEF_REQUEST_DIR = os.path.join(ItsConfig.VOLUME_FOLDER, 'its_load_test_request')
+DEF_JOURNAL = os.path.join(ItsConfig.VOLUME_FOLDER, 'its_load_test_journal.db')
+
+
+class ItsLoadTestRequester(ItsRequester):
+
+    # Misst die Dauer jedes Requests
+    def __init__(self, url, reqDir, cacheDb=False):
+        ItsRequester.__init__(self)
+        self.url = url
+        self.latencies = []
+        self.latLock = Lock()
+
+        # Nicht der Ordner und das Journal des laufenden Requesters. Das
+        # Journal würde sonst dessen offene Bilder vergessen.
+        self.reqDir = reqDir
+        if self.journal:
+            self.journal.close()
+            self.journal = ItsRequestJournal(DEF_JOURNAL, self.log)
+
+        # Treffer aus früheren Läufen in der DB würden die Messung verfälschen
+        if self.classCache and not cacheDb:
+            self.classCache.sqlCon = None
+
+    def sendRequest(self, img, apiKey):
+        # Inklusive Wartezeit im Rate Limiter
+        start = time.time()
+        try:
+            return ItsRequester.sendRequest(self, img, apiKey)
+        finally:
+            with self.latLock:
+                self.latencies.append(time.time() - start)
+
+
+def writeImages(log, reqDir, sessionNr, hisId, cnt, duplicates, seed):
+    rng = np.random.RandomState(seed)
+    cntUnique = max(1, int(round(cnt * (1.0 - duplicates))))
+    imgs = rng.randint(0, 256, size=(cntUnique, 64, 64, 3)).astype(np.uint8)
+
+    writer = ItsImageWriter(log, threads=4)
+    paths = []
+    for i in range(cnt):
+        path = os.path.join(reqDir, ItsImageInfo(sessionNr, 0, hisId, i).getName())
+        writer.write(imgs[i % cntUnique], path)
+        paths.append(path)
+    writer.close()
+    return paths
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.array(values)
+    return dict(
+        [('p{}_s'.format(p), round(float(np.percentile(values, p)), 4))
+         for p in (50, 90, 99)] + [('max_s', round(float(values.max()), 4))])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the requester against a local mock classifier.')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help='Fraction of images that repeat an earlier image')
+    parser.add_argument('--session', type=int, default=DEF_SESSION,
+                        help='Session number used for the test rows')
+    parser.add_argument('--request-dir', default=DEF_REQUEST_DIR,
+                        help='Request directory used for the test images')
+    parser.add_argument('--cache-db', action='store_true',
+                        help='Let the cache look up earlier results in the DB')
+    parser.add_argument('--url', help='Classifier URL, default starts a local mock')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Give up after this many seconds')
+    parser.add_argument('--out', help='Write the JSON result to this file')
+    addMockArguments(parser)
+    args = parser.parse_args()
+
+    log = ItsLogger('its_load_test', outDir=ItsConfig.VOLUME_FOLDER)
+    cfg = ItsConfig()
+
+    sql = ItsSqlConnection(cfg.sql_cfg, log=log)
+    if not sql.dbExists:
+        print('SQL connection failed.', file=sys.stderr)
+        return 1
+    sqlLog = ItsSqlLogger(sql, log)
+
+    server, url = None, args.url
+    if not url:
+        server, url = startMockServer(getMockSettings(args))
+        log.info('Mock classifier on {}'.format(url))
+
+    # Eigene Session und History ID, damit die Zeilen zählbar sind
+    session = ItsSessionInfo(
+        sessionNr=args.session, max_epoch=0, info_text='Load test',
+        cntBaseImages=0, enableImageGeneration=False, cntGenerateImages=args.count)
+    sqlLog.logSessionInfo(session)
+    hisId = sqlLog.logEpochInfo(ItsEpochInfo(
+        sessionNr=args.session, epoch=0, batch_size=0,
+        d_ls=0, g_ls=0, d_real_ls=0, d_fake_ls=0, baseImage='load_test',
+        entryId=session.entryId))
+
+    reqDir = args.request_dir
+    if not os.path.exists(reqDir):
+        os.makedirs(reqDir)
+    log.info('Writing {} images to {}'.format(args.count, reqDir))
+    paths = writeImages(
+        log, reqDir, args.session, hisId, args.count, args.duplicates, args.seed)
+
+    req = ItsLoadTestRequester(url, reqDir, args.cache_db)
+    samples = []
+    start = time.time()
+    req.startRequesting()
+    rows = 0
+    remaining = len(paths)
+    imgTime = None
+    try:
+        while rows < args.count and time.time() - start < args.timeout:
+            time.sleep(0.5)
+            # Ein Bild gilt als verarbeitet, sobald der Requester es löscht
+            if remaining:
+                remaining = sum(1 for p in paths if os.path.exists(p))
+                if not remaining:
+                    imgTime = time.time() - start
+            rows = sql.getRequestCountForHistory(hisId)
+            samples.append((time.time() - start, rows))
+    finally:
+        elapsed = time.time() - start
+        req.stopRequesting()
+
+    # Zeilen pro Sekunde: gesamt und bestes Intervall
+    peak = 0.0
+    for (t0, r0), (t1, r1) in zip(samples, samples[1:]):
+        if t1 > t0:
+            peak = max(peak, (r1 - r0) / (t1 - t0))
+
+    result = {
+        'images': args.count,
+        'duplicates': args.duplicates,
+        'his_id': hisId,
+        'url': url,
+        'engine': cfg.req_cfg.engine,
+        'in_flight': cfg.req_cfg.inFlight,
+        'keys': len(req.key) if isinstance(req.key, list) else 1,
+        'sql_batch_size': cfg.req_cfg.sqlBatchSize,
+        'cache_size': cfg.req_cfg.cacheSize,
+        'cache_db': bool(req.classCache and req.classCache.sqlCon),
+        'cache': req.classCache.getStats() if req.classCache else None,
+        'finished': rows >= args.count,
+        'elapsed_s': round(elapsed, 3),
+        'images_done': len(paths) - remaining,
+        'images_per_s': round((len(paths) - remaining) / (imgTime or elapsed), 2),
+        'rows': rows,
+        'rows_per_s': round(rows / elapsed, 2),
+        'rows_per_s_peak': round(peak, 2),
+        'requests': len(req.latencies),
+        'request_latency': percentiles(req.latencies),
+        'rates': req.getRates()
+    }
+    if server:
+        result['mock'] = server.getStats()
+        server.shutdown()
+        server.server_close()
+
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(out)
+    print(out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+'''
+    Lokaler Ersatz für die Klassifikations-API. Nimmt dieselben multipart
+    Requests (image, key) an und antwortet im selben JSON Format. Latenz,
+    Rate Limit pro Key und Fehler lassen sich einstellen, damit der
+    Requester ohne API Kontingent gemessen werden kann.
+'''
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import collections
+import numpy as np
+from threading import Thread, Lock
+from email.parser import BytesParser
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from ItsRateLimiter import ItsRateLimiter
+
+
+class ItsMockSettings():
+
+    LATENCIES = ('const', 'uniform', 'exp', 'lognormal')
+
+    def __init__(
+        self, latency='const', latencyMean=0.05, latencySd=0.02,
+        rate=0, burst=1, retryAfter=0, errorRate=0.0,
+        cntClasses=43, topK=5, keys=None, seed=0
+    ):
+        # Latenz in Sekunden
+        self.latency = latency
+        self.latencyMean = latencyMean
+        self.latencySd = latencySd
+        # Requests pro Sekunde und Key, 0 = unbegrenzt
+        self.rate = rate
+        self.burst = burst
+        self.retryAfter = retryAfter
+        # Anteil der Requests, die mit 500 beantwortet werden
+        self.errorRate = errorRate
+        self.cntClasses = cntClasses
+        self.topK = topK
+        # Ohne Liste wird jeder Key angenommen
+        self.keys = keys
+        self.seed = seed
+
+
+class ItsMockServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, settings):
+        HTTPServer.__init__(self, address, ItsMockHandler)
+        self.settings = settings
+        self.classes = ['class_{:02d}'.format(i) for i in range(settings.cntClasses)]
+        self.rng = np.random.RandomState(settings.seed)
+        self.rngLock = Lock()
+        self.buckets = {}
+        self.lock = Lock()
+        self.counts = collections.Counter()
+        self.latencies = []
+
+    def getBucket(self, key):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate = self.settings.rate
+                # Feste Rate, der Bucket passt sich hier nicht an
+                bucket = ItsRateLimiter(rate, rate, rate, burst=self.settings.burst)
+                self.buckets[key] = bucket
+            return bucket
+
+    def isLimited(self, key):
+        if not self.settings.rate:
+            return False
+
+        return not self.getBucket(key).tryAcquire()
+
+    def sampleLatency(self):
+        s = self.settings
+        with self.rngLock:
+            if s.latency == 'uniform':
+                value = self.rng.uniform(
+                    max(0.0, s.latencyMean - s.latencySd), s.latencyMean + s.latencySd)
+            elif s.latency == 'exp':
+                value = self.rng.exponential(s.latencyMean)
+            elif s.latency == 'lognormal':
+                # Mittelwert und Standardabweichung der Latenz selbst
+                var = np.log(1 + (s.latencySd / max(s.latencyMean, 1e-9)) ** 2)
+                value = self.rng.lognormal(
+                    np.log(max(s.latencyMean, 1e-9)) - var / 2, np.sqrt(var))
+            else:
+                value = s.latencyMean
+        return max(0.0, value)
+
+    def isError(self):
+        if not self.settings.errorRate:
+            return False
+        with self.rngLock:
+            return self.rng.rand() < self.settings.errorRate
+
+    def classify(self, img):
+        # Gleiches Bild, gleiches Ergebnis. Konfidenzen per Softmax über
+        # zufällige Logits aus dem Inhalt.
+        seed = int(hashlib.sha1(img).hexdigest()[:8], 16)
+        rng = np.random.RandomState(seed)
+        logits = rng.normal(0.0, 3.0, len(self.classes))
+        conf = np.exp(logits - logits.max())
+        conf /= conf.sum()
+        best = np.argsort(-conf)[:self.settings.topK]
+        return [{'class': self.classes[i], 'confidence': float(conf[i])} for i in best]
+
+    def count(self, status, latency=None):
+        with self.lock:
+            self.counts[status] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def getStats(self):
+        with self.lock:
+            lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+            return {
+                'responses': dict((str(k), v) for k, v in self.counts.items()),
+                'latency_p50_s': round(float(np.percentile(lat, 50)), 4),
+                'latency_p99_s': round(float(np.percentile(lat, 99)), 4)
+            }
+
+
+class ItsMockHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self.__reply(200, self.server.getStats())
+        else:
+            self.__reply(404, {'error': 'not_found'})
+
+    def do_POST(self):
+        start = time.time()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        fields = self.__parseMultipart(body)
+
+        key = fields.get('key', b'').decode('utf8', 'replace')
+        img = fields.get('image')
+        keys = self.server.settings.keys
+
+        if img is None or (keys and key not in keys):
+            self.server.count(400)
+            return self.__reply(400, {'error': 'invalid_request'})
+
+        if self.server.isLimited(key):
+            self.server.count(429)
+            headers = {}
+            if self.server.settings.retryAfter:
+                headers['Retry-After'] = str(self.server.settings.retryAfter)
+            return self.__reply(429, {'error': 'too_many_requests'}, headers)
+
+        time.sleep(self.server.sampleLatency())
+
+        if self.server.isError():
+            self.server.count(500, time.time() - start)
+            return self.__reply(500, {'error': 'internal_error'})
+
+        result = self.server.classify(img)
+        self.server.count(200, time.time() - start)
+        self.__reply(200, result)
+
+    def __parseMultipart(self, body):
+        ctype = self.headers.get('Content-Type', '')
+        msg = BytesParser().parsebytes(
+            'Content-Type: {}\r\n\r\n'.format(ctype).encode('latin-1') + body)
+
+        fields = {}
+        if msg.is_multipart():
+            for part in msg.get_payload():
+                name = part.get_param('name', header='content-disposition')
+                if name:
+                    fields[name] = part.get_payload(decode=True)
+        return fields
+
+    def __reply(self, status, data, headers=None):
+        out = json.dumps(data).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startMockServer(settings, host='127.0.0.1', port=0):
+    # Läuft im Hintergrund, port=0 sucht einen freien Port
+    server = ItsMockServer((host, port), settings)
+    t = Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server, 'http://{}:{}/'.format(*server.server_address[:2])
+
+
+def addMockArguments(parser):
+    parser.add_argument('--latency', choices=ItsMockSettings.LATENCIES, default='const')
+    parser.add_argument('--latency-mean', type=float, default=0.05,
+                        help='Mean latency in seconds')
+    parser.add_argument('--latency-sd', type=float, default=0.02,
+                        help='Spread of the latency in seconds')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Requests per second and key, 0 = unlimited')
+    parser.add_argument('--burst', type=int, default=1)
+    parser.add_argument('--retry-after', type=int, default=0,
+                        help='Retry-After header on 429, 0 = none')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 500')
+    parser.add_argument('--classes', type=int, default=43)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--keys', nargs='+', help='Accepted API keys, default any')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def getMockSettings(args):
+    return ItsMockSettings(
+        args.latency, args.latency_mean, args.latency_sd,
+        args.rate, args.burst, args.retry_after, args.error_rate,
+        args.classes, args.top_k, args.keys, args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the classification API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    addMockArguments(parser)
+    args = parser.parse_args()
+
+    server = ItsMockServer((args.host, args.port), getMockSettings(args))
+    print('Mock classifier on http://{}:{}/'.format(args.host, args.port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+    Token Bucket pro API Key. Die Rate steigt mit jeder erfolgreichen
+    Antwort langsam (additiv) und fällt bei too_many_requests oder
+    Serverfehlern stark (multiplikativ).
+'''
+
+import time
+from threading import Lock
+
+
+class ItsRateLimiter():
+
+    def __init__(
+        self, rate=1.0, minRate=0.1, maxRate=20.0,
+        increase=0.1, decrease=0.5, burst=1
+    ):
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.rate = min(max(rate, minRate), maxRate)
+        # Zuwachs in Requests pro Sekunde, verteilt auf eine Sekunde Erfolge
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.time()
+        # Von Retry-After gesetzt, bis dahin wird nichts gesendet
+        self.pausedUntil = 0
+        self.lock = Lock()
+
+    def acquire(self):
+        # Blockiert, bis ein Token frei ist
+        while True:
+            with self.lock:
+                now = time.time()
+                self.__refill(now)
+                if now >= self.pausedUntil and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(
+                    self.pausedUntil - now, (1 - self.tokens) / self.rate)
+            time.sleep(min(wait, 1.0))
+
+    def tryAcquire(self):
+        # Wie acquire, aber ohne zu warten
+        with self.lock:
+            now = time.time()
+            self.__refill(now)
+            if now >= self.pausedUntil and self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def onSuccess(self):
+        with self.lock:
+            self.rate = min(self.maxRate, self.rate + self.increase / self.rate)
+
+    def onRateLimited(self, retryAfter=None):
+        with self.lock:
+            self.rate = max(self.minRate, self.rate * self.decrease)
+            self.tokens = 0
+            if retryAfter:
+                self.pausedUntil = max(self.pausedUntil, time.time() + retryAfter)
+            return self.rate
+
+    def getRate(self):
+        with self.lock:
+            return self.rate
+
+    def __refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
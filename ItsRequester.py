@@ -3,14 +3,21 @@ import os
 import re
 import time
 import queue
-import random
+import asyncio
 import imageio
+import collections
 import requests
 import numpy as np
-from threading import Thread
-from itsdb import ItsSqlConnection
-from itslogging import ItsLogger, ItsSqlLogger
-from itsmisc import ItsRequestInfo, ItsConfig
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from itsdb import ItsSqlConnection, ItsRequestJournal
+from itslogging import ItsLogger, ItsSqlLogger, ItsMetrics, ItsMetricsServer
+from itsmisc import ItsRequestInfo, ItsImageInfo, ItsConfig
+from ItsRateLimiter import ItsRateLimiter
+from ItsDirWatcher import ItsDirWatcher
+from ItsClassCache import ItsClassCache
 
 
 class ItsRequester:
@@ -22,16 +29,48 @@ class ItsRequester:
         self.debug = debug
         self.cfg = ItsConfig()
         self.sqlLog = None
+        self.journal = None
+        self.classCache = None
         self.hardDelay = 5
         self.__initConfig()
         self.__checkRequestDir()
         self.__initSqlLogger()
+        self.__initJournal()
+        self.__initClassCache()
         self.clsThreads = []
         self.imgQueue = queue.Queue(self.qSize)
         self.sqlThread = None
         self.collectThread = None
         self.reqQueue = queue.Queue(self.qSize)
         self.stop = False
+        # Anzahl der Bilder aus dem Speicher, die noch nicht klassifiziert sind
+        self.memPending = 0
+        self.memLock = Lock()
+        # Fehlgeschlagene Bilder aus dem Speicher, werden vor der Queue
+        # abgearbeitet und gehen nie verloren
+        self.retryImages = collections.deque()
+        # Eine keep-alive Session pro API Key, jeder Key hat seinen Thread
+        self.httpSessions = {}
+        self.httpLock = Lock()
+        # Ein Token Bucket pro API Key
+        self.rateLimiters = {}
+        # Bilder aus dem Ordner, die in der Queue oder gerade in Arbeit sind
+        self.knownPaths = set()
+        self.knownLock = Lock()
+        self.metrics = ItsMetrics('its_requester')
+        self.metricsServer = None
+        self.metricsThread = None
+        self.__initMetrics()
+
+    def __initMetrics(self):
+        self.metrics.gauge('img_queue_depth', self.imgQueue.qsize)
+        self.metrics.gauge('req_queue_depth', self.reqQueue.qsize)
+        self.metrics.gauge('queue_size', lambda: self.qSize)
+        self.metrics.gauge('mem_pending', lambda: self.memPending)
+        self.metrics.gauge('retry_depth', lambda: len(self.retryImages))
+        self.metrics.gauge('known_paths', lambda: len(self.knownPaths))
+        self.metrics.gauge('rate_per_second', self.getRates)
+        self.metrics.set('in_flight', 0)
 
     def __initConfig(self):
         self.log.info('Config valid. Preparing Requester.')
@@ -41,6 +80,19 @@ class ItsRequester:
         self.delay = self.cfg.req_cfg.delay
         self.reqDir = self.cfg.req_cfg.request_directory
         self.qSize = self.cfg.req_cfg.qSize
+        self.timeout = (
+            self.cfg.req_cfg.connectTimeout, self.cfg.req_cfg.readTimeout)
+        self.retries = self.cfg.req_cfg.retries
+        self.backoff = self.cfg.req_cfg.backoff
+        # 'threads': ein blockierender Thread pro Key
+        # 'asyncio': Event Loop mit in_flight Requests pro Key
+        self.engine = self.cfg.req_cfg.engine
+        self.inFlight = max(1, self.cfg.req_cfg.inFlight)
+        self.minRate = self.cfg.req_cfg.minRate
+        self.maxRate = self.cfg.req_cfg.maxRate
+        # Ergebnisse werden gesammelt und mit einem Commit geschrieben
+        self.sqlBatchSize = max(1, self.cfg.req_cfg.sqlBatchSize)
+        self.sqlBatchAge = self.cfg.req_cfg.sqlBatchAge
 
     def __checkRequestDir(self):
         if not os.path.exists(self.reqDir):
@@ -59,6 +111,27 @@ class ItsRequester:
         else:
             self.log.error('SQL connection failed.')
 
+    def __initClassCache(self):
+        if not self.cfg.req_cfg.cacheSize:
+            return
+
+        sqlCon = None
+        if self.sqlLog:
+            # Die Verbindung des SQL Threads darf nicht mitbenutzt werden
+            sqlCon = ItsSqlConnection(self.cfg.sql_cfg, log=self.log)
+            if not sqlCon.dbExists:
+                sqlCon = None
+        self.classCache = ItsClassCache(
+            self.log, self.cfg.req_cfg.cacheSize,
+            self.cfg.req_cfg.cacheDistance, sqlCon)
+        self.log.info('Classification cache with {} entries, distance {}.'.format(
+            self.cfg.req_cfg.cacheSize, self.cfg.req_cfg.cacheDistance))
+
+    def __initJournal(self):
+        if self.cfg.req_cfg.journalPath:
+            self.journal = ItsRequestJournal(
+                self.cfg.req_cfg.journalPath, self.log)
+
     def __markImageAsClassified(self, img):
         # Bilder werden aus dem Ordner gelöscht
         self.log.debug('Marking file {} as classifed.'.format(img))
@@ -87,62 +160,357 @@ class ItsRequester:
         myData = {ItsConfig.PARAM_KEY: apiKey}
 
         myFiles = {'image': img}
-        # Kleines delay einbauen um 'too_many_requests' zu vermeiden
-        time.sleep(self.delay)
+        # Statt eines festen delays regelt der Rate Limiter des Keys, wann
+        # gesendet wird
+        keyName = self.__maskKey(apiKey)
+        start = time.time()
+        self.getRateLimiter(apiKey).acquire()
+        self.metrics.observe('rate_limit_wait_seconds', time.time() - start, key=keyName)
         if self.debug:
             self.log.debug('Sending request...')
 
-        return requests.post(myUrl, data=myData, files=myFiles)
+        self.metrics.add('in_flight', 1)
+        start = time.time()
+        try:
+            return self.getHttpSession(apiKey).post(
+                myUrl, data=myData, files=myFiles, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self.metrics.inc('request_errors_total', key=keyName)
+            raise
+        finally:
+            self.metrics.add('in_flight', -1)
+            self.metrics.observe('request_latency_seconds', time.time() - start, key=keyName)
+
+    def getRateLimiter(self, apiKey):
+        with self.httpLock:
+            limiter = self.rateLimiters.get(apiKey)
+            if limiter is None:
+                # send_delay gibt die Startrate vor
+                rate = 1.0 / self.delay if self.delay else self.maxRate
+                limiter = ItsRateLimiter(
+                    rate, self.minRate, self.maxRate, burst=self.inFlight)
+                self.rateLimiters[apiKey] = limiter
+            return limiter
+
+    def getRates(self):
+        # Aktuelle Rate pro Key in Requests pro Sekunde, Keys gekürzt
+        with self.httpLock:
+            limiters = list(self.rateLimiters.items())
+        return dict((self.__maskKey(k), l.getRate()) for k, l in limiters)
+
+    def __maskKey(self, apiKey):
+        return '{}...'.format(apiKey[:6])
+
+    def __isRateLimited(self, res):
+        if res.status_code == 429:
+            return True
+        try:
+            return 'too_many_requests' in res.text
+        except Exception:
+            return False
+
+    def __checkResponse(self, res, apiKey, imgName):
+        # False: Bild nicht verwerfen, sondern später erneut senden
+        limiter = self.getRateLimiter(apiKey)
+        self.metrics.inc(
+            'requests_total', key=self.__maskKey(apiKey), status=res.status_code)
+        if self.__isRateLimited(res) or res.status_code >= 500:
+            if self.__isRateLimited(res):
+                self.metrics.inc('rate_limited_total', key=self.__maskKey(apiKey))
+            retryAfter = None
+            try:
+                retryAfter = float(res.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                pass
 
-    def getRequestInfoForResult(self, result, imgPath):
+            rate = limiter.onRateLimited(retryAfter)
+            self.log.info('Key {}: {} for {}, rate down to {:.2f}/s'.format(
+                self.__maskKey(apiKey), res.status_code, imgName, rate))
+            return False
+
+        limiter.onSuccess()
+        return True
+
+    def getHttpSession(self, apiKey):
+        with self.httpLock:
+            session = self.httpSessions.get(apiKey)
+            if session is None:
+                session = self.__createHttpSession()
+                self.httpSessions[apiKey] = session
+            return session
+
+    def __createHttpSession(self):
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(2, self.inFlight),
+            max_retries=self.__createRetry())
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def __createRetry(self):
+        # Nur Verbindungsfehler und Gateway Fehler. Nach einem Read Timeout
+        # hat der Server den Request evtl. schon verarbeitet und berechnet,
+        # dann entscheidet der Requester selbst über das erneute Senden.
+        args = {
+            'total': self.retries,
+            'connect': self.retries,
+            'read': 0,
+            'status': self.retries,
+            'backoff_factor': self.backoff,
+            'status_forcelist': (502, 503, 504),
+            'raise_on_status': False
+        }
+        try:
+            return Retry(allowed_methods=None, **args)
+        except TypeError:
+            # urllib3 < 1.26
+            return Retry(method_whitelist=False, **args)
+
+    def __closeHttpSessions(self):
+        with self.httpLock:
+            for session in self.httpSessions.values():
+                session.close()
+            self.httpSessions = {}
+
+    def getRequestInfoForResult(self, result, img):
         reqInfo = ItsRequestInfo()
         if result.ok:
-            nn_class, max_confidence = self.getBestClassFromResult(result)
+            # Nur einmal parsen, die Top-k Klassen kommen in der DB aus der
+            # Liste
+            jRes = result.json()
+            nn_class, max_confidence = self.getBestClassFromResult(jRes)
             reqInfo.nn_class = nn_class
             reqInfo.max_confidence = max_confidence
-            reqInfo.json_result = result.json()
+            reqInfo.json_result = jRes
         reqInfo.sessionNr = 0
         reqInfo.epoch = 0
-        reqInfo.img_array = imageio.imread(imgPath)
+        # Entweder ein Pfad oder schon das fertige Array
+        if isinstance(img, str):
+            img = imageio.imread(img)
+        reqInfo.img_array = img
         if self.debug:
             self.log.debug('Image Array:\t{}'.format(reqInfo.img_array.shape))
         return reqInfo
 
-    def getBestClassFromResult(self, result):
-        jRes = result.json()
+    def getBestClassFromResult(self, jRes):
         return jRes[0]['class'], jRes[0]['confidence']
 
-    def __sendImage(self, imgPath, apiKey):
+    def submitImage(self, imgInfo):
+        # Übergabe direkt vom DCGAN, ohne Umweg über den Request Ordner
+        with self.memLock:
+            self.memPending += 1
+        self.imgQueue.put(imgInfo)
+
+    def __sendImage(self, img, apiKey):
+        # Ein Fehler darf den Thread des Keys nicht beenden
+        try:
+            if isinstance(img, ItsImageInfo):
+                self.__sendImageInfo(img, apiKey)
+            else:
+                self.__sendImageFile(img, apiKey)
+        except Exception as e:
+            self.log.error('Sending image {} failed: {}'.format(
+                img.getName() if isinstance(img, ItsImageInfo) else img, e))
+            self.metrics.inc('send_errors_total')
+            self.getRateLimiter(apiKey).onRateLimited()
+            # Bilder aus dem Ordner findet der nächste Scan wieder
+            if isinstance(img, ItsImageInfo):
+                self.__requeueImageInfo(img)
+
+    def __sendImageInfo(self, imgInfo, apiKey):
+        imgHash, reqInfo = self.__lookupCache(imgInfo.img_array)
+        if reqInfo is None:
+            try:
+                res = self.sendRequest(imgInfo.png, apiKey)
+            except requests.exceptions.RequestException as e:
+                self.log.error('Request for {} failed: {}'.format(
+                    imgInfo.getName(), e))
+                self.getRateLimiter(apiKey).onRateLimited()
+                self.__requeueImageInfo(imgInfo)
+                return
+
+            if not self.__checkResponse(res, apiKey, imgInfo.getName()):
+                self.__requeueImageInfo(imgInfo)
+                return
+
+        if reqInfo is None:
+            reqInfo = self.getRequestInfoForResult(res, imgInfo.img_array)
+            self.__cacheResult(res, imgHash, reqInfo)
+
+        reqInfo.sessionNr = imgInfo.sessionNr
+        reqInfo.epoch = imgInfo.epoch
+        self.log.info('Session {} - Epoch {} - History ID: {}'.format(
+            imgInfo.sessionNr, imgInfo.epoch, imgInfo.hisId))
+        self.log.infoRequestInfo(reqInfo, imgInfo.getName())
+        if self.journal:
+            self.journal.markClassified(
+                imgInfo.getName(), reqInfo, imgInfo.hisId)
+        self.__queueRequestInfo(reqInfo, imgInfo.hisId, imgInfo.getName())
+        # Erst jetzt fertig, bei einem Fehler vorher wird es wiederholt
+        with self.memLock:
+            self.memPending -= 1
+
+    def __requeueImageInfo(self, imgInfo):
+        # Ein Bild aus dem Speicher gibt es nur einmal. Zurück in die volle
+        # imgQueue würde den Thread blockieren, daher eine eigene Liste.
+        self.retryImages.append(imgInfo)
+
+    def __sendImageFile(self, imgPath, apiKey):
+        try:
+            self.__sendImagePath(imgPath, apiKey)
+        finally:
+            # Liegt das Bild danach noch im Ordner, findet es der nächste Scan
+            with self.knownLock:
+                self.knownPaths.discard(imgPath)
+
+    def __sendImagePath(self, imgPath, apiKey):
         if os.path.exists(imgPath):
             try:
                 with open(imgPath, 'rb') as img:
                     content = img.read()
-
-                res = self.sendRequest(content, apiKey)
-                reqInfo = self.getRequestInfoForResult(res, imgPath)
+                imgArray = np.asarray(imageio.imread(content))
+
+                name = os.path.basename(imgPath)
+                imgHash, reqInfo = self.__lookupCache(imgArray)
+                if reqInfo is None:
+                    if self.journal:
+                        self.journal.markSent(name)
+
+                    try:
+                        res = self.sendRequest(content, apiKey)
+                    except requests.exceptions.RequestException as e:
+                        # Das Bild bleibt im Ordner und wird wieder eingesammelt
+                        self.log.error('Request for {} failed: {}'.format(
+                            imgPath, e))
+                        self.getRateLimiter(apiKey).onRateLimited()
+                        return
+
+                    # Bei too_many_requests bleibt das Bild ebenfalls liegen
+                    if not self.__checkResponse(res, apiKey, imgPath):
+                        return
+
+                    reqInfo = self.getRequestInfoForResult(res, imgArray)
+                    self.__cacheResult(res, imgHash, reqInfo)
 
                 reqInfo.sessionNr, reqInfo.epoch, hisId = self.__getSessionEpoch(
                     imgPath)
                 self.log.infoRequestInfo(reqInfo, imgPath)
-                if self.sqlLog:
-                    send = False
-                    while not send:
-                        try:
-                            self.reqQueue.put(
-                                (reqInfo, hisId), timeout=self.hardDelay)
-                            send = True
-                        except queue.Full:
-                            self.log.info(
-                                'Request queue is full waiting... retrying')
 
+                # Erst ins Journal, dann löschen. Ab hier geht das Ergebnis
+                # auch bei einem Absturz nicht mehr verloren.
+                if self.journal:
+                    self.journal.markClassified(name, reqInfo, hisId)
                 self.__markImageAsClassified(imgPath)
+                self.__queueRequestInfo(reqInfo, hisId, name)
             except FileNotFoundError:
                 pass
 
+    def __lookupCache(self, img):
+        # Liefert (Hash, ItsRequestInfo aus dem Cache oder None)
+        if not self.classCache:
+            return None, None
+
+        imgHash, entry = self.classCache.lookup(img)
+        if not entry:
+            self.metrics.inc('cache_misses_total')
+            return imgHash, None
+
+        self.metrics.inc('cache_hits_total')
+        self.log.debug('Cache hit for {}'.format(imgHash))
+        nn_class, max_confidence, json_result = entry
+        return imgHash, ItsRequestInfo(
+            nn_class=nn_class,
+            max_confidence=max_confidence,
+            json_result=json_result,
+            img_array=img,
+            img_hash=imgHash)
+
+    def __cacheResult(self, res, imgHash, reqInfo):
+        reqInfo.img_hash = imgHash
+        # Nur echte Klassifikationen, keine Fehlerantworten
+        if self.classCache and res.ok:
+            self.classCache.add(
+                imgHash, reqInfo.img_array, reqInfo.nn_class,
+                reqInfo.max_confidence, reqInfo.json_result)
+
+    def __queueRequestInfo(self, reqInfo, hisId, name=None):
+        if self.sqlLog:
+            send = False
+            while not send:
+                try:
+                    self.reqQueue.put(
+                        (reqInfo, hisId, name), timeout=self.hardDelay)
+                    send = True
+                except queue.Full:
+                    self.metrics.inc('req_queue_full_total')
+                    self.log.info(
+                        'Request queue is full waiting... retrying')
+
     def startRequesting(self):
+        # Das Journal vor den Klassifikations Threads nachtragen, sonst
+        # landen deren neue Ergebnisse doppelt in der DB. Der SQL Thread
+        # läuft schon, damit die Request Queue nicht vollläuft.
+        self.startSqlThread()
+        self.__replayJournal()
         self.startImageCollectionThread()
         self.startClassificationThread()
-        self.startSqlThread()
+        self.startMetrics()
+
+    def startMetrics(self):
+        port = self.cfg.req_cfg.metricsPort
+        if port:
+            try:
+                self.metricsServer = ItsMetricsServer(self.metrics, port)
+                self.metricsServer.start()
+                self.log.info('Metrics on http://127.0.0.1:{}/metrics'.format(port))
+            except OSError as e:
+                self.log.error('Could not start metrics server: {}'.format(e))
+                self.metricsServer = None
+
+        if self.cfg.req_cfg.metricsInterval > 0:
+            self.metricsThread = Thread(target=self.__exportMetrics)
+            self.metricsThread.daemon = True
+            self.metricsThread.start()
+
+    def __exportMetrics(self):
+        path = self.cfg.req_cfg.metricsPath
+        interval = self.cfg.req_cfg.metricsInterval
+        while not self.stop:
+            time.sleep(interval)
+            self.__writeMetrics(path)
+
+    def __writeMetrics(self, path):
+        try:
+            self.metrics.export(path)
+        except OSError as e:
+            self.log.error('Could not write metrics {}: {}'.format(path, e))
+
+    def __replayJournal(self):
+        if not self.journal:
+            return
+
+        # Eingereiht oder gesendet, aber das Bild gibt es nicht mehr
+        # (z.B. aus dem Speicher), dafür kommt kein Ergebnis mehr
+        for name in self.journal.getOpen():
+            if not os.path.exists(os.path.join(self.reqDir, name)):
+                self.journal.forget(name)
+
+        # Bereits bezahlte Ergebnisse, die es nicht mehr in die DB geschafft
+        # haben
+        results = self.journal.getUnpersisted()
+        if results:
+            self.log.info('Replaying {} classified request(s) from the journal.'.format(
+                len(results)))
+        for name, reqInfo, hisId in results:
+            # Erst das Bild löschen. Sonst findet es der Sammler, nachdem
+            # markPersisted den Eintrag entfernt hat, und sendet es erneut.
+            try:
+                self.__markImageAsClassified(os.path.join(self.reqDir, name))
+            except FileNotFoundError:
+                pass
+            self.__queueRequestInfo(reqInfo, hisId, name)
+        self.metrics.inc('journal_replayed_total', len(results))
 
     def stopRequesting(self):
         self.log.info('Stopping requester... waiting for Jobs to be finished')
@@ -156,6 +524,17 @@ class ItsRequester:
 
         self.sqlThread.join()
         self.collectThread.join()
+        if self.retryImages:
+            self.log.error('{} images from memory were not classified.'.format(
+                len(self.retryImages)))
+        self.__closeHttpSessions()
+        if self.journal:
+            self.journal.close()
+        if self.metricsServer:
+            self.metricsServer.stop()
+        if self.metricsThread:
+            # Letzter Stand nach dem Stop
+            self.__writeMetrics(self.cfg.req_cfg.metricsPath)
 
         self.log.info('Requester stopped. Bye!')
 
@@ -164,12 +543,13 @@ class ItsRequester:
             self.reqDir
         ))
 
-        if isinstance(self.key, list):
+        keys = self.key if isinstance(self.key, list) else [self.key]
+        if self.engine == 'asyncio':
+            self.__startAsyncEngine(keys)
+        else:
             # Mehrere Keys mehrere Threads
-            for k in self.key:
+            for k in keys:
                 self.__startClassificationThread(k)
-        else:
-            self.__startClassificationThread(self.key)
 
     def __startClassificationThread(self, key):
         t = Thread(
@@ -186,39 +566,148 @@ class ItsRequester:
 
         # Wenn Bilder bereits aufgenommen wurden
         while not self.stop:
+            img, fromQueue = self.__nextImage()
+            if img is None:
+                self.log.info('Thread {}: Image queue is empty.'.format(tId))
+                continue
+
             try:
-                img = self.imgQueue.get(timeout=self.hardDelay)
                 self.__sendImage(img, apiKey)
-                self.imgQueue.task_done()
-            except queue.Empty:
-                self.log.info('Thread {}: Image queue is empty.'.format(tId))
+            finally:
+                if fromQueue:
+                    self.imgQueue.task_done()
 
         self.log.info('Thread {} is terminating'.format(tId))
 
+    def __startAsyncEngine(self, keys):
+        t = Thread(target=self.__runAsyncEngine, args=(keys,))
+        t.daemon = True
+        t.start()
+        self.clsThreads.append(t)
+
+    def __runAsyncEngine(self, keys):
+        self.log.info('Async engine is ready, {} key(s) with {} requests in flight each.'.format(
+            len(keys), self.inFlight))
+
+        # Eigener Loop, der Thread ist nicht der Main Thread
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        # Die HTTP Requests selbst bleiben blockierend (requests), laufen
+        # aber in einem eigenen Pool: ein Thread pro laufendem Request, kein
+        # nicht blockierendes I/O. Das Warten auf die Queue bekommt einen
+        # eigenen Pool, damit es keine Request Slots belegt.
+        self.httpExecutor = ThreadPoolExecutor(len(keys) * self.inFlight)
+        self.queueExecutor = ThreadPoolExecutor(len(keys))
+        try:
+            loop.run_until_complete(asyncio.gather(
+                *[self.__dispatchKey(loop, k, asyncio.Semaphore(self.inFlight))
+                  for k in keys]))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+            self.httpExecutor.shutdown(wait=True)
+            self.queueExecutor.shutdown(wait=True)
+
+        self.log.info('Async engine stopped.')
+
+    async def __dispatchKey(self, loop, apiKey, sem):
+        tasks = set()
+        while not self.stop:
+            # Erst einen freien Slot, dann das nächste Bild holen
+            await sem.acquire()
+            img, fromQueue = await loop.run_in_executor(
+                self.queueExecutor, self.__nextImage)
+            if img is None:
+                sem.release()
+                continue
+
+            task = loop.create_task(
+                self.__sendAsync(loop, img, fromQueue, apiKey, sem))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Laufende Requests noch zu Ende bringen
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def __sendAsync(self, loop, img, fromQueue, apiKey, sem):
+        try:
+            await loop.run_in_executor(
+                self.httpExecutor, self.__sendImage, img, apiKey)
+        except Exception as e:
+            self.log.error('Sending image failed: {}'.format(e))
+        finally:
+            if fromQueue:
+                self.imgQueue.task_done()
+            sem.release()
+
+    def __nextImage(self):
+        # Liefert (Bild, aus imgQueue). Wiederholungen kommen zuerst, sie
+        # zählen nicht für imgQueue.join().
+        try:
+            return self.retryImages.popleft(), False
+        except IndexError:
+            pass
+
+        try:
+            return self.imgQueue.get(timeout=self.hardDelay), True
+        except queue.Empty:
+            return None, False
+
     def startImageCollectionThread(self):
         self.collectThread = Thread(target=self.__collectImages)
         self.collectThread.daemon = True
         self.collectThread.start()
 
     def __collectImages(self):
+        watcher = ItsDirWatcher(self.reqDir, self.log)
+        # Gefunden, aber wegen voller Queue noch nicht eingereiht
+        pending = collections.deque()
+
         while not self.stop:
+            for img in watcher.wait(self.hardDelay):
+                with self.knownLock:
+                    if img in self.knownPaths:
+                        continue
+                    self.knownPaths.add(img)
+                if self.__isJournaled(img):
+                    continue
+                pending.append(img)
+
             try:
-                for root, _, files in os.walk(self.reqDir):
-                    for f in files:
-                        img = os.path.join(root, f)
-                        inQ = (img in self.imgQueue.queue)
-                        if not inQ:
-                            self.log.info(
-                                'Adding image {} to queue.'.format(img))
-                            self.imgQueue.put(
-                                img, timeout=self.hardDelay)
+                while pending and not self.stop:
+                    self.imgQueue.put(pending[0], timeout=self.hardDelay)
+                    self.log.info('Adding image {} to queue.'.format(pending[0]))
+                    pending.popleft()
             except queue.Full:
-                randWait = self.__calcRandWait()
-                self.log.info(
-                    'Image queue is full. Next check in {}s'.format(randWait))
+                self.metrics.inc('img_queue_full_total')
+                self.log.info('Image queue is full, {} images waiting.'.format(
+                    len(pending)))
 
+        watcher.close()
         self.log.info('Image collection stopped.')
 
+    def __isJournaled(self, imgPath):
+        # Schon klassifiziert, nur das Löschen kam nicht mehr durch. Das
+        # Ergebnis wird aus dem Journal nachgetragen.
+        if not self.journal:
+            return False
+
+        name = os.path.basename(imgPath)
+        if self.journal.getState(name) != ItsRequestJournal.CLASSIFIED:
+            self.journal.markQueued(name)
+            return False
+
+        self.log.info('Image {} is already classified, skipping.'.format(imgPath))
+        try:
+            self.__markImageAsClassified(imgPath)
+        except FileNotFoundError:
+            pass
+        with self.knownLock:
+            self.knownPaths.discard(imgPath)
+        return True
+
     def startSqlThread(self):
         self.sqlThread = Thread(target=self.__sendRequests)
         self.sqlThread.daemon = True
@@ -226,25 +715,63 @@ class ItsRequester:
 
     def __sendRequests(self):
         self.log.info('SQL thread is ready..')
-        while not self.stop:
+        batch = []
+        started = 0
+        # Nach dem Stop wird die Queue noch geleert
+        while not self.stop or batch or not self.reqQueue.empty():
+            timeout = self.hardDelay
+            if batch:
+                timeout = max(0.01, started + self.sqlBatchAge - time.time())
             try:
-                reqInfo, hisId = self.reqQueue.get(timeout=self.hardDelay)
-                self.sqlLog.logRequestInfo(reqInfo, hisId)
-                self.reqQueue.task_done()
+                item = self.reqQueue.get(timeout=timeout)
+                if not batch:
+                    started = time.time()
+                batch.append(item)
             except queue.Empty:
-                self.log.info('Request queue is empty retrying...')
+                if not batch:
+                    self.log.info('Request queue is empty retrying...')
+
+            if batch and (len(batch) >= self.sqlBatchSize
+                          or time.time() - started >= self.sqlBatchAge
+                          or (self.stop and self.reqQueue.empty())):
+                self.__writeRequests(batch)
+                batch = []
         self.log.info('SQL thread stopped')
 
-    def __calcRandWait(self):
-        size = int(self.imgQueue.qsize()/2)
-        if size == 0:
-            size = self.hardDelay
-
-        return random.randrange(size)
+    def __writeRequests(self, batch):
+        start = time.time()
+        try:
+            failed = self.sqlLog.logRequestInfos(
+                [(reqInfo, hisId) for reqInfo, hisId, _ in batch])
+        except Exception as e:
+            # Bleibt im Journal und wird beim nächsten Start nachgetragen
+            self.log.error('Could not persist {} results: {}'.format(
+                len(batch), e))
+            failed = range(len(batch))
+
+        self.metrics.observe('sql_insert_seconds', time.time() - start)
+        failed = set(failed)
+        self.metrics.inc('sql_batches_total')
+        self.metrics.inc('sql_rows_total', len(batch) - len(failed))
+        self.metrics.inc('sql_failed_rows_total', len(failed))
+        if failed:
+            self.log.error('{} of {} results not persisted.'.format(
+                len(failed), len(batch)))
+        if self.journal:
+            self.journal.markPersisted([
+                name for i, (_, _, name) in enumerate(batch)
+                if name and i not in failed])
+
+        for _ in batch:
+            self.reqQueue.task_done()
 
     def isRequestingFinished(self):
         _, _, files = next(os.walk(self.reqDir))
-        return not any(files)
+        # Wie beim Sammeln: temporäre Dateien vom ImageWriter zählen nicht
+        files = [f for f in files if f.endswith('.png') and not f.startswith('.')]
+        with self.memLock:
+            memPending = self.memPending
+        return not any(files) and not memPending
 
 
 if __name__ == "__main__":
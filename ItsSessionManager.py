@@ -12,6 +12,8 @@ from itsmisc import ItsSessionInfo, ItsConfig
 from itslogging import ItsLogger, ItsSqlLogger
 from ItsRequester import ItsRequester
 from ItsImageDumper import ItsImageDumper
+from ItsSessionRunner import ItsSessionRunner
+from ItsImageLoader import ItsImageLoader
 
 
 class ItsSessionManager():
@@ -37,6 +39,8 @@ class ItsSessionManager():
 
         if sql.dbExists:
             self.log.info('SQL Connection successful.')
+            # Einmal vor allen anderen Verbindungen (Requester, Dumper, Worker)
+            sql.migrateDatabase()
             return sql
         else:
             self.log.error('No SQL connection.')
@@ -53,16 +57,33 @@ class ItsSessionManager():
             self.log.info('Creating Directory: \'{}\''.format(self.inDir))
             os.makedirs(self.inDir)
 
-    def prepareRun(self):
+    def prepareRun(self, cntModels=1, xla=False):
         if not self.sqlLog:
             self.sqlLog = ItsSqlLogger(self.sql, self.log)
 
+        # Graph und Session wiederverwenden, nur die Gewichte zurücksetzen
+        if self.dcgan and self.dcgan.isReusable(cntModels, xla):
+            self.dcgan.resetWeights()
+            return
+
         if self.dcgan:
             del self.dcgan
         gc.collect()
         self.dcgan = ItsDcgan(self.sqlLog)
         self.dcgan.outputDir = self.outDir
-        self.dcgan.initDcgan()
+        self.dcgan.applyConfig(self.config.dcgan_cfg)
+
+        # Trainer und Requester laufen im selben Prozess, die Bilder müssen
+        # nicht über den Ordner gehen
+        if self.config.req_cfg.inMemory:
+            self.dcgan.imageSink = self.itsRequester.submitImage
+        self.dcgan.initDcgan(
+            fusedTrainStep=self.config.dcgan_cfg.fusedTrainStep,
+            useDataset=self.config.dcgan_cfg.useDataset,
+            cntModels=cntModels,
+            intraOpThreads=self.config.dcgan_cfg.intraOpThreads,
+            interOpThreads=self.config.dcgan_cfg.interOpThreads,
+            xla=xla)
 
     def __createDefaultSession(self):
         session = ItsSessionInfo()
@@ -75,6 +96,8 @@ class ItsSessionManager():
         session.cntGenerateImages = 2
         session.batch_size = 2
         session.debug = False
+        session.checkpointSteps = self.config.dcgan_cfg.checkpointSteps
+        session.xla = self.config.dcgan_cfg.xla
         return session
 
     def __finishSession(self):
@@ -85,87 +108,137 @@ class ItsSessionManager():
         self.itsRequester.stopRequesting()
         self.itsImgDumper.dumpBestImages()
 
-    def getImages(self):
-        imgs = []
-        # Alle nicht klassifizierten Bilder sammeln
-        for root, _, files in os.walk(self.inDir):
-            for f in files:
-                if '.png' in f:
-                    img = os.path.join(root, f)
-                    imgs.append(imageio.imread(img))
+    def __loadInputImages(self):
+        loader = ItsImageLoader(
+            self.log, self.config.dcgan_cfg.datasetDir,
+            self.config.dcgan_cfg.loaderWorkers)
+        return loader.load(loader.listImages(self.inDir))
 
-        self.log.info('Found {} input images.'.format(len(imgs)))
+    def getInputImages(self):
+        # (Name, Bild) Paare, die Bilder sind Zeilen des geladenen Arrays
+        names, imgs = self.__loadInputImages()
+        return list(zip(names, imgs))
 
+    def getImages(self):
+        # Alle Bilder als ein uint8 Array, bei aktivem Cache als memmap
+        _, imgs = self.__loadInputImages()
         return imgs
 
+    def __trainBaseImages(self, session, baseImgs):
+        # baseImgs ist eine Liste aus (Name, Bild), jedes Modell vergisst
+        cntModels = max(1, self.config.dcgan_cfg.cntModels)
+        baseImgs = sorted(baseImgs, key=lambda b: str(b[0]))
+        tasks = [baseImgs[i:i + cntModels]
+                 for i in range(0, len(baseImgs), cntModels)]
+
+        if session.resume:
+            tasks = [t for t in tasks if not self.__isTaskFinished(session, t)]
+            self.log.info('Resuming session {}: {} trainings left.'.format(
+                session.sessionNr, len(tasks)))
+
+        if self.config.dcgan_cfg.workers > 1:
+            runner = ItsSessionRunner(self.config.dcgan_cfg, self.outDir)
+            runner.run(session, tasks)
+        else:
+            for models in tasks:
+                self.prepareRun(len(models), session.xla)
+                self.dcgan.startSession(session, models)
+
+    def __isTaskFinished(self, session, models):
+        ckptDir = ItsDcgan.getCheckpointDir(
+            self.config.dcgan_cfg.checkpointDir, session.sessionNr, models)
+
+        finished = ItsDcgan.isCheckpointFinished(ckptDir)
+        if finished:
+            self.log.info('Skipping finished base images {}'.format(
+                [name for name, _ in models]))
+        return finished
+
+    def __canResume(self, session):
+        # Ohne Checkpoints gibt es keine Markierung für fertige Basisbilder,
+        # ein Resume würde alles neu trainieren
+        if not session.resume:
+            return True
+        if session.checkpointSteps > 0 and self.config.dcgan_cfg.checkpointDir:
+            return True
+        self.log.error(
+            'Cannot resume session {}: checkpoints are disabled.'.format(
+                session.sessionNr))
+        return False
+
+    def __startSession(self, session):
+        # Beim Resume wird die bestehende Session weitergeführt
+        if session.resume:
+            session.entryId = self.sql.getEntryIdForSessionNr(session.sessionNr)
+        if session.entryId is not None:
+            # Die Epochen hängen am bestehenden Eintrag, auch wenn seitdem
+            # andere Sessions angelegt wurden
+            self.log.info('Resuming session {}, entry {}.'.format(
+                session.sessionNr, session.entryId))
+        else:
+            if session.resume:
+                self.log.error(
+                    'No entry for session {}, starting a new one.'.format(
+                        session.sessionNr))
+            self.sql.insertSession(session)
+
     def firstRun(self):
-        self.prepareRun()
         session = self.__createDefaultSession()
+        self.prepareRun(xla=session.xla)
         session.sessionNr = 1
         session.max_epoch = 25001
         session.info_text = 'Erster Durchlauf mit einzelnen Bildern aus dem Input Ordner. Das trainierte DCGAN wird dabei immer beibehalten.'
         session.enableImageGeneration = True
         session.stepsHistory = 1000
         session.cntGenerateImages = 120
+        # Das DCGAN lernt über alle Bilder weiter, ein Checkpoint pro Bild
+        # wäre hier kein sinnvoller Wiedereinstieg
+        session.checkpointSteps = 0
 
-        imgs = self.getImages()
+        imgs = self.getInputImages()
         session.cntBaseImages = len(imgs)
 
         if len(imgs) > 0:
             self.itsRequester.startRequesting()
             self.sql.insertSession(session)
 
-            for img in imgs:
-                self.dcgan.setSessionBaseImages(session.sessionNr, [img, img])
-                self.dcgan.initEpoch(
-                    session.max_epoch,
-                    session.batch_size,
-                    session.enableImageGeneration,
-                    session.stepsHistory,
-                    session.cntGenerateImages
-                )
-                self.dcgan.start()
+            # Das DCGAN baut aufeinander auf, daher kein Worker Pool
+            for baseImg in imgs:
+                self.dcgan.startSession(session, [baseImg])
 
             self.__finishSession()
 
         else:
             self.log.error('No images in input dir \'{}\''.format(self.inDir))
 
-    def secondRun(self):
+    def secondRun(self, resume=False):
         session = self.__createDefaultSession()
+        session.resume = resume
         session.sessionNr = 2
         session.max_epoch = 25001
         session.info_text = 'DEBUG Zweiter Durchlauf mit allen Basisbildern und das DCGAN vergisst, was es gelernt hat.'
         session.enableImageGeneration = True
         session.stepsHistory = 1000
         session.cntGenerateImages = 120
+        if not self.__canResume(session):
+            return
 
-        imgs = self.getImages()
+        imgs = self.getInputImages()
         session.cntBaseImages = len(imgs)
 
         if len(imgs) > 0:
             self.itsRequester.startRequesting()
-            self.sql.insertSession(session)
+            self.__startSession(session)
 
-            for img in imgs:
-                self.prepareRun()
-                self.dcgan.setSessionBaseImages(session.sessionNr, [img, img])
-                self.dcgan.initEpoch(
-                    session.max_epoch,
-                    session.batch_size,
-                    session.enableImageGeneration,
-                    session.stepsHistory,
-                    session.cntGenerateImages
-                )
-                self.dcgan.start()
+            self.__trainBaseImages(session, imgs)
 
             self.__finishSession()
         else:
             self.log.error('No images in input dir \'{}\''.format(self.inDir))
 
     def thirdRun(self):
-        self.prepareRun()
         session = self.__createDefaultSession()
+        self.prepareRun(xla=session.xla)
         session.sessionNr = 3
         session.max_epoch = 25001
         session.info_text = 'Dritter Durchlauf mit allen Basisbildern.'
@@ -194,14 +267,17 @@ class ItsSessionManager():
         else:
             self.log.error('No images in input dir \'{}\''.format(self.inDir))
 
-    def startAutoFind(self):
+    def startAutoFind(self, resume=False):
         session = self.__createDefaultSession()
+        session.resume = resume
         session.sessionNr = 4
         session.max_epoch = 25001
         session.info_text = 'Autofind'
         session.enableImageGeneration = True
         session.stepsHistory = 1000
         session.cntGenerateImages = 120
+        if not self.__canResume(session):
+            return
 
         # Hier kommt eine Liste mit Tupeln
         imgs = self.itsImgDumper.getAutoFindImages()
@@ -209,19 +285,10 @@ class ItsSessionManager():
         session.cntBaseImages = len(imgs)
         if len(imgs) > 0:
             self.itsRequester.startRequesting()
-            self.sql.insertSession(session)
-            for img in imgs:
-                self.prepareRun()
-                self.dcgan.setSessionBaseImages(
-                    session.sessionNr, [img[1], img[1]])
-                self.dcgan.initEpoch(
-                    session.max_epoch,
-                    session.batch_size,
-                    session.enableImageGeneration,
-                    session.stepsHistory,
-                    session.cntGenerateImages
-                )
-                self.dcgan.start()
+            self.__startSession(session)
+            # Die Klasse dient als Name des Basisbilds
+            self.__trainBaseImages(
+                session, [(img[0], img[1]) for img in imgs])
 
             self.__finishSession()
 
@@ -229,8 +296,8 @@ class ItsSessionManager():
             self.log.error('No AutoFind images.')
 
     def debugRun(self):
-        self.prepareRun()
         session = self.__createDefaultSession()
+        self.prepareRun(xla=session.xla)
         session.sessionNr = 0
         session.max_epoch = 5
         session.info_text = 'DEBUG'
@@ -265,6 +332,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'run', help='Which run should be started. Possible runs are: \'first\', \'second\', \'third\', \'auto\', \'debug\'')
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Continue an interrupted \'second\' or \'auto\' run from its checkpoints.')
     args = parser.parse_args()
 
     if args.run in 'first':
@@ -272,13 +342,13 @@ if __name__ == "__main__":
         s.firstRun()
     elif args.run in 'second':
         s = ItsSessionManager()
-        s.secondRun()
+        s.secondRun(args.resume)
     elif args.run in 'third':
         s = ItsSessionManager()
         s.thirdRun()
     elif args.run in 'auto':
         s = ItsSessionManager()
-        s.startAutoFind()
+        s.startAutoFind(args.resume)
     elif args.run in 'debug':
         s = ItsSessionManager()
         s.debugRun()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gc
+import multiprocessing as mp
+from ItsDcgan import ItsDcgan
+from itsdb import ItsSqlConnection
+from itsmisc import ItsConfig
+from itslogging import ItsLogger, ItsSqlLogger
+
+
+# Jeder Worker Prozess hat genau einen eigenen Worker mit eigener TF Session
+worker = None
+
+
+def initWorker(dcganCfg, outDir, intraOpThreads, interOpThreads):
+    global worker
+    worker = ItsSessionWorker(dcganCfg, outDir, intraOpThreads, interOpThreads)
+
+
+def runWorkerTask(task):
+    itsSessionInfo, baseImages = task
+    return worker.train(itsSessionInfo, baseImages)
+
+
+class ItsSessionWorker():
+
+    def __init__(self, dcganCfg, outDir, intraOpThreads, interOpThreads):
+        self.logName = 'its_session_worker'
+        self.log = ItsLogger(self.logName, outDir=ItsConfig.VOLUME_FOLDER)
+        self.config = ItsConfig()
+        self.dcganCfg = dcganCfg
+        self.outDir = outDir
+        self.intraOpThreads = intraOpThreads
+        self.interOpThreads = interOpThreads
+        self.pid = os.getpid()
+        self.sqlLog = self.__createSqlLogger()
+        self.dcgan = None
+        self.log.info('Worker {} is ready.'.format(self.pid))
+
+    def __createSqlLogger(self):
+        # Eine MySql Verbindung kann nicht zwischen Prozessen geteilt werden
+        sql = ItsSqlConnection(self.config.sql_cfg, log=self.log)
+        if sql.dbExists:
+            return ItsSqlLogger(sql, self.log)
+        else:
+            self.log.error('Worker {}: No SQL connection.'.format(self.pid))
+            return None
+
+    def train(self, itsSessionInfo, baseImages):
+        names = [name for name, _ in baseImages]
+        try:
+            self.log.info('Worker {}: Training {}'.format(self.pid, names))
+            self.__prepareDcgan(len(baseImages), itsSessionInfo.xla)
+            self.dcgan.startSession(itsSessionInfo, baseImages)
+            return names, None
+        except Exception as e:
+            self.log.error('Worker {}: Training {} failed: {}'.format(
+                self.pid, names, e))
+            # Zustand unklar, beim nächsten Task neu aufbauen
+            self.dcgan = None
+            gc.collect()
+            return names, str(e)
+
+    def __prepareDcgan(self, cntModels, xla=False):
+        # Graph und Session bleiben über alle Tasks des Workers bestehen
+        if self.dcgan and self.dcgan.isReusable(cntModels, xla):
+            self.dcgan.resetWeights()
+            return
+
+        self.dcgan = None
+        gc.collect()
+        self.dcgan = ItsDcgan(self.sqlLog)
+        self.dcgan.outputDir = self.outDir
+        self.dcgan.applyConfig(self.dcganCfg)
+        self.dcgan.initDcgan(
+            fusedTrainStep=self.dcganCfg.fusedTrainStep,
+            useDataset=self.dcganCfg.useDataset,
+            cntModels=cntModels,
+            intraOpThreads=self.intraOpThreads,
+            interOpThreads=self.interOpThreads,
+            xla=xla)
+
+
+class ItsSessionRunner():
+
+    def __init__(self, dcganCfg, outDir):
+        self.logName = 'its_session_runner'
+        self.log = ItsLogger(self.logName, outDir=ItsConfig.VOLUME_FOLDER)
+        self.dcganCfg = dcganCfg
+        self.outDir = outDir
+        self.workers = max(1, dcganCfg.workers)
+
+        # Ohne Angabe werden die Kerne auf die Worker aufgeteilt
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.intraOpThreads = dcganCfg.intraOpThreads or threads
+        self.interOpThreads = dcganCfg.interOpThreads or threads
+
+    def run(self, itsSessionInfo, tasks):
+        # tasks ist eine Liste von Basisbild-Gruppen, eine Gruppe pro DCGAN
+        self.log.info(
+            'Starting {} trainings on {} workers ({} intra / {} inter op threads)'.format(
+                len(tasks), self.workers,
+                self.intraOpThreads, self.interOpThreads))
+
+        # spawn statt fork, TF verträgt keinen Fork nach dem Import
+        ctx = mp.get_context('spawn')
+        pool = ctx.Pool(
+            self.workers,
+            initializer=initWorker,
+            initargs=(
+                self.dcganCfg, self.outDir,
+                self.intraOpThreads, self.interOpThreads
+            ))
+
+        failed = []
+        try:
+            jobs = [(itsSessionInfo, t) for t in tasks]
+            for names, error in pool.imap_unordered(runWorkerTask, jobs):
+                if error:
+                    self.log.error('Training {} failed: {}'.format(names, error))
+                    failed.append(names)
+                else:
+                    self.log.info('Training {} finished.'.format(names))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        self.log.info('All trainings done, {} failed.'.format(len(failed)))
+        return failed
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+    Lokales Journal des Requesters (SQLite). Jedes Bild durchläuft die
+    Zustände queued -> sent -> classified -> persisted. Ein Ergebnis wird
+    gespeichert, bevor das Bild gelöscht wird, damit nach einem Absturz
+    nichts erneut gesendet oder verloren wird.
+'''
+
+import os
+import json
+import time
+import sqlite3
+import numpy as np
+from threading import Lock
+from itsmisc import ItsRequestInfo
+
+
+class ItsRequestJournal():
+
+    QUEUED = 'queued'
+    SENT = 'sent'
+    CLASSIFIED = 'classified'
+    PERSISTED = 'persisted'
+
+    def __init__(self, path, log):
+        self.path = path
+        self.log = log
+        self.lock = Lock()
+
+        dirName = os.path.dirname(path)
+        if dirName and not os.path.exists(dirName):
+            os.makedirs(dirName)
+
+        # Alle Requester Threads teilen sich die Verbindung
+        self.con = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        # WAL übersteht einen Absturz des Prozesses, NORMAL reicht dafür
+        self.con.execute('PRAGMA journal_mode=WAL')
+        self.con.execute('PRAGMA synchronous=NORMAL')
+        self.con.execute(
+            'CREATE TABLE IF NOT EXISTS its_request_journal ('
+            'name TEXT PRIMARY KEY, '
+            'state TEXT NOT NULL, '
+            'session INTEGER, '
+            'epoch INTEGER, '
+            'his_id INTEGER, '
+            'nn_class TEXT, '
+            'max_confidence REAL, '
+            'json_result TEXT, '
+            'img_shape TEXT, '
+            'img BLOB, '
+            'img_hash TEXT, '
+            'updated REAL)')
+        try:
+            # Journal aus einer älteren Version
+            self.con.execute(
+                'ALTER TABLE its_request_journal ADD COLUMN img_hash TEXT')
+        except sqlite3.OperationalError:
+            pass
+        self.log.info('Request journal {}'.format(path))
+
+    def getState(self, name):
+        with self.lock:
+            row = self.con.execute(
+                'SELECT state FROM its_request_journal WHERE name = ?',
+                (name,)).fetchone()
+        return row[0] if row else None
+
+    def markQueued(self, name):
+        # Ein bereits klassifiziertes Bild behält seinen Zustand
+        with self.lock:
+            self.con.execute(
+                'INSERT OR IGNORE INTO its_request_journal (name, state, updated) '
+                'VALUES (?, ?, ?)', (name, ItsRequestJournal.QUEUED, time.time()))
+
+    def markSent(self, name):
+        with self.lock:
+            self.con.execute(
+                'INSERT OR REPLACE INTO its_request_journal (name, state, updated) '
+                'VALUES (?, ?, ?)', (name, ItsRequestJournal.SENT, time.time()))
+
+    def markClassified(self, name, reqInfo, hisId):
+        img = np.ascontiguousarray(reqInfo.img_array)
+        with self.lock:
+            self.con.execute(
+                'INSERT OR REPLACE INTO its_request_journal '
+                '(name, state, session, epoch, his_id, nn_class, max_confidence, '
+                'json_result, img_shape, img, img_hash, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                    name, ItsRequestJournal.CLASSIFIED,
+                    int(reqInfo.sessionNr), int(reqInfo.epoch), hisId,
+                    str(reqInfo.nn_class), float(reqInfo.max_confidence),
+                    json.dumps(reqInfo.json_result),
+                    ','.join(str(s) for s in img.shape),
+                    sqlite3.Binary(img.tobytes()), reqInfo.img_hash, time.time()))
+
+    def markPersisted(self, names):
+        # Das Bild ist weg und das Ergebnis in MySQL, die Einträge werden
+        # nicht mehr gebraucht
+        with self.lock:
+            self.con.executemany(
+                'DELETE FROM its_request_journal WHERE name = ?',
+                [(n,) for n in names])
+
+    def forget(self, name):
+        with self.lock:
+            self.con.execute(
+                'DELETE FROM its_request_journal WHERE name = ? AND state IN (?, ?)',
+                (name, ItsRequestJournal.QUEUED, ItsRequestJournal.SENT))
+
+    def getUnpersisted(self):
+        # Liefert (Name, ItsRequestInfo, History ID) aller klassifizierten,
+        # aber noch nicht gespeicherten Bilder
+        with self.lock:
+            rows = self.con.execute(
+                'SELECT name, session, epoch, his_id, nn_class, max_confidence, '
+                'json_result, img_shape, img, img_hash FROM its_request_journal '
+                'WHERE state = ? ORDER BY updated',
+                (ItsRequestJournal.CLASSIFIED,)).fetchall()
+
+        results = []
+        for name, session, epoch, hisId, nnClass, conf, jRes, shape, img, imgHash in rows:
+            reqInfo = ItsRequestInfo(
+                sessionNr=session,
+                epoch=epoch,
+                nn_class=nnClass,
+                max_confidence=conf,
+                json_result=json.loads(jRes),
+                img_array=np.frombuffer(img, dtype=np.uint8).reshape(
+                    [int(s) for s in shape.split(',')]),
+                img_hash=imgHash)
+            results.append((name, reqInfo, hisId))
+        return results
+
+    def getOpen(self):
+        # Bilder, die vor dem Absturz eingereiht oder gesendet wurden
+        with self.lock:
+            rows = self.con.execute(
+                'SELECT name FROM its_request_journal WHERE state IN (?, ?)',
+                (ItsRequestJournal.QUEUED, ItsRequestJournal.SENT)).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self):
+        with self.lock:
+            self.con.close()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import re
+import ast
 import numpy as np
 import mysql.connector as mysql
 
@@ -9,11 +10,51 @@ class ItsSqlConnection():
 
     DEFAULT_DATABASE_FILE = './itsdb/sql_scripts/create_default_database.sql'
 
+    # Anzahl Klassen pro Ergebnis, die in eigenen Spalten gespeichert werden
+    TOP_K = 5
+
+    # Stand von TABLES, MIGRATIONS und dem Backfill. Bei jeder neuen
+    # Migration erhöhen, auch in den SQL Skripten.
+    SCHEMA_VERSION = 1
+
+    # Tabellen, die in älteren Datenbanken noch fehlen
+    TABLES = [
+        'CREATE TABLE IF NOT EXISTS its_schema_version (version INT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS its_class ('
+        'id INT NOT NULL AUTO_INCREMENT, name VARCHAR(255) NOT NULL,'
+        ' PRIMARY KEY (id), UNIQUE KEY uq_class_name (name))',
+    ]
+
+    # Spalten, die in älteren Datenbanken noch fehlen: (Tabelle, Spalte,
+    # Statement oder Tupel aus Statements)
+    MIGRATIONS = [
+        ('its_epoch_history', 'base_img',
+         'ALTER TABLE its_epoch_history ADD COLUMN base_img VARCHAR(255)'),
+        ('its_epoch_history', 'stop_reason',
+         'ALTER TABLE its_epoch_history ADD COLUMN stop_reason VARCHAR(32)'),
+        ('its_request_history', 'img_hash',
+         'ALTER TABLE its_request_history ADD COLUMN img_hash CHAR(40),'
+         ' ADD INDEX idx_img_hash (img_hash)'),
+        ('its_request_history', 'class_id', (
+            'ALTER TABLE its_request_history ADD COLUMN class_id INT,'
+            ' ADD COLUMN class_id_2 INT, ADD COLUMN confidence_2 FLOAT,'
+            ' ADD COLUMN class_id_3 INT, ADD COLUMN confidence_3 FLOAT,'
+            ' ADD COLUMN class_id_4 INT, ADD COLUMN confidence_4 FLOAT,'
+            ' ADD COLUMN class_id_5 INT, ADD COLUMN confidence_5 FLOAT,'
+            ' ADD INDEX idx_class_conf (class_id, max_confidence)')),
+    ]
+
+    # Alte Zeilen ohne class_id werden in Blöcken dieser Größe übernommen
+    BACKFILL_BATCH = 1000
+
     def __init__(self, slq_cfg, log=None):
         self.sql_cfg = slq_cfg
         self.log = log
         self.dbExists = False
         self.db_con = None
+        # Klassenname <-> ID aus its_class
+        self.classIds = {}
+        self.classNames = {}
         try:
             self.__createConnection()
             self.__checkDatabase()
@@ -48,9 +89,136 @@ class ItsSqlConnection():
         if self.dbExists:
             self.__debug('Database \'{}\' exists'.format(
                 self.sql_cfg.database))
+            self.__checkSchemaVersion()
         else:
             self.createDefaultDatabase()
 
+    def getSchemaVersion(self):
+        cursor = self.__getCursor()
+        try:
+            cursor.execute('SELECT MAX(version) FROM its_schema_version')
+            version, = cursor.fetchone()
+        except mysql.Error:
+            # Datenbank aus der Zeit vor den Migrationen
+            version = None
+        cursor.close()
+        self.db_con.commit()
+        return version or 0
+
+    def __checkSchemaVersion(self):
+        # Jede Verbindung prüft nur, migriert wird einmal vom SessionManager
+        version = self.getSchemaVersion()
+        if version < ItsSqlConnection.SCHEMA_VERSION:
+            self.__error(
+                'Database schema version {} is outdated, expected {}. '
+                'Start the session manager to migrate it.'.format(
+                    version, ItsSqlConnection.SCHEMA_VERSION))
+
+    def migrateDatabase(self):
+        if self.getSchemaVersion() >= ItsSqlConnection.SCHEMA_VERSION:
+            return
+
+        # Mehrere Prozesse könnten gleichzeitig starten
+        cursor = self.__getCursor()
+        cursor.execute('SELECT GET_LOCK("its_migration", 600)')
+        cursor.fetchone()
+        try:
+            if self.getSchemaVersion() < ItsSqlConnection.SCHEMA_VERSION:
+                self.__migrate(cursor)
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK("its_migration")')
+            cursor.fetchone()
+            cursor.close()
+
+    def __migrate(self, cursor):
+        self.__debug('Migrating database \'{}\' to schema version {}'.format(
+            self.sql_cfg.database, ItsSqlConnection.SCHEMA_VERSION))
+        for stmt in ItsSqlConnection.TABLES:
+            cursor.execute(stmt)
+        self.db_con.commit()
+
+        for table, column, migration in ItsSqlConnection.MIGRATIONS:
+            stmt = 'SELECT COUNT(*) FROM information_schema.COLUMNS'
+            stmt += ' WHERE TABLE_SCHEMA = "{}" AND TABLE_NAME = "{}"'.format(
+                self.sql_cfg.database, table)
+            stmt += ' AND COLUMN_NAME = "{}"'.format(column)
+            cursor.execute(stmt)
+            cnt, = cursor.fetchone()
+
+            if not cnt:
+                if not isinstance(migration, tuple):
+                    migration = (migration,)
+                for stmt in migration:
+                    self.__debugStatement(stmt)
+                    cursor.execute(stmt)
+                self.db_con.commit()
+
+        # Ein abgebrochener Lauf setzt die Version nicht und wird beim
+        # nächsten Start ab der ersten Zeile ohne class_id fortgesetzt
+        self.__backfillClassColumns(cursor)
+
+        cursor.execute('DELETE FROM its_schema_version')
+        cursor.execute(
+            'INSERT INTO its_schema_version (version) VALUES ({})'.format(
+                ItsSqlConnection.SCHEMA_VERSION))
+        self.db_con.commit()
+
+    def __backfillClassColumns(self, cursor):
+        # Alte Zeilen haben nur class und json_result. Neue Zeilen haben
+        # kein class mehr und werden daher nicht erfasst.
+        stmt = 'SELECT id, class, json_result FROM its_request_history'
+        stmt += ' WHERE class_id IS NULL AND class NOT IN ("-1", "dummy")'
+        stmt += ' AND id > %s ORDER BY id LIMIT {}'.format(
+            ItsSqlConnection.BACKFILL_BATCH)
+
+        # max_confidence ist schon gesetzt
+        columns = ['class_id']
+        for k in range(2, ItsSqlConnection.TOP_K + 1):
+            columns += ['class_id_{}'.format(k), 'confidence_{}'.format(k)]
+        update = 'UPDATE its_request_history SET '
+        update += ', '.join('{} = %s'.format(c) for c in columns)
+        # Sonst setzt ON UPDATE CURRENT_TIMESTAMP das Datum neu
+        update += ', insert_date = insert_date WHERE id = %s'
+
+        lastId, cnt = 0, 0
+        while True:
+            cursor.execute(stmt, (lastId,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            tops = [self.__parseOldResult(name, jRes) for _, name, jRes in rows]
+            self.__loadClassIds(cursor, set(n for top in tops for n, _ in top))
+
+            params = []
+            for (rowId, _, _), top in zip(rows, tops):
+                top += [(None, None)] * (ItsSqlConnection.TOP_K - len(top))
+                p = [self.classIds.get(top[0][0])]
+                for name, conf in top[1:]:
+                    p += [self.classIds.get(name), conf]
+                params.append(tuple(p) + (rowId,))
+
+            cursor.executemany(update, params)
+            self.db_con.commit()
+            lastId = rows[-1][0]
+            cnt += len(rows)
+
+        if cnt:
+            self.__debug('Backfilled class columns of {} requests'.format(cnt))
+
+    def __parseOldResult(self, name, jsonResult):
+        # json_result wurde früher als Python Repräsentation der Liste
+        # gespeichert. Geht das nicht, bleibt nur die beste Klasse.
+        try:
+            top = ast.literal_eval(jsonResult)
+            top = [(str(e['class']), float(e['confidence']))
+                   for e in top[:ItsSqlConnection.TOP_K]]
+            if top and top[0][0] == name:
+                return top
+        except (ValueError, SyntaxError, TypeError, KeyError, IndexError):
+            pass
+        return [(name, None)]
+
     def createDefaultDatabase(self,):
         self.__debug('Database does not exist. Creating database \'{}\''.format(
             self.sql_cfg.database))
@@ -97,24 +265,6 @@ class ItsSqlConnection():
         stmt = re.sub(' +', ' ', stmt)
         return stmt
 
-    def __getHisIdForEntry(self, itsEpochInfo):
-        stmt = 'SELECT id FROM its_epoch_history WHERE '
-        stmt += 'session_id = {} and epoch_nr = {} '.format(
-            itsEpochInfo.sessionNr,
-            itsEpochInfo.epoch
-        )
-        stmt += 'ORDER BY insert_date DESC LIMIT 1'
-
-        cursor = self.__getCursor()
-
-        self.__debugStatement(stmt)
-        cursor.execute(stmt)
-
-        hisId, = cursor.fetchone()
-        cursor.close()
-
-        return hisId
-
     def getEntryIdForSession(self):
         # Nächste Id holen
         stmt = 'SELECT AUTO_INCREMENT'
@@ -182,17 +332,34 @@ class ItsSqlConnection():
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
         cursor.execute(stmt)
+        itsSessionInfo.entryId = cursor.lastrowid
         self.db_con.commit()
         cursor.close()
 
+    def getEntryIdForSessionNr(self, sessionNr):
+        # Letzter its_session Eintrag einer Session Nummer, z.B. für ein Resume
+        stmt = 'SELECT MAX(id) FROM its_session WHERE session_id = {}'.format(
+            int(sessionNr))
+
+        self.__debugStatement(stmt)
+        cursor = self.__getCursor()
+        cursor.execute(stmt)
+        entryId, = cursor.fetchone()
+        cursor.close()
+        self.db_con.commit()
+        return entryId
+
     def insertEpoch(self, itsEpochInfo):
         self.__debug('Preparing EpochInfo for insert...')
-        entry_id = self.getEntryIdForSession()
+        # Ohne feste ID der zuletzt angelegte Session Eintrag
+        entry_id = itsEpochInfo.entryId
+        if entry_id is None:
+            entry_id = self.getEntryIdForSession()
         stmt = 'INSERT INTO its_epoch_history ('
         stmt += 'session_id, epoch_nr,'
         stmt += 'disc_loss, gen_loss,'
         stmt += 'disc_real_loss, disc_fake_loss,'
-        stmt += 'entry_id) VALUES ({},{},{},{},{},{},{})'.format(
+        stmt += 'entry_id, base_img) VALUES ({},{},{},{},{},{},{},%s)'.format(
             itsEpochInfo.sessionNr,
             itsEpochInfo.epoch,
             itsEpochInfo.d_ls,
@@ -203,37 +370,183 @@ class ItsSqlConnection():
         )
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
-        cursor.execute(stmt)
+        cursor.execute(stmt, (itsEpochInfo.baseImage,))
+        # Mehrere Modelle schreiben dieselbe Epoche, daher die eigene ID
+        hisId = cursor.lastrowid
         self.db_con.commit()
         cursor.close()
-        return self.__getHisIdForEntry(itsEpochInfo)
+        return hisId
 
-    def insertRequest(self, itsRequestInfo, hisId):
+    def updateStopReason(self, hisId, reason):
+        # Grund steht am letzten History Eintrag eines Basisbilds. Ohne
+        # insert_date = insert_date greift ON UPDATE CURRENT_TIMESTAMP.
+        stmt = 'UPDATE its_epoch_history SET stop_reason = %s,'
+        stmt += ' insert_date = insert_date WHERE id = {}'.format(hisId)
 
-        self.__debug('Preparing EpochInfo for insert...')
+        self.__debugStatement(stmt)
+        cursor = self.__getCursor()
+        cursor.execute(stmt, (reason,))
+        self.db_con.commit()
+        cursor.close()
 
-        stmt = 'INSERT INTO its_request_history ('
-        stmt += 'session_id, epoch_nr, class, max_confidence,'
-        stmt += 'json_result, img_blob, his_id)'
-        stmt += 'VALUES ({},{},"{}",{},"{}",%s,{})'.format(
-            itsRequestInfo.sessionNr,
-            itsRequestInfo.epoch,
-            itsRequestInfo.nn_class,
-            itsRequestInfo.max_confidence,
-            itsRequestInfo.json_result,
-            hisId
-        )
+    def getMaxConfidenceForHistory(self, hisIds):
+        if not hisIds:
+            return None
+
+        stmt = 'SELECT MAX(max_confidence) FROM its_request_history'
+        stmt += ' WHERE his_id IN ({})'.format(
+            ','.join(str(int(h)) for h in hisIds))
 
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
-        cursor.execute(stmt, (itsRequestInfo.img_array.tobytes(),))
+        cursor.execute(stmt)
+        row = cursor.fetchone()
+        cursor.close()
+
+        maxConf = None
+        if row:
+            maxConf, = row
+        return maxConf
+
+    def getRequestCountForHistory(self, hisId):
+        stmt = 'SELECT COUNT(*) FROM its_request_history WHERE his_id = {}'.format(
+            int(hisId))
+
+        cursor = self.__getCursor()
+        cursor.execute(stmt)
+        cnt, = cursor.fetchone()
+        cursor.close()
+        # Transaktion beenden, sonst sieht die nächste Abfrage denselben Stand
         self.db_con.commit()
+        return cnt
+
+    def insertRequest(self, itsRequestInfo, hisId):
+        self.insertRequests([(itsRequestInfo, hisId)])
+
+    def insertRequests(self, rows):
+        # rows: Liste aus (ItsRequestInfo, History ID). Ein Statement und ein
+        # Commit für alle Zeilen. Liefert die Indizes der Zeilen, die auch
+        # einzeln nicht gespeichert werden konnten.
+        columns = ['session_id', 'epoch_nr', 'class_id', 'max_confidence']
+        for k in range(2, ItsSqlConnection.TOP_K + 1):
+            columns += ['class_id_{}'.format(k), 'confidence_{}'.format(k)]
+        columns += ['img_blob', 'img_hash', 'his_id']
+
+        stmt = 'INSERT INTO its_request_history ('
+        stmt += ', '.join(columns) + ') '
+        stmt += 'VALUES ({})'.format(','.join(['%s'] * len(columns)))
+
+        self.__debug('Inserting {} requests...'.format(len(rows)))
+        cursor = self.__getCursor()
+        try:
+            self.__loadClassIds(cursor, set(
+                name for r, _ in rows for name, _ in self.getTopClasses(r)))
+            params = [self.__getRequestParams(r, h) for r, h in rows]
+        except mysql.Error:
+            self.db_con.rollback()
+            cursor.close()
+            raise
+
+        try:
+            cursor.executemany(stmt, params)
+            self.db_con.commit()
+            return []
+        except mysql.Error as e:
+            self.db_con.rollback()
+            self.__error('Batch insert failed, inserting rows one by one: {}'.format(e))
+
+        # Eine fehlerhafte Zeile soll nicht den ganzen Batch kosten
+        failed = []
+        for i, p in enumerate(params):
+            try:
+                cursor.execute(stmt, p)
+                self.db_con.commit()
+            except mysql.Error as e:
+                self.db_con.rollback()
+                self.__error('Insert for His ID {} failed: {}'.format(p[-1], e))
+                failed.append(i)
         cursor.close()
+        return failed
+
+    def getTopClasses(self, itsRequestInfo):
+        # Die Antwort ist eine nach Konfidenz sortierte Liste aus
+        # {'class': ..., 'confidence': ...}, Fehler haben kein Ergebnis
+        if not isinstance(itsRequestInfo.json_result, list):
+            return []
+        return [(str(e['class']), float(e['confidence']))
+                for e in itsRequestInfo.json_result[:ItsSqlConnection.TOP_K]]
+
+    def __getRequestParams(self, itsRequestInfo, hisId):
+        top = self.getTopClasses(itsRequestInfo)
+        top += [(None, None)] * (ItsSqlConnection.TOP_K - len(top))
+
+        params = [int(itsRequestInfo.sessionNr), int(itsRequestInfo.epoch)]
+        for name, conf in top:
+            params += [self.classIds.get(name), conf]
+        # Ohne Ergebnis bleibt max_confidence wie bisher bei -1
+        if params[3] is None:
+            params[3] = float(itsRequestInfo.max_confidence)
+        params += [
+            itsRequestInfo.img_array.tobytes(), itsRequestInfo.img_hash, hisId]
+        return tuple(params)
+
+    def __loadClassIds(self, cursor, names):
+        # Neue Klassen anlegen, die IDs bleiben für die Verbindung gemerkt
+        missing = [n for n in names if n not in self.classIds]
+        if not missing:
+            return
+
+        cursor.executemany(
+            'INSERT IGNORE INTO its_class (name) VALUES (%s)',
+            [(n,) for n in missing])
+        self.db_con.commit()
+        self.__loadClassNames(cursor)
+
+    def __loadClassNames(self, cursor):
+        cursor.execute('SELECT id, name FROM its_class')
+        for classId, name in cursor.fetchall():
+            self.classIds[name] = classId
+            self.classNames[classId] = name
+
+    def __getClassName(self, cursor, classId):
+        if classId is not None and classId not in self.classNames:
+            self.__loadClassNames(cursor)
+        return self.classNames.get(classId)
+
+    def getRequestForHash(self, imgHash):
+        # Ergebnis eines bereits klassifizierten Bildes mit gleichem Inhalt,
+        # als (Klasse, Konfidenz, Ergebnisliste) oder None
+        columns = ['class_id', 'max_confidence']
+        for k in range(2, ItsSqlConnection.TOP_K + 1):
+            columns += ['class_id_{}'.format(k), 'confidence_{}'.format(k)]
+
+        stmt = 'SELECT {} FROM its_request_history'.format(', '.join(columns))
+        stmt += ' WHERE img_hash = %s AND class_id IS NOT NULL LIMIT 1'
+
+        cursor = self.__getCursor()
+        try:
+            cursor.execute(stmt, (imgHash,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            result = []
+            for k in range(0, len(row), 2):
+                name = self.__getClassName(cursor, row[k])
+                if name is not None:
+                    result.append({'class': name, 'confidence': row[k + 1]})
+        finally:
+            cursor.close()
+            # Transaktion beenden, sonst bleibt der Snapshot der ersten
+            # Abfrage bestehen und neue Zeilen werden nie gefunden
+            self.db_con.commit()
+        return result[0]['class'], result[0]['confidence'], result
 
     def getDistinctClassNames(self):
 
         # Infos aus dem View holen
-        stmt = 'SELECT DISTINCT class FROM its_request_history WHERE class NOT IN ("-1", "dummy")'
+        stmt = 'SELECT c.name FROM its_class AS c WHERE EXISTS ('
+        stmt += 'SELECT 1 FROM its_request_history AS rh WHERE rh.class_id = c.id)'
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
         cursor.execute(stmt)
@@ -247,12 +560,13 @@ class ItsSqlConnection():
         return classList
 
     def getMaxConfId(self, clsName, n=1):
-        stmt = 'SELECT id FROM its_request_history WHERE class = "{}" ORDER BY max_confidence DESC LIMIT {}'.format(
-            clsName, n)
+        stmt = 'SELECT rh.id FROM its_request_history AS rh'
+        stmt += ' JOIN its_class AS c ON c.id = rh.class_id'
+        stmt += ' WHERE c.name = %s ORDER BY rh.max_confidence DESC LIMIT {}'.format(n)
 
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
-        cursor.execute(stmt)
+        cursor.execute(stmt, (clsName,))
 
         maxIds = []
         for entry in cursor:
@@ -266,8 +580,10 @@ class ItsSqlConnection():
             return maxIds
 
     def getImageFromRequestHistory(self, requestId):
-        stmt = 'SELECT class, img_blob, max_confidence FROM its_request_history WHERE id = {}'.format(
-            requestId)
+        stmt = 'SELECT COALESCE(c.name, rh.class), rh.img_blob, rh.max_confidence'
+        stmt += ' FROM its_request_history AS rh'
+        stmt += ' LEFT JOIN its_class AS c ON c.id = rh.class_id'
+        stmt += ' WHERE rh.id = {}'.format(requestId)
 
         self.__debugStatement(stmt)
         cursor = self.__getCursor()
@@ -283,19 +599,51 @@ class ItsSqlConnection():
 
         return (clsName, self.__convertToNumpy(imgBlob), maxConf)
 
-    def getAutoFindImages(self):
-        clsNames = self.getDistinctClassNames()
-        bestIds = []
-        for c in clsNames:
-            bestIds.append(self.getMaxConfId(c))
+    def getBestIdPerClass(self):
+        # Bestes Bild jeder Klasse in einer Abfrage, bei Gleichstand zählt
+        # die kleinste ID
+        stmt = 'SELECT rh.class_id, MIN(rh.id) FROM its_request_history AS rh'
+        stmt += ' JOIN (SELECT class_id, MAX(max_confidence) AS max_conf'
+        stmt += ' FROM its_request_history WHERE class_id IS NOT NULL'
+        stmt += ' GROUP BY class_id) AS best'
+        stmt += ' ON rh.class_id = best.class_id AND rh.max_confidence = best.max_conf'
+        stmt += ' GROUP BY rh.class_id'
+
+        self.__debugStatement(stmt)
+        cursor = self.__getCursor()
+        cursor.execute(stmt)
+
+        bestIds = [entry[1] for entry in cursor]
+        cursor.close()
+
+        return bestIds
+
+    def getImagesFromRequestHistory(self, requestIds):
+        if not requestIds:
+            return []
+
+        stmt = 'SELECT COALESCE(c.name, rh.class), rh.img_blob, rh.max_confidence'
+        stmt += ' FROM its_request_history AS rh'
+        stmt += ' LEFT JOIN its_class AS c ON c.id = rh.class_id'
+        stmt += ' WHERE rh.id IN ({}) ORDER BY rh.id'.format(
+            ','.join(str(int(i)) for i in requestIds))
+
+        self.__debugStatement(stmt)
+        cursor = self.__getCursor()
+        cursor.execute(stmt)
 
-        # Tupel aus (Klasse, NumpyArray, Konfidenz)
         imgs = []
-        for i in bestIds:
-            imgs.append(self.getImageFromRequestHistory(i))
+        for clsName, imgBlob, maxConf in cursor:
+            imgs.append((clsName, self.__convertToNumpy(imgBlob), maxConf))
+        cursor.close()
 
         return imgs
 
+    def getAutoFindImages(self):
+        # Tupel aus (Klasse, NumpyArray, Konfidenz), zwei Abfragen statt
+        # zwei pro Klasse
+        return self.getImagesFromRequestHistory(self.getBestIdPerClass())
+
     def __getCursor(self):
         cursor = self.db_con.cursor()
         cursor.execute('use {}'.format(self.sql_cfg.database))
@@ -312,6 +660,10 @@ class ItsSqlConnection():
         if self.log:
             self.log.debug(msg)
 
+    def __error(self, msg):
+        if self.log:
+            self.log.error(msg)
+
     def __convertToNumpy(self, imgBlob):
         # Erst mal hardcoded, evtl. später anders
         return np.frombuffer(imgBlob, dtype=np.uint8).reshape((64, 64, 3))
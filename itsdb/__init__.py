@@ -1 +1,2 @@
-from itsdb.ItsSqlConnection import ItsSqlConnection
\ No newline at end of file
+from itsdb.ItsSqlConnection import ItsSqlConnection
+from itsdb.ItsRequestJournal import ItsRequestJournal
@@ -21,12 +21,27 @@ CREATE TABLE its_epoch_history (
     disc_real_loss FLOAT,
     disc_fake_loss FLOAT,
     entry_id INT NOT NULL,
+    base_img VARCHAR(255),
+    stop_reason VARCHAR(32),
     insert_date DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (entry_id , session_id)
         REFERENCES its_session (id , session_id),
     PRIMARY KEY (id, session_id , epoch_nr)
 );
 
+CREATE TABLE its_class (
+    id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(255) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE KEY uq_class_name (name)
+);
+
+CREATE TABLE its_schema_version (
+    version INT NOT NULL
+);
+
+INSERT INTO its_schema_version (version) VALUES (1);
+
 CREATE TABLE its_request_history (
     id INT NOT NULL AUTO_INCREMENT,
     session_id INT NOT NULL,
@@ -35,10 +50,22 @@ CREATE TABLE its_request_history (
     max_confidence FLOAT,
     json_result TEXT,
     img_blob BLOB,
+    img_hash CHAR(40),
+    class_id INT,
+    class_id_2 INT,
+    confidence_2 FLOAT,
+    class_id_3 INT,
+    confidence_3 FLOAT,
+    class_id_4 INT,
+    confidence_4 FLOAT,
+    class_id_5 INT,
+    confidence_5 FLOAT,
     his_id INT NOT NULL,
     insert_date DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (his_id , session_id , epoch_nr)
         REFERENCES its_epoch_history (id , session_id , epoch_nr),
+    INDEX idx_img_hash (img_hash),
+    INDEX idx_class_conf (class_id, max_confidence),
     PRIMARY KEY (id , session_id , epoch_nr)
 );
 
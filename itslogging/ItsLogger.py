@@ -68,6 +68,10 @@ class ItsLogger(logging.LoggerAdapter):
             itsEpochInfo.epoch
         ))
 
+        self.lgr.debug('Base image:'.rjust(22, ' ') + '\t{}'.format(
+            itsEpochInfo.baseImage
+        ))
+
         self.lgr.debug('Batch size:'.rjust(22, ' ') + '\t{:1d}'.format(
             itsEpochInfo.batch_size
         ))
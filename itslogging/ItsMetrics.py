@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+'''
+    Zähler, Messwerte und Latenz Histogramme für laufende Komponenten.
+    Ausgabe im Prometheus Textformat über einen lokalen Port oder als JSON
+    Datei im Volume Ordner.
+'''
+import os
+import json
+import time
+from threading import Thread, Lock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+class ItsMetrics():
+
+    # Obergrenzen der Histogramm Buckets in Sekunden
+    BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1.0, 2.5, 5.0, 10.0, 30.0, float('inf')]
+
+    def __init__(self, prefix='its'):
+        self.prefix = prefix
+        self.lock = Lock()
+        # Name -> {Labels -> Wert}
+        self.counters = {}
+        self.gauges = {}
+        # Name -> {Labels -> [Anzahl, Summe, Buckets]}
+        self.histograms = {}
+        # Name -> Funktion, die beim Auslesen aufgerufen wird
+        self.callbacks = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = self.__labelKey(labels)
+        with self.lock:
+            values = self.counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[self.__labelKey(labels)] = value
+
+    def add(self, name, value, **labels):
+        key = self.__labelKey(labels)
+        with self.lock:
+            values = self.gauges.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    def gauge(self, name, fn):
+        # fn liefert eine Zahl oder ein Dict aus {Label Wert: Zahl}, das
+        # Label heißt dann 'key'
+        with self.lock:
+            self.callbacks[name] = fn
+
+    def observe(self, name, seconds, **labels):
+        key = self.__labelKey(labels)
+        with self.lock:
+            values = self.histograms.setdefault(name, {})
+            h = values.get(key)
+            if h is None:
+                h = [0, 0.0, [0] * len(ItsMetrics.BUCKETS)]
+                values[key] = h
+
+            h[0] += 1
+            h[1] += seconds
+            for b, limit in enumerate(ItsMetrics.BUCKETS):
+                if seconds <= limit:
+                    h[2][b] += 1
+                    break
+
+    def getStats(self):
+        gauges = self.__readGauges()
+        with self.lock:
+            stats = {
+                'uptime_s': round(time.time() - self.started, 3),
+                'counters': self.__toJson(self.counters),
+                'gauges': self.__toJson(gauges),
+                'histograms': {}
+            }
+            for name, values in self.histograms.items():
+                stats['histograms'][name] = [dict(
+                    labels=dict(key),
+                    count=cnt,
+                    sum_s=round(total, 6),
+                    mean_ms=round(total / cnt * 1000, 3) if cnt else 0,
+                    buckets=dict(
+                        ('le_{}'.format(limit), n)
+                        for limit, n in zip(ItsMetrics.BUCKETS, buckets)))
+                    for key, (cnt, total, buckets) in values.items()]
+        return stats
+
+    def toPrometheus(self):
+        gauges = self.__readGauges()
+        lines = []
+        with self.lock:
+            for name, values in sorted(self.counters.items()):
+                lines.append('# TYPE {}_{} counter'.format(self.prefix, name))
+                for key, value in sorted(values.items()):
+                    lines.append(self.__line(name, key, value))
+
+            for name, values in sorted(gauges.items()):
+                lines.append('# TYPE {}_{} gauge'.format(self.prefix, name))
+                for key, value in sorted(values.items()):
+                    lines.append(self.__line(name, key, value))
+
+            for name, values in sorted(self.histograms.items()):
+                lines.append('# TYPE {}_{} histogram'.format(self.prefix, name))
+                for key, (cnt, total, buckets) in sorted(values.items()):
+                    # Prometheus Buckets sind kumulativ
+                    cum = 0
+                    for limit, n in zip(ItsMetrics.BUCKETS, buckets):
+                        cum += n
+                        le = '+Inf' if limit == float('inf') else str(limit)
+                        lines.append(self.__line(
+                            name + '_bucket', key + (('le', le),), cum))
+                    lines.append(self.__line(name + '_sum', key, total))
+                    lines.append(self.__line(name + '_count', key, cnt))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(self.getStats(), f, indent=2)
+        os.replace(tmpPath, path)
+
+    def __readGauges(self):
+        # Callbacks außerhalb des Locks, sie fragen z.B. Queues ab
+        with self.lock:
+            gauges = dict((n, dict(v)) for n, v in self.gauges.items())
+            callbacks = list(self.callbacks.items())
+
+        for name, fn in callbacks:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                gauges[name] = dict(
+                    ((('key', str(k)),), v) for k, v in value.items())
+            else:
+                gauges[name] = {(): value}
+        return gauges
+
+    def __labelKey(self, labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def __line(self, name, key, value):
+        labels = ''
+        if key:
+            labels = '{' + ','.join(
+                '{}="{}"'.format(k, v.replace('"', '\\"')) for k, v in key) + '}'
+        return '{}_{}{} {}'.format(self.prefix, name, labels, value)
+
+    def __toJson(self, metrics):
+        return dict(
+            (name, [dict(labels=dict(key), value=value)
+                    for key, value in values.items()])
+            for name, values in metrics.items())
+
+
+class ItsMetricsServer():
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        self.metrics = metrics
+        self.server = HTTPServer((host, port), ItsMetricsHandler)
+        self.server.metrics = metrics
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ItsMetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/metrics':
+            out = self.server.metrics.toPrometheus().encode('utf8')
+            ctype = 'text/plain; version=0.0.4'
+        elif path == '/metrics.json':
+            out = json.dumps(self.server.metrics.getStats()).encode('utf8')
+            ctype = 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
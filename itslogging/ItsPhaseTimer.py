@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''
+    Zeitmessung pro Phase des Trainings. Summe, Anzahl, Maximum und ein
+    grobes Histogramm je Phase, günstig genug für den Dauerbetrieb.
+'''
+import os
+import json
+import time
+
+
+class ItsPhase():
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class ItsPhaseTimer():
+
+    # Obergrenzen der Histogramm Buckets in Sekunden
+    BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01,
+               0.05, 0.1, 0.5, 1.0, 5.0, float('inf')]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Name -> [Anzahl, Summe, Maximum, Buckets]
+        self.phases = {}
+        self.started = time.time()
+
+    def phase(self, name):
+        return ItsPhase(self, name)
+
+    def add(self, name, seconds):
+        p = self.phases.get(name)
+        if p is None:
+            p = [0, 0.0, 0.0, [0] * len(ItsPhaseTimer.BUCKETS)]
+            self.phases[name] = p
+
+        p[0] += 1
+        p[1] += seconds
+        if seconds > p[2]:
+            p[2] = seconds
+
+        for b, limit in enumerate(ItsPhaseTimer.BUCKETS):
+            if seconds <= limit:
+                p[3][b] += 1
+                break
+
+    def getStats(self):
+        stats = {}
+        for name, (cnt, total, maxTime, buckets) in self.phases.items():
+            stats[name] = {
+                'count': cnt,
+                'total_s': round(total, 6),
+                'mean_ms': round(total / cnt * 1000, 4) if cnt else 0,
+                'max_ms': round(maxTime * 1000, 4),
+                'histogram': dict(
+                    ('le_{}'.format(limit), n)
+                    for limit, n in zip(ItsPhaseTimer.BUCKETS, buckets))
+            }
+        return {
+            'wall_s': round(time.time() - self.started, 3),
+            'phases': stats
+        }
+
+    def getSummary(self):
+        # Kurzform für das Log, sortiert nach Gesamtzeit
+        phases = sorted(
+            self.phases.items(), key=lambda p: p[1][1], reverse=True)
+        return ', '.join(
+            '{} {:.1f}s'.format(name, p[1]) for name, p in phases)
+
+    def export(self, path, extra=None):
+        stats = self.getStats()
+        if extra:
+            stats.update(extra)
+
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmpPath, path)
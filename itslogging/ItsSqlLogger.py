@@ -18,12 +18,25 @@ class ItsSqlLogger():
 
         return self.db_con.insertEpoch(itsEpochInfo)
 
+    def logStopReason(self, hisId, reason):
+        self.log.info('History {}: Stopped ({})'.format(hisId, reason))
+
+        self.db_con.updateStopReason(hisId, reason)
+
+    def getMaxConfidence(self, hisIds):
+        return self.db_con.getMaxConfidenceForHistory(hisIds)
+
     def logRequestInfo(self, itsRequestInfo, hisId):
         self.log.debug('Logging RequestInfo...')
         self.log.infoRequestInfo(itsRequestInfo, hisId)
         
         self.db_con.insertRequest(itsRequestInfo, hisId)
 
+    def logRequestInfos(self, rows):
+        self.log.debug('Logging {} RequestInfos...'.format(len(rows)))
+
+        return self.db_con.insertRequests(rows)
+
 
 if __name__ == '__main__':
     print('Debugging mode for SQL-Logger')
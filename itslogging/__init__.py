@@ -1,2 +1,4 @@
 from itslogging.ItsLogger import ItsLogger
-from itslogging.ItsSqlLogger import ItsSqlLogger
\ No newline at end of file
+from itslogging.ItsSqlLogger import ItsSqlLogger
+from itslogging.ItsPhaseTimer import ItsPhaseTimer
+from itslogging.ItsMetrics import ItsMetrics, ItsMetricsServer
@@ -6,6 +6,7 @@ from itsmisc.itscfg.ItsMiscConfig import ItsMiscConfig as ItsMiscCfg
 from itsmisc.itscfg.ItsMysqlConfig import ItsMysqlConfig as ItsSqlCfg
 from itsmisc.itscfg.ItsRequesterConfig import ItsRequesterConfig as ItsReqCfg
 from itsmisc.itscfg.ItsImageDumperConfig import ItsImageDumperConfig as ItsImgDumpCfg
+from itsmisc.itscfg.ItsDcganConfig import ItsDcganConfig as ItsDcganCfg
 
 
 class ItsConfig():
@@ -33,12 +34,46 @@ class ItsConfig():
     PARAM_DELAY = 'send_delay'
     PARAM_REQ_DIR = 'directory'
     PARAM_REQ_QUEUE_SIZE = 'queue_size'
+    PARAM_REQ_IN_MEMORY = 'in_memory'
+    PARAM_REQ_CONNECT_TIMEOUT = 'connect_timeout'
+    PARAM_REQ_READ_TIMEOUT = 'read_timeout'
+    PARAM_REQ_RETRIES = 'retries'
+    PARAM_REQ_BACKOFF = 'retry_backoff'
+    PARAM_REQ_ENGINE = 'engine'
+    PARAM_REQ_IN_FLIGHT = 'in_flight'
+    PARAM_REQ_MIN_RATE = 'min_rate'
+    PARAM_REQ_MAX_RATE = 'max_rate'
+    PARAM_REQ_JOURNAL = 'journal'
+    PARAM_REQ_SQL_BATCH_SIZE = 'sql_batch_size'
+    PARAM_REQ_SQL_BATCH_AGE = 'sql_batch_age'
+    PARAM_REQ_CACHE_SIZE = 'cache_size'
+    PARAM_REQ_CACHE_DISTANCE = 'cache_distance'
+    PARAM_REQ_METRICS_PORT = 'metrics_port'
+    PARAM_REQ_METRICS_INTERVAL = 'metrics_interval'
 
     DEF_URL = 'https://phinau.de/trasi'
     DEF_KEY = 'seix2Iel8ohGh7noshai3aingefah9qu, vaetha1mu2zo8yahr3Ietui9fohfiequ'
     DEF_DELAY = 1
     DEF_REQ_DIR = 'its_request'
     DEF_QUEUE_SIZE = 120
+    DEF_IN_MEMORY = False
+    DEF_CONNECT_TIMEOUT = 5
+    DEF_READ_TIMEOUT = 30
+    DEF_RETRIES = 3
+    DEF_BACKOFF = 0.5
+    DEF_ENGINE = 'threads'
+    DEF_IN_FLIGHT = 4
+    DEF_MIN_RATE = 0.1
+    DEF_MAX_RATE = 20
+    DEF_REQ_JOURNAL = True
+    DEF_REQ_JOURNAL_PATH = 'its_request_journal.db'
+    DEF_SQL_BATCH_SIZE = 50
+    DEF_SQL_BATCH_AGE = 1.0
+    DEF_CACHE_SIZE = 10000
+    DEF_CACHE_DISTANCE = 0
+    DEF_METRICS_PORT = 0
+    DEF_METRICS_INTERVAL = 10
+    DEF_METRICS_PATH = 'its_requester_metrics.json'
 
     # ImageDumper config defaults
     PARAM_IMGD = 'ImageDumper'
@@ -48,6 +83,51 @@ class ItsConfig():
     DEF_IMGD_CNT = '10'
     DEF_IMGD_DIR = 'its_dump'
 
+    # DCGAN config defaults
+    PARAM_DCGAN = 'Dcgan'
+    PARAM_DCGAN_FUSED = 'fused_train_step'
+    PARAM_DCGAN_DATASET = 'input_pipeline'
+    PARAM_DCGAN_MODELS = 'parallel_models'
+    PARAM_DCGAN_WORKERS = 'workers'
+    PARAM_DCGAN_INTRA_OP = 'intra_op_threads'
+    PARAM_DCGAN_INTER_OP = 'inter_op_threads'
+    PARAM_DCGAN_CKPT_STEPS = 'checkpoint_steps'
+    PARAM_DCGAN_WRITER_THREADS = 'image_writer_threads'
+    PARAM_DCGAN_WRITER_QUEUE = 'image_queue_size'
+    PARAM_DCGAN_TRACE_STEP = 'trace_step'
+    PARAM_DCGAN_XLA = 'xla'
+    PARAM_DCGAN_STOP_WINDOW = 'stop_window'
+    PARAM_DCGAN_STOP_DELTA = 'stop_min_delta'
+    PARAM_DCGAN_STOP_LOSS = 'stop_max_loss'
+    PARAM_DCGAN_STOP_TIME = 'stop_time_budget'
+    PARAM_DCGAN_STOP_CONF = 'stop_confidence'
+    PARAM_DCGAN_EXPORT = 'export_generator'
+    PARAM_DCGAN_MMAP = 'dataset_mmap'
+    PARAM_DCGAN_LOADER_WORKERS = 'loader_workers'
+
+    DEF_DCGAN_FUSED = False
+    DEF_DCGAN_DATASET = False
+    DEF_DCGAN_MODELS = 1
+    DEF_DCGAN_WORKERS = 1
+    DEF_DCGAN_INTRA_OP = 0
+    DEF_DCGAN_INTER_OP = 0
+    DEF_DCGAN_CKPT_STEPS = 0
+    DEF_DCGAN_CKPT_DIR = 'its_checkpoint'
+    DEF_DCGAN_WRITER_THREADS = 2
+    DEF_DCGAN_WRITER_QUEUE = 240
+    DEF_DCGAN_TRACE_STEP = 0
+    DEF_DCGAN_XLA = False
+    DEF_DCGAN_STOP_WINDOW = 0
+    DEF_DCGAN_STOP_DELTA = 0.01
+    DEF_DCGAN_STOP_LOSS = 0
+    DEF_DCGAN_STOP_TIME = 0
+    DEF_DCGAN_STOP_CONF = 0
+    DEF_DCGAN_EXPORT = False
+    DEF_DCGAN_EXPORT_DIR = 'its_generator'
+    DEF_DCGAN_MMAP = False
+    DEF_DCGAN_LOADER_WORKERS = 4
+    DEF_DCGAN_DATASET_DIR = 'its_dataset'
+
     # Misc
     PARAM_MISC = 'Misc'
     PARAM_MISC_INP_DIR = 'dcgan_input_dir'
@@ -73,10 +153,20 @@ class ItsConfig():
                     ItsConfig.VOLUME_FOLDER, ItsConfig.CONFIG_PATH)
                 ItsConfig.DEF_REQ_DIR = os.path.join(
                     ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_REQ_DIR)
+                ItsConfig.DEF_REQ_JOURNAL_PATH = os.path.join(
+                    ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_REQ_JOURNAL_PATH)
+                ItsConfig.DEF_METRICS_PATH = os.path.join(
+                    ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_METRICS_PATH)
                 ItsConfig.DEF_IMGD_DIR = os.path.join(
                     ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_IMGD_DIR)
                 ItsConfig.DEF_MISC_INP_DIR = os.path.join(
                     ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_MISC_INP_DIR)
+                ItsConfig.DEF_DCGAN_CKPT_DIR = os.path.join(
+                    ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_DCGAN_CKPT_DIR)
+                ItsConfig.DEF_DCGAN_EXPORT_DIR = os.path.join(
+                    ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_DCGAN_EXPORT_DIR)
+                ItsConfig.DEF_DCGAN_DATASET_DIR = os.path.join(
+                    ItsConfig.VOLUME_FOLDER, ItsConfig.DEF_DCGAN_DATASET_DIR)
 
     def __getConfig(self):
         self.cfg = cfgp.ConfigParser()
@@ -93,6 +183,7 @@ class ItsConfig():
         self.__getRequesterConfig()
         self.__getMySqlConfig()
         self.__getImageDumperConfig()
+        self.__getDcganConfig()
         self.__getMiscConfig()
 
     def __writeConfig(self):
@@ -113,7 +204,23 @@ class ItsConfig():
             ItsConfig.PARAM_URL: ItsConfig.DEF_URL,
             ItsConfig.PARAM_KEY: ItsConfig.DEF_KEY,
             ItsConfig.PARAM_DELAY: ItsConfig.DEF_DELAY,
-            ItsConfig.PARAM_REQ_QUEUE_SIZE: ItsConfig.DEF_QUEUE_SIZE
+            ItsConfig.PARAM_REQ_QUEUE_SIZE: ItsConfig.DEF_QUEUE_SIZE,
+            ItsConfig.PARAM_REQ_IN_MEMORY: ItsConfig.DEF_IN_MEMORY,
+            ItsConfig.PARAM_REQ_CONNECT_TIMEOUT: ItsConfig.DEF_CONNECT_TIMEOUT,
+            ItsConfig.PARAM_REQ_READ_TIMEOUT: ItsConfig.DEF_READ_TIMEOUT,
+            ItsConfig.PARAM_REQ_RETRIES: ItsConfig.DEF_RETRIES,
+            ItsConfig.PARAM_REQ_BACKOFF: ItsConfig.DEF_BACKOFF,
+            ItsConfig.PARAM_REQ_ENGINE: ItsConfig.DEF_ENGINE,
+            ItsConfig.PARAM_REQ_IN_FLIGHT: ItsConfig.DEF_IN_FLIGHT,
+            ItsConfig.PARAM_REQ_MIN_RATE: ItsConfig.DEF_MIN_RATE,
+            ItsConfig.PARAM_REQ_MAX_RATE: ItsConfig.DEF_MAX_RATE,
+            ItsConfig.PARAM_REQ_JOURNAL: ItsConfig.DEF_REQ_JOURNAL,
+            ItsConfig.PARAM_REQ_SQL_BATCH_SIZE: ItsConfig.DEF_SQL_BATCH_SIZE,
+            ItsConfig.PARAM_REQ_SQL_BATCH_AGE: ItsConfig.DEF_SQL_BATCH_AGE,
+            ItsConfig.PARAM_REQ_CACHE_SIZE: ItsConfig.DEF_CACHE_SIZE,
+            ItsConfig.PARAM_REQ_CACHE_DISTANCE: ItsConfig.DEF_CACHE_DISTANCE,
+            ItsConfig.PARAM_REQ_METRICS_PORT: ItsConfig.DEF_METRICS_PORT,
+            ItsConfig.PARAM_REQ_METRICS_INTERVAL: ItsConfig.DEF_METRICS_INTERVAL
         }
 
         # ImageDumper Part
@@ -121,6 +228,29 @@ class ItsConfig():
             ItsConfig.PARAM_IMGD_CNT: ItsConfig.DEF_IMGD_CNT,
         }
 
+        # DCGAN Part
+        self.cfg[ItsConfig.PARAM_DCGAN] = {
+            ItsConfig.PARAM_DCGAN_FUSED: ItsConfig.DEF_DCGAN_FUSED,
+            ItsConfig.PARAM_DCGAN_DATASET: ItsConfig.DEF_DCGAN_DATASET,
+            ItsConfig.PARAM_DCGAN_MODELS: ItsConfig.DEF_DCGAN_MODELS,
+            ItsConfig.PARAM_DCGAN_WORKERS: ItsConfig.DEF_DCGAN_WORKERS,
+            ItsConfig.PARAM_DCGAN_INTRA_OP: ItsConfig.DEF_DCGAN_INTRA_OP,
+            ItsConfig.PARAM_DCGAN_INTER_OP: ItsConfig.DEF_DCGAN_INTER_OP,
+            ItsConfig.PARAM_DCGAN_CKPT_STEPS: ItsConfig.DEF_DCGAN_CKPT_STEPS,
+            ItsConfig.PARAM_DCGAN_WRITER_THREADS: ItsConfig.DEF_DCGAN_WRITER_THREADS,
+            ItsConfig.PARAM_DCGAN_WRITER_QUEUE: ItsConfig.DEF_DCGAN_WRITER_QUEUE,
+            ItsConfig.PARAM_DCGAN_TRACE_STEP: ItsConfig.DEF_DCGAN_TRACE_STEP,
+            ItsConfig.PARAM_DCGAN_XLA: ItsConfig.DEF_DCGAN_XLA,
+            ItsConfig.PARAM_DCGAN_STOP_WINDOW: ItsConfig.DEF_DCGAN_STOP_WINDOW,
+            ItsConfig.PARAM_DCGAN_STOP_DELTA: ItsConfig.DEF_DCGAN_STOP_DELTA,
+            ItsConfig.PARAM_DCGAN_STOP_LOSS: ItsConfig.DEF_DCGAN_STOP_LOSS,
+            ItsConfig.PARAM_DCGAN_STOP_TIME: ItsConfig.DEF_DCGAN_STOP_TIME,
+            ItsConfig.PARAM_DCGAN_STOP_CONF: ItsConfig.DEF_DCGAN_STOP_CONF,
+            ItsConfig.PARAM_DCGAN_EXPORT: ItsConfig.DEF_DCGAN_EXPORT,
+            ItsConfig.PARAM_DCGAN_MMAP: ItsConfig.DEF_DCGAN_MMAP,
+            ItsConfig.PARAM_DCGAN_LOADER_WORKERS: ItsConfig.DEF_DCGAN_LOADER_WORKERS
+        }
+
        
 
     def __getMySqlConfig(self):
@@ -168,7 +298,94 @@ class ItsConfig():
             qSize = self.cfg.getint(
                 ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_QUEUE_SIZE)
 
-        self.req_cfg = ItsReqCfg(url, key, delay, reqDir, qSize)
+        inMemory = ItsConfig.DEF_IN_MEMORY
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_IN_MEMORY):
+            inMemory = self.cfg.getboolean(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_IN_MEMORY)
+
+        connectTimeout = ItsConfig.DEF_CONNECT_TIMEOUT
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CONNECT_TIMEOUT):
+            connectTimeout = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CONNECT_TIMEOUT)
+
+        readTimeout = ItsConfig.DEF_READ_TIMEOUT
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_READ_TIMEOUT):
+            readTimeout = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_READ_TIMEOUT)
+
+        retries = ItsConfig.DEF_RETRIES
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_RETRIES):
+            retries = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_RETRIES)
+
+        backoff = ItsConfig.DEF_BACKOFF
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_BACKOFF):
+            backoff = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_BACKOFF)
+
+        engine = ItsConfig.DEF_ENGINE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_ENGINE):
+            engine = self.cfg.get(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_ENGINE)
+
+        inFlight = ItsConfig.DEF_IN_FLIGHT
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_IN_FLIGHT):
+            inFlight = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_IN_FLIGHT)
+
+        minRate = ItsConfig.DEF_MIN_RATE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_MIN_RATE):
+            minRate = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_MIN_RATE)
+
+        maxRate = ItsConfig.DEF_MAX_RATE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_MAX_RATE):
+            maxRate = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_MAX_RATE)
+
+        journalPath = None
+        journal = ItsConfig.DEF_REQ_JOURNAL
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_JOURNAL):
+            journal = self.cfg.getboolean(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_JOURNAL)
+        if journal:
+            journalPath = ItsConfig.DEF_REQ_JOURNAL_PATH
+
+        sqlBatchSize = ItsConfig.DEF_SQL_BATCH_SIZE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_SQL_BATCH_SIZE):
+            sqlBatchSize = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_SQL_BATCH_SIZE)
+
+        sqlBatchAge = ItsConfig.DEF_SQL_BATCH_AGE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_SQL_BATCH_AGE):
+            sqlBatchAge = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_SQL_BATCH_AGE)
+
+        cacheSize = ItsConfig.DEF_CACHE_SIZE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CACHE_SIZE):
+            cacheSize = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CACHE_SIZE)
+
+        cacheDistance = ItsConfig.DEF_CACHE_DISTANCE
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CACHE_DISTANCE):
+            cacheDistance = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_CACHE_DISTANCE)
+
+        metricsPort = ItsConfig.DEF_METRICS_PORT
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_METRICS_PORT):
+            metricsPort = self.cfg.getint(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_METRICS_PORT)
+
+        metricsInterval = ItsConfig.DEF_METRICS_INTERVAL
+        if self.cfg.has_option(ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_METRICS_INTERVAL):
+            metricsInterval = self.cfg.getfloat(
+                ItsConfig.PARAM_REQ, ItsConfig.PARAM_REQ_METRICS_INTERVAL)
+
+        self.req_cfg = ItsReqCfg(
+            url, key, delay, reqDir, qSize, inMemory,
+            connectTimeout, readTimeout, retries, backoff,
+            engine, inFlight, minRate, maxRate, journalPath,
+            sqlBatchSize, sqlBatchAge, cacheSize, cacheDistance,
+            metricsPort, metricsInterval, ItsConfig.DEF_METRICS_PATH)
 
     def __getImageDumperConfig(self):
         outDir = None
@@ -181,6 +398,120 @@ class ItsConfig():
 
         self.imgd_cfg = ItsImgDumpCfg(topImgCnt, outDir)
 
+    def __getDcganConfig(self):
+        fusedTrainStep = ItsConfig.DEF_DCGAN_FUSED
+        useDataset = ItsConfig.DEF_DCGAN_DATASET
+        cntModels = ItsConfig.DEF_DCGAN_MODELS
+        workers = ItsConfig.DEF_DCGAN_WORKERS
+        intraOpThreads = ItsConfig.DEF_DCGAN_INTRA_OP
+        interOpThreads = ItsConfig.DEF_DCGAN_INTER_OP
+        checkpointSteps = ItsConfig.DEF_DCGAN_CKPT_STEPS
+        imageWriterThreads = ItsConfig.DEF_DCGAN_WRITER_THREADS
+        imageQueueSize = ItsConfig.DEF_DCGAN_WRITER_QUEUE
+        traceStep = ItsConfig.DEF_DCGAN_TRACE_STEP
+        xla = ItsConfig.DEF_DCGAN_XLA
+        stopWindow = ItsConfig.DEF_DCGAN_STOP_WINDOW
+        stopMinDelta = ItsConfig.DEF_DCGAN_STOP_DELTA
+        stopMaxLoss = ItsConfig.DEF_DCGAN_STOP_LOSS
+        stopTimeBudget = ItsConfig.DEF_DCGAN_STOP_TIME
+        stopConfidence = ItsConfig.DEF_DCGAN_STOP_CONF
+        exportGenerator = ItsConfig.DEF_DCGAN_EXPORT
+        datasetMmap = ItsConfig.DEF_DCGAN_MMAP
+        loaderWorkers = ItsConfig.DEF_DCGAN_LOADER_WORKERS
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_FUSED):
+            fusedTrainStep = self.cfg.getboolean(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_FUSED)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_DATASET):
+            useDataset = self.cfg.getboolean(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_DATASET)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_MODELS):
+            cntModels = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_MODELS)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WORKERS):
+            workers = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WORKERS)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_INTRA_OP):
+            intraOpThreads = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_INTRA_OP)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_INTER_OP):
+            interOpThreads = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_INTER_OP)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_CKPT_STEPS):
+            checkpointSteps = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_CKPT_STEPS)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WRITER_THREADS):
+            imageWriterThreads = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WRITER_THREADS)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WRITER_QUEUE):
+            imageQueueSize = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_WRITER_QUEUE)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_TRACE_STEP):
+            traceStep = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_TRACE_STEP)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_XLA):
+            xla = self.cfg.getboolean(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_XLA)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_WINDOW):
+            stopWindow = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_WINDOW)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_DELTA):
+            stopMinDelta = self.cfg.getfloat(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_DELTA)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_LOSS):
+            stopMaxLoss = self.cfg.getfloat(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_LOSS)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_TIME):
+            stopTimeBudget = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_TIME)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_CONF):
+            stopConfidence = self.cfg.getfloat(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_STOP_CONF)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_EXPORT):
+            exportGenerator = self.cfg.getboolean(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_EXPORT)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_MMAP):
+            datasetMmap = self.cfg.getboolean(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_MMAP)
+
+        if self.cfg.has_option(ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_LOADER_WORKERS):
+            loaderWorkers = self.cfg.getint(
+                ItsConfig.PARAM_DCGAN, ItsConfig.PARAM_DCGAN_LOADER_WORKERS)
+
+        checkpointDir = ItsConfig.DEF_DCGAN_CKPT_DIR
+        exportDir = None
+        if exportGenerator:
+            exportDir = ItsConfig.DEF_DCGAN_EXPORT_DIR
+        datasetDir = None
+        if datasetMmap:
+            datasetDir = ItsConfig.DEF_DCGAN_DATASET_DIR
+
+        self.dcgan_cfg = ItsDcganCfg(
+            fusedTrainStep, useDataset, cntModels,
+            workers, intraOpThreads, interOpThreads,
+            checkpointSteps, checkpointDir,
+            imageWriterThreads, imageQueueSize, traceStep, xla,
+            stopWindow, stopMinDelta, stopMaxLoss,
+            stopTimeBudget, stopConfidence, exportDir, datasetDir,
+            loaderWorkers)
+
     def __getMiscConfig(self):
 
         inpDir = ItsConfig.DEF_MISC_INP_DIR
@@ -8,6 +8,7 @@
         - g_ls:float
         - d_real_ls:float
         - d_fake_ls:float
+        - base_img:String
 '''
 
 
@@ -21,7 +22,9 @@ class ItsEpochInfo():
         d_ls=-1,
         g_ls=-1,
         d_real_ls=-1,
-        d_fake_ls=-1
+        d_fake_ls=-1,
+        baseImage=None,
+        entryId=None
     ):
         self.sessionNr = sessionNr
         self.epoch = epoch
@@ -30,3 +33,6 @@ class ItsEpochInfo():
         self.g_ls = g_ls
         self.d_real_ls = d_real_ls
         self.d_fake_ls = d_fake_ls
+        self.baseImage = baseImage
+        # its_session.id, ohne wird der zuletzt angelegte Eintrag genommen
+        self.entryId = entryId
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+'''
+    Ein generiertes Bild, das ohne Umweg über den Request Ordner
+    vom DCGAN an den Requester übergeben wird.
+'''
+
+
+class ItsImageInfo():
+
+    # {Session}_{Epoch}_{HisId}_{ImgNr}.png
+    NAME_FORMAT = '{}_{}_{}_{}.png'
+
+    def __init__(
+        self,
+        sessionNr=-1,
+        epoch=-1,
+        hisId=-1,
+        imgNr=-1,
+        img_array=None,
+        png=None
+    ):
+        self.sessionNr = sessionNr
+        self.epoch = epoch
+        self.hisId = hisId
+        self.imgNr = imgNr
+        self.img_array = img_array
+        self.png = png
+
+    def getName(self):
+        return ItsImageInfo.NAME_FORMAT.format(
+            self.sessionNr, self.epoch, self.hisId, self.imgNr)
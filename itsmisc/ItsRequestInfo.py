@@ -9,7 +9,8 @@ class ItsRequestInfo():
         nn_class=-1,
         max_confidence=-1,
         json_result=-1,
-        img_array=-1
+        img_array=-1,
+        img_hash=None
     ):
         self.sessionNr = sessionNr
         self.epoch = epoch
@@ -17,3 +18,4 @@ class ItsRequestInfo():
         self.max_confidence = max_confidence
         self.json_result = json_result
         self.img_array = img_array
+        self.img_hash = img_hash
@@ -23,7 +23,11 @@ class ItsSessionInfo():
         stepsHistory = -1,
         cntGenerateImages = -1,
         batch_size = -1,
-        debug=False
+        debug=False,
+        checkpointSteps=0,
+        resume=False,
+        xla=False,
+        entryId=None
     ):
         self.sessionNr = sessionNr
         self.max_epoch = max_epoch
@@ -33,4 +37,9 @@ class ItsSessionInfo():
         self.stepsHistory = stepsHistory
         self.cntGenerateImages = cntGenerateImages
         self.batch_size = batch_size
-        self.debug = debug
\ No newline at end of file
+        self.debug = debug
+        self.checkpointSteps = checkpointSteps
+        self.resume = resume
+        self.xla = xla
+        # its_session.id, wird beim Insert bzw. beim Resume gesetzt
+        self.entryId = entryId
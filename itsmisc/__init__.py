@@ -1,4 +1,5 @@
 from itsmisc.ItsEpochInfo import ItsEpochInfo
 from itsmisc.ItsSessionInfo import ItsSessionInfo
 from itsmisc.ItsRequestInfo import ItsRequestInfo
-from itsmisc.ItsConfig import ItsConfig
\ No newline at end of file
+from itsmisc.ItsConfig import ItsConfig
+from itsmisc.ItsImageInfo import ItsImageInfo
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+
+class ItsDcganConfig():
+
+    def __init__(
+        self, fusedTrainStep, useDataset, cntModels,
+        workers, intraOpThreads, interOpThreads,
+        checkpointSteps, checkpointDir,
+        imageWriterThreads, imageQueueSize, traceStep, xla,
+        stopWindow, stopMinDelta, stopMaxLoss,
+        stopTimeBudget, stopConfidence, exportDir, datasetDir,
+        loaderWorkers
+    ):
+        self.fusedTrainStep = fusedTrainStep
+        self.useDataset = useDataset
+        self.cntModels = cntModels
+        self.workers = workers
+        self.intraOpThreads = intraOpThreads
+        self.interOpThreads = interOpThreads
+        self.checkpointSteps = checkpointSteps
+        self.checkpointDir = checkpointDir
+        self.imageWriterThreads = imageWriterThreads
+        self.imageQueueSize = imageQueueSize
+        self.traceStep = traceStep
+        self.xla = xla
+        self.stopWindow = stopWindow
+        self.stopMinDelta = stopMinDelta
+        self.stopMaxLoss = stopMaxLoss
+        self.stopTimeBudget = stopTimeBudget
+        self.stopConfidence = stopConfidence
+        self.exportDir = exportDir
+        self.datasetDir = datasetDir
+        self.loaderWorkers = loaderWorkers
@@ -3,9 +3,32 @@
 
 class ItsRequesterConfig():
 
-    def __init__(self, url, key, delay, request_directory, qSize):
+    def __init__(
+        self, url, key, delay, request_directory, qSize, inMemory,
+        connectTimeout, readTimeout, retries, backoff,
+        engine, inFlight, minRate, maxRate, journalPath,
+        sqlBatchSize, sqlBatchAge, cacheSize, cacheDistance,
+        metricsPort, metricsInterval, metricsPath
+    ):
         self.url = url
         self.key = key
         self.delay = delay
         self.request_directory = request_directory
         self.qSize = qSize
+        self.inMemory = inMemory
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.retries = retries
+        self.backoff = backoff
+        self.engine = engine
+        self.inFlight = inFlight
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.journalPath = journalPath
+        self.sqlBatchSize = sqlBatchSize
+        self.sqlBatchAge = sqlBatchAge
+        self.cacheSize = cacheSize
+        self.cacheDistance = cacheDistance
+        self.metricsPort = metricsPort
+        self.metricsInterval = metricsInterval
+        self.metricsPath = metricsPath
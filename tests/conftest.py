@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Die Module liegen im Wurzelordner und werden ohne Paket importiert
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
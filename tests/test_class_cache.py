@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+try:
+    import numpy as np
+    from ItsClassCache import ItsClassCache
+except ImportError:
+    np = None
+
+
+class ListLog():
+
+    def __init__(self):
+        self.errors = []
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+
+class FakeSqlConnection():
+
+    def __init__(self, results=None, fail=False):
+        self.results = results or {}
+        self.fail = fail
+        self.calls = 0
+
+    def getRequestForHash(self, imgHash):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('connection lost')
+        return self.results.get(imgHash)
+
+
+def createImage(seed):
+    return np.random.RandomState(seed).randint(
+        0, 256, size=(64, 64, 3)).astype(np.uint8)
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class ItsClassCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = ListLog()
+
+    def testHashDependsOnPixelsAndShape(self):
+        cache = ItsClassCache(self.log)
+        img = createImage(1)
+        self.assertEqual(cache.hashImage(img), cache.hashImage(img.copy()))
+        self.assertNotEqual(cache.hashImage(img), cache.hashImage(createImage(2)))
+        self.assertNotEqual(
+            cache.hashImage(img), cache.hashImage(img.reshape(32, 128, 3)))
+
+    def testMissThenHit(self):
+        cache = ItsClassCache(self.log)
+        img = createImage(1)
+        imgHash, entry = cache.lookup(img)
+        self.assertIsNone(entry)
+
+        result = [{'class': 'stop', 'confidence': 0.9}]
+        cache.add(imgHash, img, 'stop', 0.9, result)
+        self.assertEqual(cache.lookup(img.copy()), (imgHash, ('stop', 0.9, result)))
+        self.assertEqual(cache.getStats(), {'entries': 1, 'hits': 1, 'misses': 1})
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        cache = ItsClassCache(self.log, size=2)
+        imgs = [createImage(i) for i in range(3)]
+        hashes = [cache.hashImage(img) for img in imgs]
+
+        cache.add(hashes[0], imgs[0], 'a', 0.1, [])
+        cache.add(hashes[1], imgs[1], 'b', 0.2, [])
+        # a wurde zuletzt benutzt, b fliegt raus
+        cache.lookup(imgs[0])
+        cache.add(hashes[2], imgs[2], 'c', 0.3, [])
+
+        self.assertIsNotNone(cache.lookup(imgs[0])[1])
+        self.assertIsNone(cache.lookup(imgs[1])[1])
+        self.assertIsNotNone(cache.lookup(imgs[2])[1])
+        self.assertEqual(cache.getStats()['entries'], 2)
+
+    def testSqlLookupFillsMemory(self):
+        img = createImage(1)
+        result = [{'class': 'stop', 'confidence': 0.8}]
+        sqlCon = FakeSqlConnection(
+            {ItsClassCache(self.log).hashImage(img): ('stop', 0.8, result)})
+        cache = ItsClassCache(self.log, sqlCon=sqlCon)
+
+        self.assertEqual(cache.lookup(img)[1], ('stop', 0.8, result))
+        self.assertEqual(cache.lookup(img)[1], ('stop', 0.8, result))
+        self.assertEqual(sqlCon.calls, 1)
+        self.assertEqual(cache.getStats()['hits'], 2)
+
+    def testSqlErrorIsAMiss(self):
+        cache = ItsClassCache(self.log, sqlCon=FakeSqlConnection(fail=True))
+        self.assertIsNone(cache.lookup(createImage(1))[1])
+        self.assertEqual(cache.getStats()['misses'], 1)
+        self.assertEqual(len(self.log.errors), 1)
+
+    def testSimilarImages(self):
+        img = createImage(1)
+        similar = img.copy()
+        similar[0, 0] = 255 - similar[0, 0]
+
+        cache = ItsClassCache(self.log, distance=4)
+        cache.add(cache.hashImage(img), img, 'stop', 0.9, [])
+        imgHash, entry = cache.lookup(similar)
+        self.assertEqual(entry, ('stop', 0.9, []))
+        # Der Schlüssel bleibt der Hash des angefragten Bildes
+        self.assertEqual(imgHash, cache.hashImage(similar))
+        self.assertIsNone(cache.lookup(255 - img)[1])
+
+    def testSimilarImagesDisabled(self):
+        img = createImage(1)
+        similar = img.copy()
+        similar[0, 0] = 255 - similar[0, 0]
+
+        cache = ItsClassCache(self.log)
+        cache.add(cache.hashImage(img), img, 'stop', 0.9, [])
+        self.assertIsNone(cache.lookup(similar)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from unittest import mock
+
+try:
+    import ItsEarlyStopping as es
+    from ItsEarlyStopping import ItsEarlyStopping
+except ImportError:
+    es = None
+
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@unittest.skipIf(es is None, 'numpy is not installed')
+class ItsEarlyStoppingTest(unittest.TestCase):
+
+    def addLosses(self, stopping, losses):
+        for i, (d, g) in enumerate(losses):
+            stopping.addHistory(d, g, hisId=i + 1, epoch=i * 10)
+
+    def testNoHistory(self):
+        self.assertIsNone(ItsEarlyStopping(window=3).check())
+
+    def testNanDivergesWithoutWindow(self):
+        stopping = ItsEarlyStopping()
+        self.addLosses(stopping, [(0.5, 1.0), (float('nan'), 1.0)])
+        self.assertEqual(stopping.check(), ItsEarlyStopping.DIVERGED)
+
+    def testInfDiverges(self):
+        stopping = ItsEarlyStopping()
+        self.addLosses(stopping, [(0.5, float('inf'))])
+        self.assertEqual(stopping.check(), ItsEarlyStopping.DIVERGED)
+
+    def testMaxLossOverWindow(self):
+        stopping = ItsEarlyStopping(window=3, maxLoss=5)
+        self.addLosses(stopping, [(0.5, 6.0), (0.5, 6.0)])
+        self.assertIsNone(stopping.check())
+        self.addLosses(stopping, [(0.5, 4.0), (0.5, 6.0), (0.5, 6.0)])
+        self.assertIsNone(stopping.check())
+        self.addLosses(stopping, [(0.5, 6.0)])
+        self.assertEqual(stopping.check(), ItsEarlyStopping.DIVERGED)
+
+    def testPlateau(self):
+        stopping = ItsEarlyStopping(window=2, minDelta=0.01)
+        self.addLosses(stopping, [(0.7, 1.0)] * 3)
+        self.assertIsNone(stopping.check())
+        self.addLosses(stopping, [(0.7, 1.001)])
+        self.assertEqual(stopping.check(), ItsEarlyStopping.PLATEAU)
+
+    def testNoPlateauWhileLearning(self):
+        stopping = ItsEarlyStopping(window=2, minDelta=0.01)
+        self.addLosses(stopping, [(0.7, 4.0), (0.7, 3.0), (0.7, 2.0), (0.7, 1.0)])
+        self.assertIsNone(stopping.check())
+
+    def testNoPlateauWhileDiscriminatorMoves(self):
+        stopping = ItsEarlyStopping(window=2, minDelta=0.01)
+        self.addLosses(stopping, [(0.9, 1.0), (0.9, 1.0), (0.3, 1.0), (0.3, 1.0)])
+        self.assertIsNone(stopping.check())
+
+    def testConfidence(self):
+        stopping = ItsEarlyStopping(targetConfidence=0.9)
+        self.assertTrue(stopping.useConfidence())
+        self.assertIsNone(stopping.check())
+        self.assertIsNone(stopping.check(0.5))
+        self.assertEqual(stopping.check(0.95), ItsEarlyStopping.CONFIDENCE)
+
+    def testConfidenceDisabled(self):
+        stopping = ItsEarlyStopping()
+        self.assertFalse(stopping.useConfidence())
+        self.assertIsNone(stopping.check(1.0))
+
+    def testTimeBudget(self):
+        clock = FakeClock()
+        with mock.patch.object(es, 'time', clock):
+            stopping = ItsEarlyStopping(timeBudget=60)
+            clock.now += 59
+            self.assertIsNone(stopping.check())
+            clock.now += 2
+            self.assertEqual(stopping.check(), ItsEarlyStopping.TIME_BUDGET)
+
+    def testReasonIsKeptUntilReset(self):
+        stopping = ItsEarlyStopping(targetConfidence=0.9)
+        self.addLosses(stopping, [(0.5, 1.0)])
+        self.assertEqual(stopping.check(0.95), ItsEarlyStopping.CONFIDENCE)
+        self.assertEqual(stopping.check(0.1), ItsEarlyStopping.CONFIDENCE)
+
+        stopping.reset()
+        self.assertIsNone(stopping.check(0.1))
+        self.assertEqual(stopping.hisIds, [])
+        self.assertEqual(stopping.epochs, [])
+
+    def testStateRoundTrip(self):
+        clock = FakeClock()
+        with mock.patch.object(es, 'time', clock):
+            stopping = ItsEarlyStopping(window=2, timeBudget=60)
+            self.addLosses(stopping, [(0.7, 1.0), (0.7, float('nan'))])
+            stopping.check()
+            clock.now += 40
+            state = json.loads(json.dumps(stopping.getState()))
+
+            # Neuer Prozess, die Zeit läuft ab dem gespeicherten Stand weiter
+            clock.now += 1000
+            restored = ItsEarlyStopping(window=2, timeBudget=60)
+            restored.setState(state)
+            self.assertEqual(restored.hisIds, [1, 2])
+            self.assertEqual(restored.epochs, [0, 10])
+            self.assertEqual(restored.check(), ItsEarlyStopping.DIVERGED)
+
+            restored.reason = None
+            restored.g_losses[-1] = 1.0
+            clock.now += 19
+            self.assertIsNone(restored.check())
+            clock.now += 2
+            self.assertEqual(restored.check(), ItsEarlyStopping.TIME_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
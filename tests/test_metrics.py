@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from itslogging.ItsMetrics import ItsMetrics, ItsMetricsServer
+
+
+class ItsMetricsTest(unittest.TestCase):
+
+    def createMetrics(self):
+        metrics = ItsMetrics('its_test')
+        metrics.inc('requests_total', key='k1', status=200)
+        metrics.inc('requests_total', 2, key='k1', status=200)
+        metrics.inc('requests_total', key='k2', status=429)
+        metrics.set('in_flight', 3)
+        metrics.add('in_flight', -1)
+        metrics.gauge('queue_depth', lambda: 7)
+        metrics.gauge('rate', lambda: {'k1': 1.5, 'k2': 0.5})
+        metrics.observe('latency_seconds', 0.003, key='k1')
+        metrics.observe('latency_seconds', 0.2, key='k1')
+        metrics.observe('latency_seconds', 100, key='k1')
+        return metrics
+
+    def testPrometheusCounters(self):
+        lines = self.createMetrics().toPrometheus().splitlines()
+        self.assertIn('# TYPE its_test_requests_total counter', lines)
+        self.assertIn('its_test_requests_total{key="k1",status="200"} 3', lines)
+        self.assertIn('its_test_requests_total{key="k2",status="429"} 1', lines)
+
+    def testPrometheusGauges(self):
+        lines = self.createMetrics().toPrometheus().splitlines()
+        self.assertIn('# TYPE its_test_in_flight gauge', lines)
+        self.assertIn('its_test_in_flight 2', lines)
+        self.assertIn('its_test_queue_depth 7', lines)
+        self.assertIn('its_test_rate{key="k1"} 1.5', lines)
+        self.assertIn('its_test_rate{key="k2"} 0.5', lines)
+
+    def testPrometheusHistogramIsCumulative(self):
+        lines = self.createMetrics().toPrometheus().splitlines()
+        self.assertIn('# TYPE its_test_latency_seconds histogram', lines)
+        self.assertIn(
+            'its_test_latency_seconds_bucket{key="k1",le="0.005"} 1', lines)
+        self.assertIn(
+            'its_test_latency_seconds_bucket{key="k1",le="0.1"} 1', lines)
+        self.assertIn(
+            'its_test_latency_seconds_bucket{key="k1",le="0.25"} 2', lines)
+        self.assertIn(
+            'its_test_latency_seconds_bucket{key="k1",le="30.0"} 2', lines)
+        self.assertIn(
+            'its_test_latency_seconds_bucket{key="k1",le="+Inf"} 3', lines)
+        self.assertIn('its_test_latency_seconds_count{key="k1"} 3', lines)
+        self.assertIn('its_test_latency_seconds_sum{key="k1"} 100.203', lines)
+
+    def testPrometheusEscapesLabels(self):
+        metrics = ItsMetrics('its_test')
+        metrics.inc('errors_total', reason='say "hi"')
+        self.assertIn(
+            'its_test_errors_total{reason="say \\"hi\\""} 1',
+            metrics.toPrometheus().splitlines())
+
+    def testFailingGaugeIsSkipped(self):
+        metrics = ItsMetrics('its_test')
+        metrics.gauge('broken', lambda: 1 / 0)
+        metrics.gauge('ok', lambda: 1)
+        out = metrics.toPrometheus()
+        self.assertNotIn('broken', out)
+        self.assertIn('its_test_ok 1', out.splitlines())
+
+    def testJson(self):
+        stats = json.loads(json.dumps(self.createMetrics().getStats()))
+        self.assertIn('uptime_s', stats)
+
+        requests = dict(
+            ((v['labels']['key'], v['labels']['status']), v['value'])
+            for v in stats['counters']['requests_total'])
+        self.assertEqual(requests, {('k1', '200'): 3, ('k2', '429'): 1})
+        self.assertEqual(stats['gauges']['queue_depth'], [{'labels': {}, 'value': 7}])
+        self.assertEqual(stats['gauges']['in_flight'], [{'labels': {}, 'value': 2}])
+
+        h, = stats['histograms']['latency_seconds']
+        self.assertEqual(h['labels'], {'key': 'k1'})
+        self.assertEqual(h['count'], 3)
+        self.assertAlmostEqual(h['mean_ms'], 100203 / 3.0, places=2)
+        # Im JSON sind die Buckets nicht kumulativ
+        self.assertEqual(h['buckets']['le_0.005'], 1)
+        self.assertEqual(h['buckets']['le_0.25'], 1)
+        self.assertEqual(h['buckets']['le_inf'], 1)
+        self.assertEqual(sum(h['buckets'].values()), 3)
+
+    def testExport(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, 'metrics.json')
+            self.createMetrics().export(path)
+            self.assertEqual(os.listdir(tmpDir), ['metrics.json'])
+            with open(path) as f:
+                self.assertIn('requests_total', json.load(f)['counters'])
+        finally:
+            shutil.rmtree(tmpDir)
+
+
+class ItsMetricsServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = ItsMetrics('its_test')
+        self.metrics.inc('requests_total', status=200)
+        # Port 0 sucht einen freien Port
+        self.server = ItsMetricsServer(self.metrics, 0)
+        self.server.start()
+        self.url = 'http://127.0.0.1:{}'.format(
+            self.server.server.server_address[1])
+
+    def tearDown(self):
+        self.server.stop()
+
+    def testPrometheus(self):
+        with urlopen(self.url + '/metrics') as res:
+            self.assertTrue(
+                res.headers['Content-Type'].startswith('text/plain'))
+            body = res.read().decode('utf8')
+        self.assertIn('its_test_requests_total{status="200"} 1', body.splitlines())
+
+    def testJson(self):
+        with urlopen(self.url + '/metrics.json') as res:
+            self.assertEqual(res.headers['Content-Type'], 'application/json')
+            stats = json.loads(res.read().decode('utf8'))
+        self.assertEqual(
+            stats['counters']['requests_total'],
+            [{'labels': {'status': '200'}, 'value': 1}])
+
+    def testUnknownPath(self):
+        with self.assertRaises(HTTPError) as ctx:
+            urlopen(self.url + '/other')
+        self.assertEqual(ctx.exception.code, 404)
+        ctx.exception.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
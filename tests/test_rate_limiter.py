@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+import ItsRateLimiter as rl
+from ItsRateLimiter import ItsRateLimiter
+
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ItsRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rl, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testRateIsClamped(self):
+        self.assertEqual(ItsRateLimiter(50, 1, 10).getRate(), 10)
+        self.assertEqual(ItsRateLimiter(0.01, 1, 10).getRate(), 1)
+
+    def testBurstThenWait(self):
+        limiter = ItsRateLimiter(rate=2, minRate=1, maxRate=10, burst=2)
+        self.assertTrue(limiter.tryAcquire())
+        self.assertTrue(limiter.tryAcquire())
+        self.assertFalse(limiter.tryAcquire())
+
+        # Bei 2/s ist nach einer halben Sekunde wieder ein Token da
+        self.clock.sleep(0.5)
+        self.assertTrue(limiter.tryAcquire())
+        self.assertFalse(limiter.tryAcquire())
+
+    def testAcquireBlocksUntilToken(self):
+        limiter = ItsRateLimiter(rate=4, minRate=1, maxRate=10)
+        limiter.acquire()
+        start = self.clock.now
+        limiter.acquire()
+        self.assertAlmostEqual(self.clock.now - start, 0.25)
+
+    def testTokensDoNotExceedBurst(self):
+        limiter = ItsRateLimiter(rate=10, minRate=1, maxRate=10, burst=3)
+        self.clock.sleep(60)
+        self.assertEqual(
+            sum(limiter.tryAcquire() for _ in range(10)), 3)
+
+    def testAdditiveIncrease(self):
+        limiter = ItsRateLimiter(rate=1, minRate=0.1, maxRate=2, increase=0.5)
+        limiter.onSuccess()
+        self.assertAlmostEqual(limiter.getRate(), 1.5)
+        for _ in range(100):
+            limiter.onSuccess()
+        self.assertEqual(limiter.getRate(), 2)
+
+    def testMultiplicativeDecrease(self):
+        limiter = ItsRateLimiter(rate=8, minRate=1, maxRate=10, decrease=0.5)
+        self.assertEqual(limiter.onRateLimited(), 4)
+        self.assertFalse(limiter.tryAcquire())
+        for _ in range(10):
+            limiter.onRateLimited()
+        self.assertEqual(limiter.getRate(), 1)
+
+    def testRetryAfterPauses(self):
+        limiter = ItsRateLimiter(rate=10, minRate=10, maxRate=10, burst=5)
+        limiter.onRateLimited(retryAfter=3)
+        self.clock.sleep(2)
+        self.assertFalse(limiter.tryAcquire())
+        self.clock.sleep(1)
+        self.assertTrue(limiter.tryAcquire())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from itsmisc import ItsRequestInfo
+
+try:
+    import numpy as np
+    from itsdb.ItsRequestJournal import ItsRequestJournal
+except ImportError:
+    np = None  # itsdb importiert auch mysql.connector
+
+
+class NullLog():
+
+    def info(self, msg):
+        pass
+
+
+@unittest.skipIf(np is None, 'numpy or mysql.connector is not installed')
+class ItsRequestJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpDir, 'journal', 'its_request_journal.db')
+        self.journal = ItsRequestJournal(self.path, NullLog())
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.tmpDir)
+
+    def createRequestInfo(self):
+        img = np.arange(4 * 4 * 3, dtype=np.uint8).reshape(4, 4, 3)
+        result = [{'class': 'stop', 'confidence': 0.9},
+                  {'class': 'yield', 'confidence': 0.05}]
+        return ItsRequestInfo(
+            sessionNr=2, epoch=100, nn_class='stop', max_confidence=0.9,
+            json_result=result, img_array=img, img_hash='ab' * 20)
+
+    def testStates(self):
+        name = '2_100_7_0.png'
+        self.assertIsNone(self.journal.getState(name))
+
+        self.journal.markQueued(name)
+        self.assertEqual(self.journal.getState(name), ItsRequestJournal.QUEUED)
+        self.journal.markSent(name)
+        self.assertEqual(self.journal.getState(name), ItsRequestJournal.SENT)
+        self.assertEqual(self.journal.getOpen(), [name])
+
+        self.journal.markClassified(name, self.createRequestInfo(), 7)
+        self.assertEqual(
+            self.journal.getState(name), ItsRequestJournal.CLASSIFIED)
+        self.assertEqual(self.journal.getOpen(), [])
+
+        self.journal.markPersisted([name])
+        self.assertIsNone(self.journal.getState(name))
+        self.assertEqual(self.journal.getUnpersisted(), [])
+
+    def testQueuedKeepsClassified(self):
+        name = '2_100_7_0.png'
+        self.journal.markClassified(name, self.createRequestInfo(), 7)
+        self.journal.markQueued(name)
+        self.assertEqual(
+            self.journal.getState(name), ItsRequestJournal.CLASSIFIED)
+
+    def testForgetOnlyOpen(self):
+        self.journal.markQueued('a.png')
+        self.journal.markSent('b.png')
+        self.journal.markClassified('c.png', self.createRequestInfo(), 7)
+
+        for name in ('a.png', 'b.png', 'c.png'):
+            self.journal.forget(name)
+        self.assertIsNone(self.journal.getState('a.png'))
+        self.assertIsNone(self.journal.getState('b.png'))
+        self.assertEqual(
+            self.journal.getState('c.png'), ItsRequestJournal.CLASSIFIED)
+
+    def testUnpersistedSurvivesReopen(self):
+        reqInfo = self.createRequestInfo()
+        self.journal.markClassified('2_100_7_0.png', reqInfo, 7)
+        self.journal.markClassified('2_100_7_1.png', reqInfo, 8)
+        self.journal.close()
+
+        self.journal = ItsRequestJournal(self.path, NullLog())
+        results = self.journal.getUnpersisted()
+        self.assertEqual(
+            sorted((name, hisId) for name, _, hisId in results),
+            [('2_100_7_0.png', 7), ('2_100_7_1.png', 8)])
+
+        _, restored, _ = results[0]
+        self.assertEqual(restored.sessionNr, 2)
+        self.assertEqual(restored.epoch, 100)
+        self.assertEqual(restored.nn_class, 'stop')
+        self.assertAlmostEqual(restored.max_confidence, 0.9)
+        self.assertEqual(restored.json_result, reqInfo.json_result)
+        self.assertEqual(restored.img_hash, reqInfo.img_hash)
+        np.testing.assert_array_equal(restored.img_array, reqInfo.img_array)
+
+    def testOldJournalGetsHashColumn(self):
+        path = os.path.join(self.tmpDir, 'old.db')
+        con = sqlite3.connect(path)
+        con.execute(
+            'CREATE TABLE its_request_journal (name TEXT PRIMARY KEY, '
+            'state TEXT NOT NULL, session INTEGER, epoch INTEGER, '
+            'his_id INTEGER, nn_class TEXT, max_confidence REAL, '
+            'json_result TEXT, img_shape TEXT, img BLOB, updated REAL)')
+        con.commit()
+        con.close()
+
+        journal = ItsRequestJournal(path, NullLog())
+        try:
+            journal.markClassified('a.png', self.createRequestInfo(), 1)
+            _, reqInfo, _ = journal.getUnpersisted()[0]
+            self.assertEqual(reqInfo.img_hash, 'ab' * 20)
+        finally:
+            journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()